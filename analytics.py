@@ -0,0 +1,181 @@
+# @title THỐNG KÊ TẢI LỊCH (NumPy)
+# Giờ bắt đầu/kết thúc kéo vào mảng epoch 1 lần, mọi thống kê tính vector hóa trên mảng
+# Kết quả cache theo phiên bản nhật ký của lịch: dữ liệu không đổi thì không đọc lại DB
+import json
+import sqlite3
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+import numpy as np
+from storage import DEFAULT_CALENDAR, DEFAULT_DURATION, EXTRA_REMINDERS_SQL, get_calendar_tz, iter_recurring, \
+    journal_version, parse_dt
+from timezones import local_now
+
+RECURRING_WINDOW = timedelta(days=90)  # sự kiện lặp chỉ sinh các lần trong hôm nay ± 90 ngày
+MAX_SPAN = 31 * 86400  # khoảng bận dài hơn bị cắt khi chia theo ngày
+TOP_LOCATIONS = 10
+FETCH_SIZE = 50000  # số dòng đọc mỗi lô
+DAY = 86400
+EPOCH_WEEKDAY = 3  # 1970-01-01 là thứ 5 -> cộng 3 để thứ 2 = 0
+WEEKDAYS = ["T2", "T3", "T4", "T5", "T6", "T7", "CN"]
+EPOCH = datetime(1970, 1, 1)
+
+_cache = {}  # (file DB, lịch) -> ((phiên bản, ngày), kết quả)
+_cache_lock = threading.Lock()
+
+
+# ==========================================
+# ĐỌC DỮ LIỆU
+# ==========================================
+# Giờ trong DB là giờ địa phương, đổi sang epoch như thể UTC -> epoch "giờ tường", chia giờ/ngày không lệch múi
+# unixepoch() (SQLite 3.38+) nhanh hơn strftime('%s') gần 2 lần
+EPOCH_SQL = "unixepoch({})" if sqlite3.sqlite_version_info >= (3, 38) else "CAST(strftime('%s', {}) AS INTEGER)"
+
+
+def _wall_epoch(text):
+    dt = parse_dt(text)
+    return int((dt - EPOCH).total_seconds()) if dt else None
+
+
+# Quét 1 lượt events + events_archive theo lô: (starts, ends) của sự kiện 1 lần, mọi mốc nhắc (phút)
+# và số lần dùng từng địa điểm. end trống/không hợp lệ -> start + DEFAULT_DURATION (giống busy_intervals)
+def load_columns(conn, calendar=DEFAULT_CALENDAR):
+    cursor = conn.execute(" UNION ALL ".join(f"""
+        SELECT {EPOCH_SQL.format("start_time")}, {EPOCH_SQL.format("end_time")}, recurrence IS NULL,
+               reminder_minutes, {EXTRA_REMINDERS_SQL.format(t=table)}, location
+        FROM {table} WHERE calendar = ?
+    """ for table in ("events", "events_archive")), (calendar, calendar))
+    starts, ends, lead_times, locations = [], [], [], Counter()
+    while True:
+        rows = cursor.fetchmany(FETCH_SIZE)
+        if not rows: break
+        start, end, one_off, remind, extra, loc = zip(*rows)
+        start = np.array(start, dtype=float)  # None -> nan
+        keep = np.array(one_off, dtype=bool) & ~np.isnan(start)
+        starts.append(start[keep].astype(np.int64))
+        ends.append(np.nan_to_num(np.array(end, dtype=float)[keep]).astype(np.int64))
+        lead_times.append(np.array([m or 0 for m in remind], dtype=np.int64))
+        lead_times.append(np.array([m for x in extra if x for m in json.loads(x)], dtype=np.int64))
+        locations.update(l for l in loc if l)
+    empty = np.zeros(0, dtype=np.int64)
+    return (np.concatenate(starts or [empty]), np.concatenate(ends or [empty]),
+            np.concatenate(lead_times or [empty]), locations)
+
+
+# Các lần lặp quanh hôm nay (sự kiện lặp sinh vô hạn, chỉ tính trong hôm nay ± RECURRING_WINDOW)
+def load_occurrences(conn, calendar=DEFAULT_CALENDAR, today=None):
+    today = datetime.combine(today or local_now(get_calendar_tz(conn, calendar)).date(), datetime.min.time())
+    occurrences = [(_wall_epoch(start), _wall_epoch(end) or 0)
+                   for _, _, start, end, _, _, _ in iter_recurring(conn, today - RECURRING_WINDOW,
+                                                                   today + RECURRING_WINDOW, calendar)]
+    occ = np.array(occurrences, dtype=np.int64).reshape(-1, 2)
+    return occ[:, 0], occ[:, 1]
+
+
+# ==========================================
+# TÍNH TOÁN (VECTOR HÓA)
+# ==========================================
+# Ma trận 7 x 24 số sự kiện bắt đầu theo (thứ, giờ)
+def hour_of_week_heatmap(starts):
+    days = starts // DAY
+    slot = (days + EPOCH_WEEKDAY) % 7 * 24 + starts // 3600 % 24
+    return np.bincount(slot, minlength=7 * 24).reshape(7, 24)
+
+
+# Số sự kiện mỗi tuần (tuần bắt đầu thứ 2): (ngày thứ 2 của tuần đầu, mảng đếm)
+def weekly_density(starts):
+    if not len(starts): return None, np.zeros(0, dtype=np.int64)
+    weeks = (starts // DAY + EPOCH_WEEKDAY) // 7
+    first = int(weeks.min())
+    return (EPOCH + timedelta(days=first * 7 - EPOCH_WEEKDAY)).date(), np.bincount(weeks - first)
+
+
+# Gộp khoảng chồng nhau (đã sort theo start): quét 1 lượt bằng max tích lũy của end
+def merge_intervals(starts, ends):
+    if not len(starts): return starts, ends
+    reach = np.maximum.accumulate(ends)
+    new = np.empty(len(starts), dtype=bool)
+    new[0] = True
+    new[1:] = starts[1:] >= reach[:-1]
+    heads = np.flatnonzero(new)
+    return starts[heads], np.maximum.reduceat(ends, heads)
+
+
+# Tỉ lệ thời gian bận mỗi ngày (0..1, khoảng chồng nhau chỉ tính 1 lần): (ngày đầu, mảng tỉ lệ)
+def daily_occupancy(starts, ends):
+    m_start, m_end = merge_intervals(starts, ends)
+    if not len(m_start): return None, np.zeros(0)
+    m_end = np.minimum(m_end, m_start + MAX_SPAN)
+    first_day, last_day = m_start // DAY, (m_end - 1) // DAY
+    n_days = last_day - first_day + 1
+    # Tách khoảng qua nhiều ngày thành từng mảnh theo ngày
+    idx = np.repeat(np.arange(len(m_start)), n_days)
+    day = first_day[idx] + np.arange(len(idx)) - np.repeat(np.cumsum(n_days) - n_days, n_days)
+    busy = np.minimum(m_end[idx], (day + 1) * DAY) - np.maximum(m_start[idx], day * DAY)
+    base = int(day.min())
+    return (EPOCH + timedelta(days=base)).date(), np.bincount(day - base, weights=busy) / DAY
+
+
+# Trùng giờ (đã sort theo start): mỗi event chồng với (số event bắt đầu trước khi nó kết thúc)
+# - (số event đã kết thúc trước khi nó bắt đầu) - chính nó; tối đa cùng lúc = quét +1/-1
+def overlap_stats(starts, ends):
+    n = len(starts)
+    if not n: return {"overlap_pairs": 0, "overlapping_events": 0, "max_concurrent": 0}
+    others = np.searchsorted(starts, ends, "left") - np.searchsorted(np.sort(ends), starts, "right") - 1
+    times = np.concatenate((starts, ends))
+    delta = np.concatenate((np.ones(n, dtype=np.int64), -np.ones(n, dtype=np.int64)))
+    order = np.lexsort((delta, times))  # cùng thời điểm: kết thúc trước rồi mới bắt đầu
+    return {
+        "overlap_pairs": int(others.sum() // 2),
+        "overlapping_events": int((others > 0).sum()),
+        "max_concurrent": int(np.cumsum(delta[order]).max()),
+    }
+
+
+def compute_stats(starts, ends, lead_times):
+    ends = np.where(ends > starts, ends, starts + int(DEFAULT_DURATION.total_seconds()))
+    order = np.argsort(starts, kind="stable")
+    starts, ends = starts[order], ends[order]
+    heatmap = hour_of_week_heatmap(starts)
+    busiest = [(WEEKDAYS[i // 24], int(i % 24), int(heatmap.flat[i]))
+               for i in np.argsort(heatmap, axis=None, kind="stable")[::-1][:5] if heatmap.flat[i]]
+    first_week, weekly = weekly_density(starts)
+    first_day, occupancy = daily_occupancy(starts, ends)
+    lead_values, lead_counts = np.unique(lead_times, return_counts=True)
+    stats = {
+        "events": len(starts), "heatmap": heatmap, "busiest": busiest,
+        "first_week": first_week, "weekly": weekly, "first_day": first_day, "occupancy": occupancy,
+        "lead_times": list(zip(lead_values.tolist(), lead_counts.tolist())),
+    }
+    stats.update(overlap_stats(starts, ends))
+    return stats
+
+
+# ==========================================
+# API
+# ==========================================
+# Thống kê của 1 lịch; đọc lại DB khi nhật ký đổi phiên bản (thêm/sửa/xóa/undo/nhập/lưu trữ) hoặc sang ngày mới
+def schedule_stats(conn, calendar=DEFAULT_CALENDAR, today=None):
+    today = today or local_now(get_calendar_tz(conn, calendar)).date()
+    stamp = (journal_version(conn, calendar), today)
+    key = (conn.execute("PRAGMA database_list").fetchone()[2], calendar)
+    with _cache_lock:
+        hit = _cache.get(key)
+        if hit and hit[0] == stamp: return hit[1]
+    starts, ends, lead_times, locations = load_columns(conn, calendar)
+    occ_starts, occ_ends = load_occurrences(conn, calendar, today)
+    stats = compute_stats(np.concatenate((starts, occ_starts)), np.concatenate((ends, occ_ends)), lead_times)
+    stats["top_locations"] = locations.most_common(TOP_LOCATIONS)
+    # "events" gộp cả 2 loại (cho biểu đồ); đếm riêng: sự kiện 1 lần (mọi thời điểm) / lần lặp trong hôm nay ± cửa sổ
+    stats["one_off_events"], stats["occurrences"] = len(starts), len(occ_starts)
+    with _cache_lock:
+        _cache[key] = (stamp, stats)
+    return stats
+
+
+# Cắt chuỗi theo ngày/tuần về khoảng [start, end) để vẽ: [(ngày, giá trị), ...]
+def series_window(first, values, start, end, step_days=1):
+    if first is None: return []
+    lo = max(0, (start - first).days // step_days)
+    hi = min(len(values), -(-(end - first).days // step_days))
+    return [(first + timedelta(days=i * step_days), float(values[i])) for i in range(lo, hi)]
@@ -1,78 +1,118 @@
 ﻿# @title DATABASE & UI
-import sqlite3
+import os
 import threading
 import time
 from datetime import datetime, timedelta
 from nlp import *
+from parse_service import get_parser
+from storage import init_schema, iter_window, due_reminders, claim_reminder, claim_reminders, find_free_slots, \
+    search_events, fetch_events, index_events, catch_up_reminders, summarize_missed, connect, get_calendar_tz, \
+    set_calendar_tz, undo, redo, maybe_snapshot, insert_event, update_event, insert_events, format_reminder_list, \
+    parse_reminder_list, lease_owner, acquire_lease, release_leases, maybe_archive, DEFAULT_CALENDAR
 
 # ==========================================
 # DATABASE MANAGER
 # ==========================================
 class Database:
-    def __init__(self, db_name="scheduler.db"):
-        self.conn = sqlite3.connect(db_name, check_same_thread=False)
+    def __init__(self, db_name="scheduler.db", calendar=DEFAULT_CALENDAR):
+        # Mọi truy vấn chỉ chạm vào dòng của lịch này
+        self.calendar = calendar
+        self.conn = connect(db_name, check_same_thread=False)
         self.cursor = self.conn.cursor()
         self.create_table()
+        # Múi giờ của lịch: câu "mai 9h" hiểu theo giờ của user, không theo giờ máy chủ
+        self.tz = get_calendar_tz(self.conn, calendar)
 
     # Khởi tạo bảng
     def create_table(self):
-        self.cursor.execute("""
-            CREATE TABLE IF NOT EXISTS events (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                event TEXT,
-                start_time TEXT,
-                end_time TEXT,
-                location TEXT,
-                reminder_minutes INTEGER,
-                is_notified INTEGER DEFAULT 0
-            )
-        """)
-        self.conn.commit()
+        init_schema(self.conn)
+
+    def set_timezone(self, tz):
+        set_calendar_tz(self.conn, self.calendar, tz)
+        self.tz = tz
 
     # Thêm event
-    def add_event(self, name, start, end, loc, remind):
-        self.cursor.execute("""
-            INSERT INTO events (event, start_time, end_time, location, reminder_minutes)
-            VALUES (?, ?, ?, ?, ?)
-        """, (name, start, end, loc, remind))
-        self.conn.commit()
+    # reminders: ds mọi mốc nhắc (phút), có thì thay cho remind
+    def add_event(self, name, start, end, loc, remind, recurrence=None, reminders=None):
+        with self.conn:
+            insert_event(self.conn, self.calendar, name, start, end, loc, reminders or [remind], recurrence)
+        maybe_snapshot(self.conn, self.calendar)
 
-    # Xếp theo ID
+    # Thêm các event của 1 câu ghép trong 1 transaction
+    def add_events(self, results):
+        return insert_events(self.conn, results, self.calendar)
+
+    # Xếp theo ID, trả về ds Event
     def get_all_events(self):
-        self.cursor.execute("SELECT * FROM events ORDER BY id ASC")
-        return self.cursor.fetchall()
+        return fetch_events(self.conn, self.calendar, order_by="id")
 
-    # Đánh dấu event đã thông báo
-    def mark_notified(self, event_id):
-        self.cursor.execute("UPDATE events SET is_notified = 1 WHERE id = ?", (event_id,))
-        self.conn.commit()
+    # Các lần diễn ra trong khoảng [start, end), sự kiện lặp được sinh lazy
+    def get_occurrences(self, window_start, window_end):
+        return iter_window(self.conn, window_start, window_end, self.calendar)
+
+    # Tìm theo tên/địa điểm (FTS5, không phân biệt dấu), xếp theo độ liên quan
+    def search(self, query, limit=20):
+        return search_events(self.conn, query, limit, self.calendar)
+
+    # N khoảng trống đầu tiên (quét 1 lượt ds bận đã gộp)
+    def find_free_slots(self, range_start, range_end, duration, work_start, work_end, limit=5):
+        return find_free_slots(self.conn, range_start, range_end, duration, work_start, work_end, limit,
+                               self.calendar)
+
+    # Nhắc nhở đến hạn ở phút hiện tại (gồm cả lần lặp)
+    def get_due_reminders(self, now):
+        return due_reminders(self.conn, now, self.calendar)
+
+    # True nếu app nhận được nhắc (chưa tiến trình nào khác báo)
+    def claim_reminder(self, reminder_id, fire_at):
+        return claim_reminder(self.conn, reminder_id, fire_at)
+
+    # Nhắc bị lỡ khi app tắt/ngủ (trong khoảng grace), nhắc quá cũ bị đánh dấu hết hạn
+    # Chỉ trả về nhắc app nhận được
+    def catch_up_reminders(self, now):
+        missed, _ = catch_up_reminders(self.conn, now, self.calendar)
+        return claim_reminders(self.conn, missed)
+
+    # Worker / Streamlit đang phát nhắc cho lịch này thì app không quét
+    def acquire_lease(self, owner, now):
+        return acquire_lease(self.conn, self.calendar, owner, now)
+
+    def release_leases(self, owner):
+        release_leases(self.conn, owner)
+
+    # Chuyển sự kiện đã qua lâu sang archive (tối đa 1 lần/giờ), trả về số dòng đã chuyển
+    def maybe_archive(self, now):
+        return maybe_archive(self.conn, self.calendar, now)
 
     # Xóa event
     def delete_event(self, event_id):
-        self.cursor.execute("DELETE FROM events WHERE id = ?", (event_id,))
+        self.cursor.execute("DELETE FROM events WHERE id = ? AND calendar = ?", (event_id, self.calendar))
         self.conn.commit()
+        maybe_snapshot(self.conn, self.calendar)
 
-    # Sửa event
-    def update_event(self, record_id, name, start, end, loc, remind):
-        self.cursor.execute("""
-            UPDATE events
-            SET event=?, start_time=?, end_time=?, location=?, reminder_minutes=?, is_notified=0
-            WHERE id=?
-        """, (name, start, end, loc, remind, record_id))
-        self.conn.commit()
+    # Sửa event; reminders: ds mọi mốc nhắc (phút), ghi vào bảng reminders
+    def update_event(self, record_id, name, start, end, loc, reminders, recurrence=None):
+        with self.conn:
+            update_event(self.conn, self.calendar, record_id, name, start, end, loc, reminders, recurrence)
+        maybe_snapshot(self.conn, self.calendar)
+
+    # Hoàn tác / làm lại thêm-sửa-xóa (theo nhật ký event_journal), None nếu không còn bước nào
+    def undo(self):
+        return undo(self.conn, self.calendar)
+
+    def redo(self):
+        return redo(self.conn, self.calendar)
 
     # Kiểm tra trùng lặp tgian bắt đầu event
     def check_overlap(self, new_start_str, new_end_str, exclude_id=None):
         if not new_start_str: return False, None
-        # Lấy ds các event khác id
-        query = "SELECT id, event, start_time FROM events WHERE id != ?"
-        params = [exclude_id if exclude_id else -1]
+        # Tìm event khác id cùng giờ bắt đầu (dùng index calendar, start_time)
+        query = "SELECT event FROM events WHERE calendar = ? AND start_time = ? AND id != ? LIMIT 1"
+        params = [self.calendar, new_start_str, exclude_id if exclude_id else -1]
         self.cursor.execute(query, params)
-        rows = self.cursor.fetchall()
-        for row in rows:
-            _, e_name, e_start = row
-            if new_start_str == e_start:
-                return True, e_name  # trùng lịch
+        row = self.cursor.fetchone()
+        if row:
+            return True, row[0]  # trùng lịch
         return False, None # an toàn
 
     # Kiểm tra cú pháp datetime chuẩn
@@ -103,12 +143,17 @@ class SchedulerApp(ttk.Window):
         style.configure("Treeview", font=("Segoe UI", 11))
         style.configure("Treeview.Heading", font=("Segoe UI", 10, "bold"))
 
-        self.db = Database()
+        # Lịch đang dùng (mặc định "default"), đổi qua biến môi trường SCHEDULER_CALENDAR
+        self.db = Database(calendar=os.environ.get("SCHEDULER_CALENDAR", DEFAULT_CALENDAR))
+        # Dùng model chung của parse_service nếu đang chạy, không thì tạo SchedulerMain 1 lần
+        self.scheduler = get_parser()
         self.setup_ui()
         self.load_data()
 
         # Start background thread
         self.stop_thread = False
+        # Tên tiến trình này trong bảng lease điều phối nhắc
+        self.lease_owner = lease_owner("tk")
         self.thread = threading.Thread(target=self.background_checker, daemon=True)
         self.thread.start()
 
@@ -126,12 +171,23 @@ class SchedulerApp(ttk.Window):
         # Button thêm event
         btn_add = ttk.Button(input_frame, text="Phân tích & Thêm", command=self.process_input, bootstyle=SUCCESS)
         btn_add.pack(side=LEFT, padx=5)
+        # Button tìm giờ trống (VD: tìm giờ trống 1 tiếng chiều mai)
+        ttk.Button(input_frame, text="Tìm giờ trống", command=self.find_free_time, bootstyle=INFO).pack(side=LEFT, padx=5)
+
+        # --SEARCH AREA--
+        search_frame = ttk.Frame(self)
+        search_frame.pack(fill=X, padx=10)
+        ttk.Label(search_frame, text="Tìm kiếm:").pack(side=LEFT, padx=5)
+        self.entry_search = ttk.Entry(search_frame, font=("Segoe UI", 10))
+        self.entry_search.pack(side=LEFT, padx=5, fill=X, expand=True)
+        self.entry_search.bind("<Return>", lambda e: self.search_events())
+        ttk.Button(search_frame, text="Tìm", command=self.search_events, bootstyle=INFO).pack(side=LEFT, padx=5)
 
         # --LIST AREA (middle)--
         list_frame = ttk.Frame(self)
         list_frame.pack(fill=BOTH, expand=True, padx=10, pady=10)
         # Tạo bảng lịch
-        cols = ("ID", "Sự Kiện", "Bắt Đầu", "Kết Thúc", "Địa Điểm", "Nhắc Trước")
+        cols = ("ID", "Sự Kiện", "Bắt Đầu", "Kết Thúc", "Địa Điểm", "Nhắc Trước", "Lặp Lại")
         self.tree = ttk.Treeview(list_frame, columns=cols, show="headings", bootstyle="info", height=20)
         scrollbar = ttk.Scrollbar(list_frame, orient=VERTICAL, command=self.tree.yview)
         self.tree.configure(yscrollcommand=scrollbar.set)
@@ -151,6 +207,8 @@ class SchedulerApp(ttk.Window):
         self.tree.column("Địa Điểm", width=150, anchor=W)
         self.tree.heading("Nhắc Trước", text="Nhắc Trước(p)")
         self.tree.column("Nhắc Trước", width=100, anchor=CENTER)
+        self.tree.heading("Lặp Lại", text="Lặp Lại")
+        self.tree.column("Lặp Lại", width=160, anchor=W)
 
         # --BUTTON AREA (bottom)--
         btn_frame = ttk.Frame(self, padding=10)
@@ -160,14 +218,30 @@ class SchedulerApp(ttk.Window):
         ttk.Button(btn_frame, text="Xóa Event chọn", command=self.delete_selected, bootstyle=DANGER).pack(side=RIGHT)
         ttk.Button(btn_frame, text="Làm mới", command=self.load_data, bootstyle=SECONDARY).pack(side=RIGHT, padx=10)
         ttk.Button(btn_frame, text="Sửa Event", command=self.edit_selected, bootstyle=WARNING).pack(side=RIGHT, padx=5)
+        ttk.Button(btn_frame, text="Làm lại", command=self.redo_last, bootstyle=SECONDARY).pack(side=RIGHT, padx=5)
+        ttk.Button(btn_frame, text="Hoàn tác", command=self.undo_last, bootstyle=SECONDARY).pack(side=RIGHT, padx=5)
+        self.bind("<Control-z>", lambda e: self.undo_last())
+        self.bind("<Control-y>", lambda e: self.redo_last())
 
     #--XỬ LÝ USER INPUT--
     def process_input(self):
         raw_text = self.entry_task.get()
         if not raw_text: return
         # --KẾT QUẢ TỪ MODULE--
-        scheduler = SchedulerMain()
-        result = scheduler.process(raw_text)
+        scheduler = self.scheduler
+        # Câu hỏi giờ trống -> trả lời, không thêm event
+        if scheduler.is_free_time_query(raw_text, calendar=self.db.calendar):
+            self.find_free_time()
+            return
+        # Câu ghép ("9h họp team, 14h gặp khách") -> thêm tất cả 1 lần
+        results = scheduler.process_compound(raw_text, tz=self.db.tz, calendar=self.db.calendar)
+        if len(results) > 1:
+            self.db.add_events(results)
+            self.entry_task.delete(0, END)
+            self.load_data()
+            print(f"Đã thêm {len(results)} sự kiện!")
+            return
+        result = results[0]
         try:
             # Nếu datetime HH:MM, cộng thêm s
             dt = datetime.strptime(result['start_time'], "%Y-%m-%d %H:%M")
@@ -191,7 +265,9 @@ class SchedulerApp(ttk.Window):
             "start": result['start_time'],
             "end": result['end_time'],
             "loc": result['location'],
-            "remind": result['reminder_minutes']
+            "remind": result['reminder_minutes'],
+            "recurrence": result.get('recurrence'),
+            "reminders": result.get('reminders')
         }
         # Lưu vào DB
         self.db.add_event(
@@ -199,21 +275,50 @@ class SchedulerApp(ttk.Window):
             extracted_data["start"],
             extracted_data["end"],
             extracted_data["loc"],
-            extracted_data["remind"]
+            extracted_data["remind"],
+            extracted_data["recurrence"],
+            extracted_data["reminders"]
         )
         self.entry_task.delete(0, END)
         self.load_data()
         print("Đã thêm sự kiện!")
 
-    def load_data(self):
+    #--TÌM GIỜ TRỐNG--
+    def find_free_time(self):
+        raw_text = self.entry_task.get()
+        if not raw_text: return
+        query = self.scheduler.parse_free_time_query(raw_text, tz=self.db.tz, calendar=self.db.calendar)
+        slots = self.db.find_free_slots(query["range_start"], query["range_end"], query["duration"],
+                                        query["work_start"], query["work_end"])
+        minutes = int(query["duration"].total_seconds() // 60)
+        if not slots:
+            messagebox.showinfo("Giờ trống", f"Không còn khoảng trống {minutes} phút trong thời gian này.")
+            return
+        msg = "\n".join(f"{s:%d/%m %H:%M} - {e:%H:%M}" for s, e in slots)
+        messagebox.showinfo("Giờ trống", f"Khoảng trống >= {minutes} phút:\n{msg}")
+
+    #--TÌM KIẾM--
+    def search_events(self):
+        query = self.entry_search.get().strip()
+        if not query:
+            self.load_data()
+            return
+        rows = self.db.search(query, limit=200)
+        self.load_data(rows)
+        self.status_lbl.config(text=f"Tìm thấy {len(rows)} sự kiện cho '{query}'", bootstyle="info")
+
+    def load_data(self, rows=None):
         # Xóa cũ
         for row in self.tree.get_children():
             self.tree.delete(row)
-        # Load lại db
-        rows = self.db.get_all_events()
-        for row in rows:
-            # row: (id, name, start, end, loc, remind, notified)
-            self.tree.insert("", END, values=row[:6])
+        # Load lại db (hoặc hiện kết quả tìm kiếm)
+        if rows is None:
+            rows = self.db.get_all_events()
+        # id -> Event cho popup sửa
+        self.events_by_id = index_events(rows)
+        for ev in rows:
+            self.tree.insert("", END, values=(ev.id, ev.event, ev.start_time, ev.end_time, ev.location or "",
+                                              format_reminder_list(ev.reminders), ev.recurrence or ""))
 
     #Chọn để xóa
     def delete_selected(self):
@@ -227,24 +332,32 @@ class SchedulerApp(ttk.Window):
             self.db.delete_event(record_id)
             self.load_data()
 
+    def undo_last(self):
+        step = self.db.undo()
+        self.status_lbl.config(text="Đã hoàn tác" if step else "Không còn gì để hoàn tác")
+        if step: self.load_data()
+
+    def redo_last(self):
+        step = self.db.redo()
+        self.status_lbl.config(text="Đã làm lại" if step else "Không còn gì để làm lại")
+        if step: self.load_data()
+
     # Chọn để sửa
     def edit_selected(self):
         selected = self.tree.selection()
         if not selected:
             messagebox.showwarning("Chú ý", "Vui lòng chọn dòng để sửa!")
             return
-        values = self.tree.item(selected[0])['values']
-        rec_id = values[0]
+        rec_id = self.tree.item(selected[0])['values'][0]
+        ev = self.events_by_id.get(rec_id)
+        if not ev: return
         # Tách datetime để sửa riêng (date dùng DatePicker)
-        def split_dt(dt_str):
-            try:
-                if not dt_str or dt_str == 'None': raise ValueError
-                dt = datetime.strptime(dt_str, "%Y-%m-%d %H:%M")
-                return dt.strftime("%Y-%m-%d"), dt.strftime("%H:%M")
-            except:
+        def split_dt(dt):
+            if not dt:
                 return datetime.now().strftime("%Y-%m-%d"), "00:00"
-        s_date, s_time = split_dt(values[2])
-        e_date, e_time = split_dt(values[3])
+            return dt.strftime("%Y-%m-%d"), dt.strftime("%H:%M")
+        s_date, s_time = split_dt(ev.start_dt)
+        e_date, e_time = split_dt(ev.end_dt)
 
         # --- TẠO POPUP ---
         win = ttk.Toplevel(self)
@@ -260,7 +373,7 @@ class SchedulerApp(ttk.Window):
         ttk.Label(content, text="Tên sự kiện:", font=("Segoe UI", 10, "bold")).pack(anchor=W)
         ent_name = ttk.Entry(content, width=50)
         ent_name.pack(fill=X, pady=(5, 15))
-        ent_name.insert(0, values[1])
+        ent_name.insert(0, ev.event)
 
         # 2. Start Time
         ttk.Label(content, text="Bắt đầu:", font=("Segoe UI", 10, "bold"), bootstyle="primary").pack(anchor=W)
@@ -291,14 +404,16 @@ class SchedulerApp(ttk.Window):
         ttk.Label(content, text="Địa điểm:", font=("Segoe UI", 10, "bold")).pack(anchor=W)
         ent_loc = ttk.Entry(content);
         ent_loc.pack(fill=X, pady=(5, 15))
-        ent_loc.insert(0, values[4] if values[4] else "")
-        ttk.Label(content, text="Nhắc trước (phút):", font=("Segoe UI", 10, "bold")).pack(anchor=W)
-        # Nếu remind null
-        remind_val = str(values[5]).replace(" phút", "").replace("-", "0")
-        if remind_val == 'None': remind_val = "0"
+        ent_loc.insert(0, ev.location or "")
+        ttk.Label(content, text="Nhắc trước (phút, VD: 1440, 30):", font=("Segoe UI", 10, "bold")).pack(anchor=W)
+        remind_val = format_reminder_list(ev.reminders)
         ent_remind = ttk.Entry(content);
         ent_remind.pack(fill=X, pady=(5, 20))
         ent_remind.insert(0, remind_val)
+        ttk.Label(content, text="Lặp lại (VD: FREQ=WEEKLY;BYDAY=MO):", font=("Segoe UI", 10, "bold")).pack(anchor=W)
+        ent_recur = ttk.Entry(content);
+        ent_recur.pack(fill=X, pady=(5, 20))
+        ent_recur.insert(0, ev.recurrence or "")
 
         # Hàm lưu thay đổi
         def save_changes():
@@ -315,7 +430,12 @@ class SchedulerApp(ttk.Window):
                 new_end = f"{d_end} {t_end}"
                 name = ent_name.get()
                 loc = ent_loc.get()
-                remind = ent_remind.get()
+                try:
+                    reminders = parse_reminder_list(ent_remind.get())
+                except ValueError as e:
+                    messagebox.showerror("Lỗi format", str(e))
+                    return
+                recurrence = ent_recur.get().strip() or None
 
                 print(f"DEBUG: Trying to save: {new_start} -> {new_end}")  # In ra terminal để check
                 # Validate format
@@ -337,7 +457,7 @@ class SchedulerApp(ttk.Window):
                                                f"Thời gian này trùng với sự kiện:\n'{conflict}'\nVẫn muốn lưu?"): return
 
                 # Lưu vào DB
-                self.db.update_event(rec_id, name, new_start, new_end, loc, remind)
+                self.db.update_event(rec_id, name, new_start, new_end, loc, reminders, recurrence)
                 # Refresh UI
                 self.load_data()
                 self.status_lbl.config(text="Đã cập nhật sự kiện", bootstyle="success")
@@ -358,42 +478,35 @@ class SchedulerApp(ttk.Window):
     # ==========================================
     def background_checker(self):
         print("Service Started...")
+        last_tick = None
         while True:
-            now_str = datetime.now().strftime("%Y-%m-%d %H:%M")
-            events = self.db.get_all_events()
-            for ev in events:
-                eid, name, start, end, loc, remind, notified = ev
-                if notified == 1: continue
-                try:
-                    events = self.db.get_all_events()
-                    for ev in events:
-                        eid, name, start, end, loc, remind, notified = ev
-                        # Bỏ qua nếu event đã được báo
-                        if notified == 1: continue
-                        # Parse time
-                        s_dt = None
-                        try:
-                            # Có giây
-                            s_dt = datetime.strptime(start, "%Y-%m-%d %H:%M")
-                        except ValueError:
-                            try:
-                                # data cũ thiếu giây
-                                s_dt = datetime.strptime(start, "%Y-%m-%d %H:%M:%S")
-                            except ValueError:
-                                continue  # Data lỗi
-                        # --TÍNH GIỜ NHẮC--
-                        s_dt = s_dt.replace(second=0, microsecond=0)
-                        remind_minutes = remind if remind else 0
-                        remind_dt = s_dt - timedelta(minutes=remind_minutes)
-                        remind_str = remind_dt.strftime("%Y-%m-%d %H:%M")
-                        if now_str == remind_str:
-                            # Cập nhật DB trước khi hiện popup
-                            self.db.mark_notified(eid)
-                            self.after(0, lambda n=name, l=loc, t=remind_minutes: self.show_reminder_popup(n, l, t))
-                            self.after(1000, self.load_data) # Refresh lại icon trên bảng
-
-                except Exception as e:
-                    print(f"Checker Error: {e}")
+            try:
+                now = datetime.now()
+                # Chỉ nơi giữ lease mới quét, mất lease thì lần nhận lại sau sẽ bù nhắc lỡ
+                if not self.db.acquire_lease(self.lease_owner, now):
+                    last_tick = None
+                    time.sleep(20)
+                    continue
+                # Lúc mở app hoặc sau khi máy ngủ lâu -> gộp các nhắc bị lỡ vào 1 popup
+                if last_tick is None or now - last_tick > timedelta(seconds=40):
+                    missed = self.db.catch_up_reminders(now)
+                    if missed:
+                        self.after(0, lambda m=missed: self.show_missed_popup(m))
+                        self.after(1000, self.load_data)
+                last_tick = now
+
+                # Sự kiện 1 lần + lần lặp có giờ nhắc rơi vào phút hiện tại
+                for rid, name, loc, remind_minutes, fire_at in self.db.get_due_reminders(now):
+                    # Nhận nhắc trong DB trước khi hiện popup (không nhận được = nơi khác đã báo)
+                    if not self.db.claim_reminder(rid, fire_at): continue
+                    self.after(0, lambda n=name, l=loc, t=remind_minutes: self.show_reminder_popup(n, l, t))
+                    self.after(1000, self.load_data) # Refresh lại icon trên bảng
+
+                # Bảng chỉ còn sự kiện chưa quá hạn lưu trữ
+                if self.db.maybe_archive(now):
+                    self.after(0, self.load_data)
+            except Exception as e:
+                print(f"Checker Error: {e}")
 
             time.sleep(20)  # Check mỗi 20s
 
@@ -407,10 +520,17 @@ class SchedulerApp(ttk.Window):
             msg += "ĐÃ ĐẾN GIỜ!"
         messagebox.showinfo("NHẮC LỊCH TRÌNH", msg)
 
+    def show_missed_popup(self, missed):
+        if len(missed) == 1:
+            _, name, loc, minutes, _ = missed[0]
+            return self.show_reminder_popup(name, loc, minutes or 0)
+        messagebox.showinfo("NHẮC LỊCH TRÌNH", summarize_missed(missed))
+
 import os, signal
 if __name__ == "__main__":
     def on_closing():
         if messagebox.askokcancel("Quit", "Do you want to quit?"):
+            app.db.release_leases(app.lease_owner)  # worker/Streamlit nhận lịch ngay
             app.quit()
             app.destroy()
     app = SchedulerApp()
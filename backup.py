@@ -0,0 +1,144 @@
+# @title SAO LƯU DB KHI ĐANG CHẠY (SQLite backup API)
+# Chép theo từng bước BACKUP_PAGES trang sang file tạm rồi đổi tên -> file sao lưu luôn nguyên vẹn, không bị "xé"
+# như khi đọc thẳng scheduler.db lúc worker / UI đang ghi
+# Snapshot định kỳ: SCHEDULER_BACKUP_HOURS=6 (0 = tắt) vào thư mục SCHEDULER_BACKUP_DIR, giữ SCHEDULER_BACKUP_KEEP bản mới nhất
+# Mỗi snapshot là bản chép đầy đủ (không phải sao lưu tăng dần), DB không đổi từ bản trước thì bỏ qua
+import os
+import time
+import sqlite3
+import tempfile
+from datetime import datetime, timedelta
+
+BACKUP_DIR = os.environ.get("SCHEDULER_BACKUP_DIR", "backups")
+BACKUP_EVERY = timedelta(hours=float(os.environ.get("SCHEDULER_BACKUP_HOURS", 0)))  # 0 = không snapshot định kỳ
+BACKUP_KEEP = int(os.environ.get("SCHEDULER_BACKUP_KEEP", 7))
+BACKUP_PAGES = 1024  # số trang chép mỗi bước (4MB với trang 4KB)
+BACKUP_PAUSE = 0.01  # giây nghỉ giữa 2 bước khi DB không ở chế độ WAL, nhường khóa cho người ghi
+BACKUP_RESTARTS = 3  # DB không WAL bị ghi xen quá số lần này -> chép 1 bước cho xong
+STAMP_FORMAT = "%Y%m%d-%H%M%S"
+
+
+class _Restarted(Exception):
+    pass
+
+
+def is_wal(conn):
+    return conn.execute("PRAGMA journal_mode").fetchone()[0].lower() == "wal"
+
+
+# ==========================================
+# SAO LƯU 1 LẦN
+# ==========================================
+# WAL: giữ 1 giao dịch đọc suốt quá trình chép -> mọi bước đọc cùng 1 ảnh DB, người ghi vẫn ghi vào file WAL
+# Không WAL: SQLite tự chép lại từ đầu khi DB bị ghi xen giữa 2 bước; bị ghi xen quá BACKUP_RESTARTS lần thì
+# chép 1 bước (giữ khóa đọc tới khi xong)
+def _copy(src, dest, pages, progress, pause):
+    remaining = [None, 0]  # số trang còn lại ở bước trước, số lần chép lại
+
+    def step(status, left, total):
+        if remaining[0] is not None and left >= remaining[0]:  # không tiến thêm = đã chép lại từ đầu
+            remaining[1] += 1
+            if pause and remaining[1] > BACKUP_RESTARTS: raise _Restarted()
+        remaining[0] = left
+        if progress: progress(total - left, total)
+        if pause and left: time.sleep(pause)
+
+    try:
+        src.backup(dest, pages=pages, progress=step)
+    except _Restarted:
+        src.backup(dest, progress=step)
+
+
+# Chép db_name sang dest (ghi đè), trả về dest
+# progress(số trang đã chép, tổng số trang) được gọi sau mỗi bước (thanh tiến trình trên UI)
+def backup_db(db_name, dest, pages=BACKUP_PAGES, progress=None):
+    tmp = f"{dest}.part"
+    src = sqlite3.connect(db_name, isolation_level=None)
+    try:
+        wal = is_wal(src)
+        if wal:
+            src.execute("BEGIN")
+            src.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchall()  # mở giao dịch đọc ngay
+        target = sqlite3.connect(tmp)
+        try:
+            _copy(src, target, pages, progress, 0 if wal else BACKUP_PAUSE)
+            # Bản sao tự đủ trong 1 file (không cần -wal / -shm khi mở ở máy khác)
+            target.execute("PRAGMA journal_mode=DELETE")
+        finally:
+            target.close()
+    except BaseException:
+        if os.path.exists(tmp): os.remove(tmp)
+        raise
+    finally:
+        src.close()
+    os.replace(tmp, dest)
+    return dest
+
+
+# Bản chụp vào file tạm (nút tải DB trên Streamlit): tải về từ bản chụp, không đọc file DB đang được ghi
+def export_snapshot(db_name, progress=None):
+    stem = os.path.splitext(os.path.basename(db_name))[0]
+    fd, path = tempfile.mkstemp(prefix=f"{stem}-", suffix=".db")
+    os.close(fd)
+    try:
+        return backup_db(db_name, path, progress=progress)
+    except BaseException:
+        os.remove(path)
+        raise
+
+
+# ==========================================
+# SNAPSHOT ĐỊNH KỲ (XOAY VÒNG)
+# ==========================================
+# Tên file: <tên DB>-<giờ bắt đầu chép>.db, sắp xếp theo tên = theo thời gian
+def _prefix(db_name):
+    return os.path.splitext(os.path.basename(db_name))[0] + "-"
+
+
+# [(giờ bắt đầu chép epoch, đường dẫn)] cũ -> mới
+def list_snapshots(db_name, directory=BACKUP_DIR):
+    prefix = _prefix(db_name)
+    try:
+        names = sorted(os.listdir(directory))
+    except FileNotFoundError:
+        return []
+    snapshots = []
+    for name in names:
+        if not name.startswith(prefix) or not name.endswith(".db"): continue
+        try:
+            started = datetime.strptime(name[len(prefix):-3], STAMP_FORMAT)
+        except ValueError:
+            continue
+        snapshots.append((started.timestamp(), os.path.join(directory, name)))
+    return snapshots
+
+
+# Xóa bản cũ, giữ `keep` bản mới nhất; trả về ds file đã xóa
+def rotate(db_name, directory=BACKUP_DIR, keep=BACKUP_KEEP):
+    removed = [path for _, path in list_snapshots(db_name, directory)[:-keep]] if keep > 0 else []
+    for path in removed:
+        os.remove(path)
+    return removed
+
+
+def take_snapshot(db_name, directory=BACKUP_DIR, keep=BACKUP_KEEP, now=None, progress=None):
+    os.makedirs(directory, exist_ok=True)
+    started = datetime.fromtimestamp(int((now or datetime.now()).timestamp()))
+    path = backup_db(db_name, os.path.join(directory, _prefix(db_name) + started.strftime(STAMP_FORMAT) + ".db"),
+                     progress=progress)
+    rotate(db_name, directory, keep)
+    return path
+
+
+# Gọi từ vòng quét của worker: đủ `every` từ bản trước và DB có ghi mới (mtime của file DB / -wal) thì chụp
+# bản đầy đủ mới; trả về đường dẫn bản mới, None = chưa tới lúc / tắt / không đổi
+def snapshot_if_changed(db_name, now=None, directory=BACKUP_DIR, every=BACKUP_EVERY, keep=BACKUP_KEEP):
+    if every.total_seconds() <= 0: return None
+    epoch = (now or datetime.now()).timestamp()
+    snapshots = list_snapshots(db_name, directory)
+    if snapshots:
+        last = snapshots[-1][0]
+        if epoch - last < every.total_seconds(): return None
+        modified = max((os.stat(p).st_mtime for p in (db_name, db_name + "-wal") if os.path.exists(p)), default=0)
+        if modified < last: return None
+    return take_snapshot(db_name, directory, keep, now)
@@ -0,0 +1,298 @@
+# @title XUẤT / NHẬP LỊCH (iCalendar .ics, Parquet, Arrow)
+import re
+import json
+from datetime import datetime, timezone
+from storage import DEFAULT_CALENDAR, DT_FORMAT, EXTRA_REMINDERS_SQL, journal_muted, journal_mark, get_calendar_tz, \
+    split_reminders
+from timezones import get_zone, is_valid_tz
+
+# pyarrow không bắt buộc, chỉ cần khi xuất/nhập Parquet/Arrow
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    import pyarrow.ipc as ipc
+except ImportError:
+    pa = pq = ipc = None
+
+# extra_reminders: các mốc nhắc thêm (JSON [phút], trong DB là các dòng của bảng reminders);
+# tz: múi giờ riêng của event (NULL = theo lịch), giờ trong file là giờ địa phương theo múi đó
+EXPORT_COLUMNS = ["event", "start_time", "end_time", "location", "reminder_minutes", "extra_reminders", "recurrence",
+                  "tz"]
+TZ_INDEX = EXPORT_COLUMNS.index("tz")
+EXTRA_INDEX = EXPORT_COLUMNS.index("extra_reminders")
+# Cột của bảng events (extra_reminders không phải cột)
+EVENT_COLUMNS = [c for c in EXPORT_COLUMNS if c != "extra_reminders"]
+PAGE_SIZE = 5000
+
+
+def _require_arrow():
+    if pa is None:
+        raise ImportError("Cần cài pyarrow để xuất/nhập Parquet/Arrow: pip install pyarrow")
+
+
+# ==========================================
+# ĐỌC / GHI THEO TRANG
+# ==========================================
+# Đọc events theo trang (keyset theo id): bộ nhớ không tăng theo kích thước bảng
+# Xuất cả lịch sử: đọc events_archive trước rồi tới events
+def iter_pages(conn, calendar=DEFAULT_CALENDAR, page_size=PAGE_SIZE):
+    for table in ("events_archive", "events"):
+        columns = ", ".join(EXTRA_REMINDERS_SQL.format(t=table) if c == "extra_reminders" else c for c in EXPORT_COLUMNS)
+        last_id = 0
+        while True:
+            rows = conn.execute(f"""
+                SELECT id, {columns} FROM {table}
+                WHERE calendar = ? AND id > ? ORDER BY id LIMIT ?
+            """, (calendar, last_id, page_size)).fetchall()
+            if not rows: break
+            last_id = rows[-1][0]
+            yield rows
+
+
+# Ghi theo lô trong 1 transaction, trả về số dòng đã thêm
+# Không ghi nhật ký từng dòng (undo từng event của 1 lần nhập là vô nghĩa), chỉ 1 mốc 'B' cho change feed
+# Trigger thêm mốc chính; dòng có mốc nhắc thêm ghi riêng (cần id) rồi thêm các mốc vào bảng reminders
+def insert_batches(conn, records, calendar=DEFAULT_CALENDAR, batch_size=PAGE_SIZE):
+    sql = f"""
+        INSERT INTO events ({", ".join(EVENT_COLUMNS)}, calendar)
+        VALUES ({", ".join("?" * len(EVENT_COLUMNS))}, ?)
+    """
+    total = 0
+    batch = []
+    with conn, journal_muted(conn):
+        for rec in records:
+            rec = tuple(rec)
+            row = rec[:EXTRA_INDEX] + rec[EXTRA_INDEX + 1:] + (calendar,)
+            extra = json.loads(rec[EXTRA_INDEX]) if rec[EXTRA_INDEX] else None
+            if extra:
+                conn.executemany(sql, batch)  # giữ thứ tự id theo file
+                event_id = conn.execute(sql, row).lastrowid
+                conn.executemany("INSERT OR IGNORE INTO reminders (event_id, minutes, dirty) VALUES (?, ?, 1)",
+                                 [(event_id, int(m)) for m in extra])
+                total += len(batch) + 1
+                batch = []
+                continue
+            batch.append(row)
+            if len(batch) >= batch_size:
+                conn.executemany(sql, batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            conn.executemany(sql, batch)
+            total += len(batch)
+        journal_mark(conn, calendar, None, "B", {"rows": total})
+    return total
+
+
+# ==========================================
+# iCalendar (.ics)
+# ==========================================
+def _ics_escape(text):
+    return (text or "").replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
+
+
+def _ics_unescape(text):
+    return text.replace("\\n", "\n").replace("\\N", "\n").replace("\\,", ",").replace("\\;", ";").replace("\\\\", "\\")
+
+
+# Gập dòng dài quá 75 byte theo RFC 5545 (không cắt giữa ký tự UTF-8)
+def _ics_fold(line):
+    raw = line.encode("utf-8")
+    if len(raw) <= 75: return line + "\r\n"
+    parts, pos, width = [], 0, 75
+    while pos < len(raw):
+        end = min(pos + width, len(raw))
+        while end < len(raw) and (raw[end] & 0xC0) == 0x80:
+            end -= 1
+        parts.append(raw[pos:end])
+        pos, width = end, 74
+    return b"\r\n ".join(parts).decode("utf-8") + "\r\n"
+
+
+# "YYYY-MM-DD HH:MM[:SS]" -> "YYYYMMDDTHHMMSS" (cắt chuỗi, không strptime)
+DB_DT_RE = re.compile(r'(\d{4})-(\d{2})-(\d{2}) (\d{2}):(\d{2})(?::(\d{2}))?')
+
+
+def _ics_dt(text):
+    match = DB_DT_RE.fullmatch(text) if text else None
+    if not match: return None
+    y, mo, d, h, mi, sec = match.groups()
+    return f"{y}{mo}{d}T{h}{mi}{sec or '00'}"
+
+
+# Ghi từng VEVENT ra file text ngay khi đọc xong mỗi trang
+# Giờ ghi kèm TZID (múi của event, không có thì của lịch): nhập vào lịch khác múi giờ không bị lệch
+# TZID là tên IANA, không kèm VTIMEZONE (Google / Outlook / Apple đều đọc được)
+def export_ics(conn, fp, calendar=DEFAULT_CALENDAR):
+    fp.write("BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//SchedulerVI//VI\r\n")
+    calendar_tz = get_calendar_tz(conn, calendar)
+    count = 0
+    for rows in iter_pages(conn, calendar):
+        for eid, name, start, end, loc, remind, extra, rule, tz in rows:
+            dtstart, dtend = _ics_dt(start), _ics_dt(end)
+            if not dtstart: continue
+            tzid = tz or calendar_tz
+            lines = ["BEGIN:VEVENT", f"UID:{eid}-{calendar}@schedulervi", f"DTSTART;TZID={tzid}:{dtstart}"]
+            if dtend: lines.append(f"DTEND;TZID={tzid}:{dtend}")
+            lines.append(f"SUMMARY:{_ics_escape(name)}")
+            if loc: lines.append(f"LOCATION:{_ics_escape(loc)}")
+            if rule: lines.append(f"RRULE:{rule}")
+            # Mỗi mốc nhắc 1 VALARM
+            for minutes in sorted({remind or 0, *json.loads(extra or "[]")}, reverse=True):
+                if not minutes: continue
+                lines += ["BEGIN:VALARM", "ACTION:DISPLAY", f"DESCRIPTION:{_ics_escape(name)}",
+                          f"TRIGGER:-PT{int(minutes)}M", "END:VALARM"]
+            lines.append("END:VEVENT")
+            fp.write("".join(_ics_fold(l) for l in lines))
+            count += 1
+    fp.write("END:VCALENDAR\r\n")
+    return count
+
+
+# Đọc .ics từng dòng (nối dòng gập), yield record theo EXPORT_COLUMNS
+# Có TZID (tên IANA): giữ nguyên giờ tường, TZID lưu vào cột tz (trùng múi lịch nhận thì để NULL)
+# Giờ UTC (...Z) được đổi sang múi giờ tz của lịch nhận, giờ "trôi" (không múi) giữ nguyên
+def iter_ics_records(fp, tz=None):
+    def unfolded(lines):
+        prev = None
+        for line in lines:
+            line = line.rstrip("\r\n")
+            if line[:1] in (" ", "\t") and prev is not None:
+                prev += line[1:]
+                continue
+            if prev is not None: yield prev
+            prev = line
+        if prev is not None: yield prev
+
+    ev, in_alarm = None, False
+    for line in unfolded(fp):
+        name, _, value = line.partition(":")
+        key, *params = name.split(";")
+        key = key.upper()
+        if key == "BEGIN" and value == "VEVENT":
+            ev = {}
+        elif key == "BEGIN" and value == "VALARM":
+            in_alarm = True
+        elif key == "END" and value == "VALARM":
+            in_alarm = False
+        elif key == "END" and value == "VEVENT" and ev is not None:
+            start = ev.get("start")
+            event_tz = start[1] if start and start[1] and is_valid_tz(start[1]) else None
+            zone = event_tz or tz
+            start = _parse_ics_dt(*start, zone) if start else None
+            if start:
+                end = _parse_ics_dt(*ev["end"], zone) if ev.get("end") else None
+                remind, extra = split_reminders(ev.get("reminds"))
+                yield (ev.get("summary", ""), start, end, ev.get("location"),
+                       remind, extra, ev.get("rrule"), None if event_tz == tz else event_tz)
+            ev = None
+        elif ev is not None and in_alarm and key == "TRIGGER":
+            ev.setdefault("reminds", []).append(_parse_trigger(value))
+        elif ev is not None and not in_alarm:
+            if key in ("DTSTART", "DTEND"):
+                tzid = next((p.split("=", 1)[1].strip('"') for p in params if p.upper().startswith("TZID=")), None)
+                ev["start" if key == "DTSTART" else "end"] = (value, tzid)
+            elif key == "SUMMARY":
+                ev["summary"] = _ics_unescape(value)
+            elif key == "LOCATION":
+                ev["location"] = _ics_unescape(value)
+            elif key == "RRULE":
+                ev["rrule"] = value
+
+
+# Đổi giờ sang múi tz: chỉ với giờ UTC hoặc TZID khác tz (DTEND khác múi DTSTART)
+# TZID không phải tên IANA (VD "SE Asia Standard Time" của Outlook) -> coi như giờ trôi
+def _parse_ics_dt(value, tzid=None, tz=None):
+    utc = value.endswith("Z")
+    value = value[:-1] if utc else value
+    for fmt in ("%Y%m%dT%H%M%S", "%Y%m%d"):
+        try:
+            dt = datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+        if "T" in value and (utc or (tzid and tzid != tz and is_valid_tz(tzid))):
+            source = timezone.utc if utc else get_zone(tzid)
+            dt = dt.replace(tzinfo=source).astimezone(get_zone(tz)).replace(tzinfo=None)
+        return dt.strftime(DT_FORMAT)
+    return None
+
+
+# TRIGGER:-PT30M / -PT1H / -P1D -> số phút
+def _parse_trigger(value):
+    match = re.fullmatch(r'-?P(?:(\d+)W)?(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:\d+S)?)?', value.strip())
+    if not match: return 0
+    w, d, h, m = (int(g) if g else 0 for g in match.groups())
+    return ((w * 7 + d) * 24 + h) * 60 + m
+
+
+def import_ics(conn, fp, calendar=DEFAULT_CALENDAR):
+    return insert_batches(conn, iter_ics_records(fp, get_calendar_tz(conn, calendar)), calendar)
+
+
+# ==========================================
+# PARQUET / ARROW
+# ==========================================
+def _arrow_schema():
+    return pa.schema([
+        ("event", pa.string()), ("start_time", pa.string()), ("end_time", pa.string()),
+        ("location", pa.string()), ("reminder_minutes", pa.int32()), ("extra_reminders", pa.string()),
+        ("recurrence", pa.string()), ("tz", pa.string()),
+    ])
+
+
+# Cột tz ghi múi giờ hiệu lực (event không có thì của lịch) -> nhập vào lịch khác múi giờ vẫn đúng giờ
+def _iter_record_batches(conn, calendar):
+    schema = _arrow_schema()
+    calendar_tz = get_calendar_tz(conn, calendar)
+    for rows in iter_pages(conn, calendar):
+        columns = list(zip(*rows))[1:]  # bỏ id
+        columns[TZ_INDEX] = [tz or calendar_tz for tz in columns[TZ_INDEX]]
+        yield pa.RecordBatch.from_arrays([pa.array(col, type=f.type) for col, f in zip(columns, schema)],
+                                         schema=schema)
+
+
+def export_parquet(conn, path, calendar=DEFAULT_CALENDAR):
+    _require_arrow()
+    count = 0
+    with pq.ParquetWriter(path, _arrow_schema()) as writer:
+        for batch in _iter_record_batches(conn, calendar):
+            writer.write_batch(batch)
+            count += batch.num_rows
+    return count
+
+
+def export_arrow(conn, path, calendar=DEFAULT_CALENDAR):
+    _require_arrow()
+    count = 0
+    with pa.OSFile(path, "wb") as sink, ipc.new_file(sink, _arrow_schema()) as writer:
+        for batch in _iter_record_batches(conn, calendar):
+            writer.write_batch(batch)
+            count += batch.num_rows
+    return count
+
+
+# File xuất từ bản cũ thiếu cột mới (tz...) -> cột đó NULL
+# tz trùng múi giờ của lịch nhận -> NULL (đổi múi giờ lịch về sau thì event đổi theo)
+def _iter_batch_records(batches, calendar_tz=None):
+    for batch in batches:
+        names = batch.schema.names
+        cols = [batch.column(name).to_pylist() if name in names else [None] * batch.num_rows
+                for name in EXPORT_COLUMNS]
+        cols[TZ_INDEX] = [None if tz == calendar_tz else tz for tz in cols[TZ_INDEX]]
+        yield from zip(*cols)
+
+
+def import_parquet(conn, path, calendar=DEFAULT_CALENDAR):
+    _require_arrow()
+    parquet = pq.ParquetFile(path)
+    columns = [name for name in EXPORT_COLUMNS if name in parquet.schema_arrow.names]
+    batches = parquet.iter_batches(batch_size=PAGE_SIZE, columns=columns)
+    return insert_batches(conn, _iter_batch_records(batches, get_calendar_tz(conn, calendar)), calendar)
+
+
+def import_arrow(conn, path, calendar=DEFAULT_CALENDAR):
+    _require_arrow()
+    with pa.memory_map(path, "r") as source:
+        reader = ipc.open_file(source)
+        batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+        return insert_batches(conn, _iter_batch_records(batches, get_calendar_tz(conn, calendar)), calendar)
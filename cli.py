@@ -0,0 +1,222 @@
+# @title GIAO DIỆN DÒNG LỆNH (không cần Tk / Streamlit)
+# VD: python cli.py add "họp team tại P302 lúc 14h chiều mai"
+#     python cli.py list --from 2026-10-01 --to 2026-11-01
+#     python cli.py search "hop team" [--include-archived]
+#     python cli.py import lich.ics
+#     python cli.py archive --days 30
+#     python cli.py backup [--out ban_sao.db]
+#     python cli.py worker --shards 2
+# Chỉ nạp phần cần dùng: NER chỉ khi add / import file text, pyarrow chỉ khi import Parquet/Arrow
+import os
+import sys
+import json
+import heapq
+import argparse
+from datetime import timedelta
+from storage import connect, init_schema, parse_dt, iter_event_pages, iter_recurring, search_events, \
+    get_calendar_tz, split_reminders, insert_events, archive_events, DT_FORMAT, DEFAULT_CALENDAR, DEFAULT_DURATION, \
+    ARCHIVE_AFTER
+from timezones import local_now
+from backup import backup_db, take_snapshot, BACKUP_DIR, BACKUP_KEEP
+
+LIST_DAYS = 30  # --to mặc định = --from + 30 ngày
+PARSE_BATCH = 64  # số câu gửi parse_service mỗi lần khi nhập file text
+IMPORT_FORMATS = {".ics": "ics", ".parquet": "parquet", ".arrow": "arrow", ".txt": "text"}
+
+
+def format_row(eid, name, start, end, loc, rule):
+    line = f"{eid:>6}  {start[:16]}  {(end or '')[:16]:16}  {name}"
+    if loc: line += f" @ {loc}"
+    if rule: line += f"  🔁 {rule}"
+    return line
+
+
+# Kết quả phân tích -> record theo calendar_io.EXPORT_COLUMNS
+# Giờ kết thúc mặc định start + 1h (giống Tk/Streamlit); mọi mốc nhắc qua split_reminders
+def to_record(result):
+    start = parse_dt(result["start_time"])
+    end = result.get("end_time") or (start + DEFAULT_DURATION).strftime(DT_FORMAT)
+    remind, extra = split_reminders(result.get("reminders") or [result.get("reminder_minutes") or 0])
+    return (result["event"], start.strftime(DT_FORMAT), end, result.get("location"), remind, extra,
+            result.get("recurrence"), None)
+
+
+# [1440, 30] -> "1 ngày, 30 phút"
+def format_reminders(minutes):
+    parts = []
+    for m in minutes:
+        if m and m % 1440 == 0: parts.append(f"{m // 1440} ngày")
+        elif m and m % 60 == 0: parts.append(f"{m // 60} giờ")
+        else: parts.append(f"{m} phút")
+    return ", ".join(parts)
+
+
+# ==========================================
+# LỆNH
+# ==========================================
+# Câu ghép ("9h họp team, 14h gặp khách") thêm mọi mệnh đề trong 1 transaction, trùng 1 cái thì không thêm gì
+def cmd_add(args, conn):
+    from parse_service import get_parser  # nạp NER (hoặc dùng service) chỉ khi thêm
+    results = get_parser().process_compound(" ".join(args.text), tz=get_calendar_tz(conn, args.calendar),
+                                            calendar=args.calendar)
+    for result in results:
+        name, start, end, loc, remind, extra, rule, _ = to_record(result)
+        print(format_row("+", name, start, end, loc, rule))
+        print(f"        nhắc trước: {format_reminders([remind] + json.loads(extra or '[]'))}")
+    if args.dry_run: return
+    for result in results:
+        conflict = conn.execute("SELECT event FROM events WHERE calendar = ? AND start_time = ? LIMIT 1",
+                                (args.calendar, to_record(result)[1])).fetchone()
+        if conflict and not args.force:
+            sys.exit(f"⚠️ '{result['event']}' trùng lịch với: '{conflict[0]}' (dùng --force để vẫn thêm)")
+    insert_events(conn, results, args.calendar)
+
+
+# In theo trang khi đọc: sự kiện 1 lần (keyset) trộn với lần lặp theo giờ bắt đầu
+def cmd_list(args, conn):
+    tz = get_calendar_tz(conn, args.calendar)
+    window_start = parse_dt(args.from_) if args.from_ else local_now(tz).replace(hour=0, minute=0, second=0,
+                                                                                 microsecond=0)
+    window_end = parse_dt(args.to) if args.to else window_start + timedelta(days=LIST_DAYS)
+    if not window_start or not window_end: sys.exit("Ngày không hợp lệ, dùng dạng YYYY-MM-DD [HH:MM]")
+    one_offs = ((e.id, e.event, e.start_time, e.end_time, e.location, None)
+                for page in iter_event_pages(conn, window_start, window_end, args.calendar, args.page_size)
+                for e in page)
+    recurring = sorted(((eid, name, start, end, loc, rule)
+                        for eid, name, start, end, loc, _, rule in iter_recurring(conn, window_start, window_end,
+                                                                                   args.calendar)),
+                       key=lambda r: (r[2], r[0]))
+    count = 0
+    for row in heapq.merge(one_offs, recurring, key=lambda r: r[2]):
+        if args.limit and count >= args.limit: break
+        print(format_row(*row))
+        count += 1
+    print(f"-- {count} sự kiện", file=sys.stderr)
+
+
+def cmd_search(args, conn):
+    for e in search_events(conn, " ".join(args.query), args.limit, args.calendar, args.include_archived):
+        print(format_row(e.id, e.event, e.start_time, e.end_time, e.location, e.recurrence))
+
+
+def _iter_text_records(fp, tz, calendar):
+    from parse_service import get_parser  # chỉ file text mới cần NER
+    parser = get_parser()
+    batch = []
+    for line in fp:
+        if line.strip(): batch.append(line.strip())
+        if len(batch) >= PARSE_BATCH:
+            yield from (to_record(r) for r in parser.process_many(batch, tz=tz, calendar=calendar))
+            batch = []
+    if batch:
+        yield from (to_record(r) for r in parser.process_many(batch, tz=tz, calendar=calendar))
+
+
+def cmd_import(args, conn):
+    import calendar_io
+    fmt = args.format or IMPORT_FORMATS.get(os.path.splitext(args.file)[1].lower())
+    if fmt == "ics":
+        with open(args.file, encoding="utf-8") as fp:
+            count = calendar_io.import_ics(conn, fp, args.calendar)
+    elif fmt == "parquet":
+        count = calendar_io.import_parquet(conn, args.file, args.calendar)
+    elif fmt == "arrow":
+        count = calendar_io.import_arrow(conn, args.file, args.calendar)
+    elif fmt == "text":
+        # Mỗi dòng 1 câu lệnh, phân tích theo lô (parse_service gom chung nếu đang chạy)
+        # Câu không phân tích được -> dừng, không nhập dòng nào (cả file trong 1 transaction)
+        with open(args.file, encoding="utf-8") as fp:
+            try:
+                count = calendar_io.insert_batches(
+                    conn, _iter_text_records(fp, get_calendar_tz(conn, args.calendar), args.calendar), args.calendar)
+            except ValueError as e:
+                sys.exit(f"Không phân tích được: {e}")
+    else:
+        sys.exit(f"Không nhận ra định dạng của {args.file}, dùng --format")
+    print(f"Đã nhập {count} sự kiện vào lịch '{args.calendar}'")
+
+
+def cmd_archive(args, conn):
+    before = local_now(get_calendar_tz(conn, args.calendar)) - timedelta(days=args.days)
+    count = archive_events(conn, args.calendar, before)
+    print(f"Đã lưu trữ {count} sự kiện kết thúc trước {before.strftime(DT_FORMAT)}")
+
+
+# Sao lưu khi worker / UI vẫn đang ghi; không --out thì thêm 1 bản vào thư mục snapshot và xoay vòng
+def cmd_backup(args, conn):
+    if args.out:
+        path = backup_db(args.db, args.out)
+    else:
+        path = take_snapshot(args.db, args.dir, args.keep)
+    print(f"Đã sao lưu {args.db} -> {path} ({os.path.getsize(path) / 2 ** 20:.1f} MB)")
+
+
+def cmd_worker(args, conn):
+    from worker import run_workers
+    run_workers(args.db, args.shards)
+
+
+# ==========================================
+# MAIN
+# ==========================================
+def build_parser():
+    arg_parser = argparse.ArgumentParser(description="Quản lý lịch trình từ dòng lệnh")
+    arg_parser.add_argument("--db", default="scheduler.db")
+    arg_parser.add_argument("--calendar", default=os.environ.get("SCHEDULER_CALENDAR", DEFAULT_CALENDAR))
+    sub = arg_parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("add", help="Thêm sự kiện từ câu tiếng Việt")
+    p.add_argument("text", nargs="+")
+    p.add_argument("--dry-run", action="store_true", help="Chỉ in kết quả phân tích, không lưu")
+    p.add_argument("--force", action="store_true", help="Vẫn thêm khi trùng giờ bắt đầu")
+    p.set_defaults(func=cmd_add)
+
+    p = sub.add_parser("list", help="Liệt kê sự kiện trong khoảng thời gian")
+    p.add_argument("--from", dest="from_", help="YYYY-MM-DD [HH:MM], mặc định hôm nay")
+    p.add_argument("--to", help=f"YYYY-MM-DD [HH:MM], mặc định --from + {LIST_DAYS} ngày")
+    p.add_argument("--limit", type=int, default=0)
+    p.add_argument("--page-size", type=int, default=500)
+    p.set_defaults(func=cmd_list)
+
+    p = sub.add_parser("search", help="Tìm theo tên/địa điểm (không phân biệt dấu)")
+    p.add_argument("query", nargs="+")
+    p.add_argument("--limit", type=int, default=20)
+    p.add_argument("--include-archived", action="store_true", help="Tìm cả sự kiện đã lưu trữ (events_archive)")
+    p.set_defaults(func=cmd_search)
+
+    p = sub.add_parser("import", help="Nhập .ics / .parquet / .arrow / .txt (mỗi dòng 1 câu)")
+    p.add_argument("file")
+    p.add_argument("--format", choices=sorted(set(IMPORT_FORMATS.values())))
+    p.set_defaults(func=cmd_import)
+
+    p = sub.add_parser("archive", help="Chuyển sự kiện đã qua lâu sang bảng lưu trữ")
+    p.add_argument("--days", type=int, default=ARCHIVE_AFTER.days, help="Kết thúc quá bấy nhiêu ngày")
+    p.set_defaults(func=cmd_archive)
+
+    p = sub.add_parser("backup", help="Sao lưu DB đang chạy (SQLite backup API)")
+    p.add_argument("--out", help="Ghi ra file này thay vì thư mục snapshot")
+    p.add_argument("--dir", default=BACKUP_DIR, help="Thư mục snapshot")
+    p.add_argument("--keep", type=int, default=BACKUP_KEEP, help="Số snapshot giữ lại")
+    p.set_defaults(func=cmd_backup)
+
+    p = sub.add_parser("worker", help="Chạy worker nhắc lịch")
+    p.add_argument("--shards", type=int, default=1)
+    p.set_defaults(func=cmd_worker)
+    return arg_parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    conn = None
+    if args.command != "worker":
+        conn = connect(args.db)
+        init_schema(conn)
+    try:
+        args.func(args, conn)
+    except BrokenPipeError:
+        # `python cli.py list | head`: dừng in khi bên đọc đã đóng
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+
+
+if __name__ == "__main__":
+    main()
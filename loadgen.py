@@ -0,0 +1,157 @@
+# @title SINH TẢI GIẢ LẬP & ĐO BỘ NHẮC (offline, không bắn thông báo thật)
+# Chạy: python loadgen.py --events 50000 --window 120
+# Engine thay thế: --engine module:ham, cùng chữ ký với worker.check_reminders
+#   ham(db_name, clock=, notifier=, sleep=, max_ticks=, conn=)
+import os
+import time
+import random
+import argparse
+import importlib
+import contextlib
+from datetime import datetime, timezone
+from storage import connect, init_schema, sync_reminders, DT_FORMAT
+from timezones import from_utc_epoch
+from worker import CHECK_INTERVAL
+
+BENCH_PREFIX = "bench-"  # event/lịch giả đều có tiền tố này, chạy lại sẽ xóa đúng phần này
+REMINDER_CHOICES = [0, 5, 10, 15, 30, 60]
+
+
+# ==========================================
+# ĐỒNG HỒ GIẢ
+# ==========================================
+# Thời gian ảo trôi theo thời gian xử lý thật, sleep() nhảy tới ngay không chờ
+# -> vòng quét chậm bị trễ giờ như chạy thật, nhưng bài đo không phải đợi CHECK_INTERVAL
+class FakeClock:
+    def __init__(self, start_epoch):
+        self.virtual = float(start_epoch)
+        self.mark = time.perf_counter()
+        self.cpu_mark = time.process_time()
+        self.statements = 0
+        self.ticks = []  # (wall giây, cpu giây, số câu SQL) của từng vòng
+
+    def epoch(self):
+        return self.virtual + time.perf_counter() - self.mark
+
+    def now(self):
+        return datetime.fromtimestamp(self.epoch(), timezone.utc)
+
+    def sleep(self, seconds):
+        wall = time.perf_counter() - self.mark
+        self.ticks.append((wall, time.process_time() - self.cpu_mark, self.statements))
+        self.virtual += wall + seconds
+        self.statements = 0
+        self.mark = time.perf_counter()
+        self.cpu_mark = time.process_time()
+
+    # Gắn vào conn.set_trace_callback: đếm số câu SQL mỗi vòng
+    def count_statement(self, _sql):
+        self.statements += 1
+
+
+# Ghi lại thông báo thay cho plyer: tên event -> giờ ảo lúc báo (lấy lần đầu)
+class RecordingNotifier:
+    def __init__(self, clock):
+        self.clock = clock
+        self.fired = {}
+        self.summaries = 0
+
+    def __call__(self, title, msg):
+        if msg.startswith("Bạn đã lỡ"):
+            self.summaries += 1
+            return
+        self.fired.setdefault(msg.split(" tại ")[0], self.clock.epoch())
+
+
+# ==========================================
+# SINH DỮ LIỆU
+# ==========================================
+# N event có giờ nhắc rải đều theo phút trong [start_epoch, start_epoch + window_minutes)
+# Trả về {tên event: giờ nhắc UTC epoch} do sync_reminders tính
+def generate(conn, n, start_epoch, window_minutes, calendars=1, recurring=0.0, seed=0):
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n):
+        fire = start_epoch + rng.randrange(window_minutes) * 60
+        remind = rng.choice(REMINDER_CHOICES)
+        start = from_utc_epoch(fire + remind * 60)
+        rule = "FREQ=DAILY" if rng.random() < recurring else None
+        rows.append((f"{BENCH_PREFIX}{i}", start.strftime(DT_FORMAT), remind, rule, f"{BENCH_PREFIX}{i % calendars}"))
+    with conn:
+        conn.execute("DELETE FROM events WHERE calendar LIKE ?", (BENCH_PREFIX + "%",))
+        conn.executemany("""
+            INSERT INTO events (event, start_time, reminder_minutes, recurrence, calendar) VALUES (?, ?, ?, ?, ?)
+        """, rows)
+    sync_reminders(conn)
+    return dict(conn.execute("""
+        SELECT e.event, r.fire_at FROM events e JOIN reminders r ON r.event_id = e.id WHERE e.calendar LIKE ?
+    """, (BENCH_PREFIX + "%",)))
+
+
+def load_engine(spec):
+    module, _, attr = spec.partition(":")
+    return getattr(importlib.import_module(module), attr or "check_reminders")
+
+
+def _percentile(values, q):
+    if not values: return 0.0
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+# ==========================================
+# CHẠY & BÁO CÁO
+# ==========================================
+def run_benchmark(db_name, n, window_minutes, calendars=1, recurring=0.0, seed=0, engine="worker:check_reminders"):
+    conn = connect(db_name)
+    init_schema(conn)
+    start_epoch = (int(time.time()) // 60 + 1) * 60
+    scheduled = generate(conn, n, start_epoch, window_minutes, calendars, recurring, seed)
+
+    clock = FakeClock(start_epoch - CHECK_INTERVAL.total_seconds() / 2)
+    notifier = RecordingNotifier(clock)
+    conn.set_trace_callback(clock.count_statement)
+    max_ticks = int((window_minutes + 1) * 60 / CHECK_INTERVAL.total_seconds()) + 1
+    # Worker in 1 dòng mỗi lần báo -> bỏ output, vẫn tính thời gian in như chạy thật
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        load_engine(engine)(db_name, clock=clock.now, notifier=notifier, sleep=clock.sleep,
+                            max_ticks=max_ticks, conn=conn)
+    conn.set_trace_callback(None)
+
+    lateness = sorted(notifier.fired[name] - fire for name, fire in scheduled.items() if name in notifier.fired)
+    walls = [w for w, _, _ in clock.ticks]
+    stmts = [s for _, _, s in clock.ticks]
+    return {
+        "events": n, "calendars": calendars, "window_minutes": window_minutes,
+        "fired": len(lateness), "missed": n - len(lateness), "summaries": notifier.summaries,
+        "late_over_minute": sum(1 for l in lateness if l >= 60),
+        "lateness_p50": _percentile(lateness, 0.5), "lateness_p90": _percentile(lateness, 0.9),
+        "lateness_p99": _percentile(lateness, 0.99), "lateness_max": lateness[-1] if lateness else 0.0,
+        "ticks": len(clock.ticks), "tick_wall_avg": sum(walls) / len(walls), "tick_wall_max": max(walls),
+        "cpu_total": sum(c for _, c, _ in clock.ticks),
+        "sql_per_tick_avg": sum(stmts) / len(stmts), "sql_per_tick_max": max(stmts),
+    }
+
+
+def print_report(r):
+    print(f"Events: {r['events']} | Lịch: {r['calendars']} | Cửa sổ: {r['window_minutes']} phút")
+    print(f"Đã báo: {r['fired']} | Lỡ: {r['missed']} | Thông báo gộp: {r['summaries']}")
+    print(f"Độ trễ (giây): p50={r['lateness_p50']:.1f} p90={r['lateness_p90']:.1f} "
+          f"p99={r['lateness_p99']:.1f} max={r['lateness_max']:.1f} | Trễ quá 1 phút: {r['late_over_minute']}")
+    print(f"Vòng quét: {r['ticks']} | Thời gian/vòng: TB {r['tick_wall_avg'] * 1000:.1f}ms, "
+          f"max {r['tick_wall_max'] * 1000:.1f}ms | CPU: {r['cpu_total']:.2f}s "
+          f"({r['cpu_total'] / r['ticks'] * 1000:.1f}ms/vòng)")
+    print(f"Câu SQL/vòng: TB {r['sql_per_tick_avg']:.1f}, max {r['sql_per_tick_max']}")
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Sinh tải giả lập và đo độ trễ bộ nhắc")
+    arg_parser.add_argument("--db", default="bench.db", help="Có thể trỏ vào scheduler.db, chỉ đụng lịch bench-*")
+    arg_parser.add_argument("--events", type=int, default=10000)
+    arg_parser.add_argument("--window", type=int, default=60, help="Số phút rải giờ nhắc (< 1 ngày)")
+    arg_parser.add_argument("--calendars", type=int, default=1)
+    arg_parser.add_argument("--recurring", type=float, default=0.0, help="Tỉ lệ event lặp hằng ngày")
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument("--engine", default="worker:check_reminders")
+    args = arg_parser.parse_args()
+    print_report(run_benchmark(args.db, args.events, args.window, args.calendars, args.recurring, args.seed,
+                               args.engine))
@@ -0,0 +1,166 @@
+# @title CACHE NER THEO CỤM TỪ (SQLite, LRU)
+# Lưu chuỗi nhãn NER của từng cụm (chunk) đã gặp: "phòng họp P302", "team marketing"...
+# Câu ghép được hoàn toàn từ các cụm đã cache thì không cần chạy underthesea
+import os
+import re
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+
+CACHE_PATH = os.environ.get("SCHEDULER_NER_CACHE", "ner_cache.db")  # "" = tắt cache
+MAX_ENTRIES = 50000  # số cụm tối đa trong SQLite, vượt thì xóa 10% cụm lâu không dùng
+MEMORY_ENTRIES = 2048  # LRU trong RAM cho cụm hay gặp
+MAX_SEGMENT = 8  # số âm tiết tối đa của 1 cụm
+MAX_SENTENCE = 64  # câu dài hơn không lưu nguyên câu
+CHECK_EVERY = 100  # số lần ghi giữa 2 lần kiểm tra kích thước
+
+TOKEN_RE = re.compile(r'\w+|[^\w\s]')
+
+
+# Âm tiết + dấu câu tách riêng (giống cách underthesea tách)
+def tokenize(text):
+    return TOKEN_RE.findall(text)
+
+
+# Khóa cụm: giữ hoa/thường (ảnh hưởng nhãn LOC), số -> 0 để "9h" và "10h" dùng chung
+def segment_key(tokens):
+    return re.sub(r'\d+', '0', " ".join(tokens))
+
+
+class NERCache:
+    def __init__(self, path=CACHE_PATH, max_entries=MAX_ENTRIES, memory_entries=MEMORY_ENTRIES):
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self.memory = OrderedDict()
+        self.touched = {}  # key -> last_used, ghi dồn xuống DB khi store
+        self.writes = 0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS ner_cache (
+                key TEXT PRIMARY KEY,
+                tags TEXT NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_ner_cache_used ON ner_cache(last_used)")
+        self.conn.commit()
+
+    def _remember(self, key, tags):
+        self.memory[key] = tags
+        self.memory.move_to_end(key)
+        if len(self.memory) > self.memory_entries:
+            self.memory.popitem(last=False)
+
+    # Tra nhiều khóa 1 lần: RAM trước, còn lại 1 câu SELECT ... IN
+    def _get_many(self, keys):
+        found = {k: self.memory[k] for k in keys if k in self.memory}
+        missing = [k for k in keys if k not in found]
+        for i in range(0, len(missing), 500):
+            part = missing[i:i + 500]
+            rows = self.conn.execute(f"SELECT key, tags FROM ner_cache WHERE key IN ({','.join('?' * len(part))})",
+                                     part).fetchall()
+            for key, tags in rows:
+                found[key] = json.loads(tags)
+        return found
+
+    # Kết quả giống underthesea.ner [(word, pos, chunk, tag), ...] hoặc None nếu còn đoạn chưa cache
+    def lookup(self, text):
+        tokens = tokenize(text)
+        if not tokens: return None
+        n = len(tokens)
+        keys = {segment_key(tokens)} if n <= MAX_SENTENCE else set()
+        for i in range(n):
+            for length in range(1, min(MAX_SEGMENT, n - i) + 1):
+                keys.add(segment_key(tokens[i:i + length]))
+        with self.lock:
+            found = self._get_many(list(keys))
+            # Ưu tiên nguyên câu, không thì ghép cụm dài nhất từ trái sang phải
+            spans = []
+            whole = segment_key(tokens)
+            if n <= MAX_SENTENCE and whole in found:
+                spans.append((0, n, whole))
+            else:
+                i = 0
+                while i < n:
+                    for length in range(min(MAX_SEGMENT, n - i), 0, -1):
+                        key = segment_key(tokens[i:i + length])
+                        if key in found:
+                            spans.append((i, i + length, key))
+                            i += length
+                            break
+                    else:
+                        return None
+            now = time.time()
+            result = []
+            for start, _, key in spans:
+                tags = found[key]
+                self._remember(key, tags)
+                self.touched[key] = now
+                pos = start
+                # Dựng lại word từ âm tiết thật của câu (số trong khóa đã bị chuẩn hóa)
+                for n_syll, p, chunk, tag in tags:
+                    result.append((" ".join(tokens[pos:pos + n_syll]), p, chunk, tag))
+                    pos += n_syll
+            return result
+
+    # Lưu kết quả model: nguyên câu + từng cụm (chunk) + từng cặp cụm liền nhau
+    def store(self, text, ner_result):
+        tokens = tokenize(text)
+        # Tách từ của model không khớp cách tách của cache (VD "T.P") -> không lưu
+        if any(" ".join(tokenize(w)) != w for w, *_ in ner_result) or \
+                [t for w, *_ in ner_result for t in w.split()] != tokens:
+            return
+        words = [(len(w.split()), p, chunk, tag) for w, p, chunk, tag in ner_result]
+        segments, start = [], 0
+        for idx, (_, _, chunk, tag) in enumerate(words):
+            if idx and not chunk.startswith("I-") and not tag.startswith("I-"):
+                segments.append((start, idx))
+                start = idx
+        segments.append((start, len(words)))
+        spans = segments + [(a[0], b[1]) for a, b in zip(segments, segments[1:])]
+        if len(tokens) <= MAX_SENTENCE: spans.append((0, len(words)))
+
+        offsets = [0]
+        for w in words: offsets.append(offsets[-1] + w[0])
+        now = time.time()
+        rows = {}
+        for a, b in spans:
+            if offsets[b] - offsets[a] > MAX_SEGMENT and (a, b) != (0, len(words)): continue
+            rows[segment_key(tokens[offsets[a]:offsets[b]])] = [list(w) for w in words[a:b]]
+        with self.lock:
+            with self.conn:
+                self.conn.executemany("""
+                    INSERT INTO ner_cache (key, tags, last_used) VALUES (?, ?, ?)
+                    ON CONFLICT(key) DO UPDATE SET tags = excluded.tags, last_used = excluded.last_used
+                """, [(k, json.dumps(v, ensure_ascii=False), now) for k, v in rows.items()])
+                self._flush_touched()
+            for k, v in rows.items(): self._remember(k, v)
+            self.writes += 1
+            if self.writes % CHECK_EVERY == 0: self._evict()
+
+    def _flush_touched(self):
+        if not self.touched: return
+        self.conn.executemany("UPDATE ner_cache SET last_used = ? WHERE key = ?",
+                              [(t, k) for k, t in self.touched.items()])
+        self.touched = {}
+
+    # Vượt MAX_ENTRIES -> xóa 10% cụm lâu không dùng (đi theo index last_used)
+    def _evict(self):
+        count = self.conn.execute("SELECT COUNT(*) FROM ner_cache").fetchone()[0]
+        if count <= self.max_entries: return
+        excess = count - self.max_entries + self.max_entries // 10
+        with self.conn:
+            self._flush_touched()
+            self.conn.execute("""
+                DELETE FROM ner_cache WHERE key IN (SELECT key FROM ner_cache ORDER BY last_used LIMIT ?)
+            """, (excess,))
+        self.memory.clear()
+
+    def clear(self):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM ner_cache")
+            self.memory.clear()
+            self.touched = {}
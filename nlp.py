@@ -1,9 +1,39 @@
 ﻿# @title TỔNG HỢP
 import re
 import json
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from underthesea import ner
-from scipy.stats import norm
+from recurrence import format_rule
+from timezones import DEFAULT_TZ, local_now
+
+
+# Nạp underthesea khi gọi NER lần đầu (import nlp để dùng Preprocess không kéo theo model)
+# Câu ghép được từ các cụm đã cache (ner_cache.db) thì không chạy model
+# Cache mở lần đầu dưới khóa: các thread phân tích song song không mở 2 kết nối
+_ner_cache = None
+_ner_cache_lock = threading.Lock()
+
+
+def ner(text):
+    global _ner_cache
+    if _ner_cache is None:
+        with _ner_cache_lock:
+            if _ner_cache is None:
+                from ner_cache import NERCache, CACHE_PATH
+                _ner_cache = NERCache() if CACHE_PATH else False
+    cached = _ner_cache.lookup(text) if _ner_cache else None
+    if cached is not None: return cached
+    from underthesea import ner as underthesea_ner
+    result = underthesea_ner(text)
+    if _ner_cache: _ner_cache.store(text, result)
+    return result
+
+
+GENERIC_EVENT = "Sự kiện chung"  # tên event khi câu không còn nội dung
+
+
 # ==========================================
 # --TIỀN XỬ LÝ--
 class Preprocess:
@@ -18,29 +48,25 @@ class Preprocess:
         "t5": "thứ 5", "t6": "thứ 6", "t7": "thứ 7"
     }
 
+    # Engine chuẩn hóa dùng chung (NFC + 1 regex), từ điển user/lịch tự nạp lại, xem normalizer.py
+    _normalizer = None
+
     @staticmethod
-    def basic_clean(text):
-        # Nếu không phải string
-        if not isinstance(text, str): return ""
-        # Chuẩn hóa sau dấu câu có whitespace
-        text = re.sub(r'([.,!?;()])', r'\1 ', text)
-        # Loại bỏ whitespace thừa
-        text = re.sub(r'\s+', ' ', text)
-        return text
+    def normalizer():
+        if Preprocess._normalizer is None:
+            from normalizer import Normalizer
+            Preprocess._normalizer = Normalizer(Preprocess.VI_NORM_DICT)
+        return Preprocess._normalizer
 
+    # calendar: dùng thêm từ điển riêng của lịch đó
     @staticmethod
-    def VI_normalize(text: str):
-        words = text.split()
-        processed = []
-        for word in words:
-            processed.append(Preprocess.VI_NORM_DICT.get(word, word))
-        normalized = " ".join(processed)
-        return normalized
+    def Text_Preprocess_Util(text, calendar=None):
+        return Preprocess.normalizer().normalize(text, calendar)
 
-    def Text_Preprocess_Util(text):
-        cleaned = Preprocess.basic_clean(text)
-        normalized = Preprocess.VI_normalize(cleaned)
-        return normalized
+    # Cả lô trong 1 lượt
+    @staticmethod
+    def Text_Preprocess_Many(texts, calendar=None):
+        return Preprocess.normalizer().normalize_many(texts, calendar)
 
 
 # ==========================================
@@ -134,7 +160,7 @@ class CleaningJunk:
             text = re.sub(r'\s+', ' ', text).strip()
             if text != original_text:
                 has_change = True
-        return text.strip() if len(text) > 1 else "Sự kiện chung"
+        return text.strip() if len(text) > 1 else GENERIC_EVENT
 
     # @title Dọn rác chuỗi loc
     def refine_location(loc_text):
@@ -170,10 +196,15 @@ class CleaningJunk:
 # ==========================================
 # XỬ LÝ THỜI GIAN
 # ==========================================
-TODAY = datetime.now()
 class DateParser:
-    def __init__(self, current_time=TODAY):
-        self.current_time = current_time
+    def __init__(self, current_time=None, tz=DEFAULT_TZ):
+        self._current_time = current_time
+        self.tz = tz
+
+    # Mốc "hôm nay" theo múi giờ của user, lấy lúc parse (không cố định từ lúc import)
+    @property
+    def current_time(self):
+        return self._current_time or local_now(self.tz)
 
     # Xử lý ngày tương đối
     def parse_relative_date(self, date_str):
@@ -232,13 +263,60 @@ class DateParser:
         if session and any(s in session for s in ['chiều', 'tối', 'pm']) and h < 12: h += 12
         return h, m
 
+    # Nhận diện lặp lại (VD: thứ 2 hàng tuần, mỗi 2 tuần, cách tuần, hằng ngày)
+    # Trả về (rule, ds cụm từ đã khớp để loại khỏi tên event)
+    def parse_recurrence(self, text):
+        freq_map = {'ngày': 'DAILY', 'sáng': 'DAILY', 'trưa': 'DAILY', 'chiều': 'DAILY', 'tối': 'DAILY',
+                    'tuần': 'WEEKLY', 'tháng': 'MONTHLY', 'năm': 'YEARLY'}
+        weekday_map = {'2': 0, 'hai': 0, '3': 1, 'ba': 1, '4': 2, 'tư': 2, '5': 3, 'năm': 3,
+                       '6': 4, 'sáu': 4, '7': 5, 'bảy': 5}
+        freq, interval, byday, phrases = None, 1, [], []
+
+        # "khách hàng tuần sau" không phải "hàng tuần"
+        match = re.search(r'(?<!khách )(?<!cửa )(?:hàng|hằng|mỗi)\s+(?:(\d+)\s+)?(ngày|tuần|tháng|năm|sáng|trưa|chiều|tối)\b'
+                          r'(?!\s+(?:sau|tới|này|trước))',
+                          text, re.IGNORECASE)
+        if match:
+            freq = freq_map[match.group(2).lower()]
+            interval = int(match.group(1)) if match.group(1) else 1
+            phrases.append(match.group(0))
+        match = re.search(r'cách\s+(?:(\d+)\s+)?(ngày|tuần|tháng)', text, re.IGNORECASE)
+        if match and not freq:  # cách tuần = 2 tuần 1 lần
+            freq = freq_map[match.group(2).lower()]
+            interval = int(match.group(1)) + 1 if match.group(1) else 2
+            phrases.append(match.group(0))
+        match = re.search(r'ngày (?:thường|làm việc)', text, re.IGNORECASE)
+        if match and freq in (None, 'WEEKLY', 'DAILY'):
+            freq, byday = 'WEEKLY', [0, 1, 2, 3, 4]
+            phrases.append(match.group(0))
+        # mỗi/các thứ X -> lặp theo tuần
+        if not freq and re.search(r'(?:mỗi|các|hàng|hằng)\s+(?:thứ|chủ nhật)', text, re.IGNORECASE):
+            freq = 'WEEKLY'
+            phrases += re.findall(r'(?:mỗi|các|hàng|hằng)(?=\s+(?:thứ|chủ nhật))', text, re.IGNORECASE)
+        if not freq: return None, []
+
+        if freq == 'WEEKLY' and not byday:
+            # Cả cụm ds thứ ("thứ 3 và thứ 5", "thứ 2, thứ 4") là 1 phrase -> tên event không còn sót "và"
+            day = r'(?:thứ\s*(?:\d|hai|ba|tư|năm|sáu|bảy)\b|chủ nhật)'
+            for days in re.finditer(rf'{day}(?:\s*(?:,\s*và|,|và|hoặc)\s*{day})*', text, re.IGNORECASE):
+                phrases.append(days.group(0))
+                for m in re.finditer(r'thứ\s*(\d|hai|ba|tư|năm|sáu|bảy)\b|chủ nhật', days.group(0), re.IGNORECASE):
+                    if not m.group(1): byday.append(6)
+                    elif m.group(1).lower() in weekday_map: byday.append(weekday_map[m.group(1).lower()])
+        return format_rule(freq, interval, byday), phrases
+
 
 # ==========================================
 # HÀM LẤY LỊCH
 # ==========================================
+# Đơn vị mốc nhắc -> số phút
+REMINDER_UNITS = {"phút": 1, "p": 1, "giờ": 60, "tiếng": 60, "h": 60, "ngày": 1440, "tuần": 10080}
+PARSE_WORKERS = 4  # số câu/mệnh đề phân tích song song khi chạy tại chỗ
+
+
 class SchedulerMain:
-    def __init__(self):
-        self.parser = DateParser()
+    def __init__(self, tz=DEFAULT_TZ):
+        self.parser = DateParser(tz=tz)
         # self.cleaner = CleaningJunk()
         # RULE CHO REGEX
         # Nếu gặp các từ mở đầu loc (tại, ở..), lấy các từ ở sau, dừng khi gặp từ chỉ thgian/EoL
@@ -250,9 +328,52 @@ class SchedulerMain:
         self.date_pattern = re.compile(
             r'(\d{1,2}[/-]\d{1,2}(?:[/-]\d{2,4})?|hôm nay|nay|ngày mai|mai|mốt|ngày kia|thứ\s*\d|chủ nhật|cuối tuần|tuần sau|tuần tới)',
             re.IGNORECASE)
-        # Format reminder: nhắc/báo trước/sớm X
-        self.reminder_pattern = re.compile(r'(?:nhắc|báo)(?:\s+trước|\s+sớm)?\s+(\d+)\s*(phút|p|giờ|tiếng|h)',
-                                           re.IGNORECASE)
+        # Format reminder: nhắc/báo trước/sớm X [, và Y ...] (VD "nhắc trước 1 ngày và 30 phút")
+        remind_unit = r'(?:phút|p|giờ|tiếng|h|ngày|tuần)'
+        self.reminder_pattern = re.compile(
+            rf'(?:nhắc|báo)(?:\s+lại)?(?:\s+trước|\s+sớm)?\s+\d+\s*{remind_unit}'
+            rf'(?:\s*(?:,|và|,\s*và)\s*(?:trước\s+)?\d+\s*{remind_unit})*', re.IGNORECASE)
+        self.reminder_amount_pattern = re.compile(rf'(\d+)\s*({remind_unit})', re.IGNORECASE)
+        # Câu hỏi tìm giờ trống: "tìm giờ trống 1 tiếng chiều mai"
+        self.free_query_pattern = re.compile(r'(?:giờ|thời gian|lúc|khung giờ)\s+(?:trống|rảnh)|rảnh lúc nào',
+                                             re.IGNORECASE)
+        self.duration_pattern = re.compile(r'(\d+(?:[.,]\d+)?)\s*(phút|p|giờ|tiếng|h)\b', re.IGNORECASE)
+        # Câu ghép: tách ở dấu phẩy/chấm phẩy/xuống dòng và "và", "rồi", "sau đó"
+        self.clause_sep_pattern = re.compile(r'\s*[,;]\s*|\s+(?:và|rồi|sau đó)\s+', re.IGNORECASE)
+        self.session_pattern = re.compile(r'(sáng|trưa|chiều|tối|đêm)', re.IGNORECASE)
+
+    # --CÂU HỎI TÌM GIỜ TRỐNG--
+    def is_free_time_query(self, input, calendar=None):
+        text = Preprocess.Text_Preprocess_Util(input, calendar)
+        return bool(self.free_query_pattern.search(text))
+
+    # Trả về khoảng ngày, độ dài và khung giờ cần tìm (không cần NER)
+    def parse_free_time_query(self, input, tz=None, calendar=None):
+        parser = DateParser(tz=tz) if tz else self.parser
+        text = Preprocess.Text_Preprocess_Util(input, calendar)
+        duration = timedelta(hours=1)
+        dur_match = self.duration_pattern.search(text)
+        if dur_match:
+            val = float(dur_match.group(1).replace(',', '.'))
+            unit = dur_match.group(2).lower()
+            duration = timedelta(minutes=val) if unit in ['phút', 'p'] else timedelta(hours=val)
+        raw_dates = self.date_pattern.findall(text)
+        now = parser.current_time
+        day = parser.parse_relative_date(raw_dates[0]) if raw_dates else now.date()
+        # Khung giờ theo buổi, mặc định giờ hành chính
+        session_hours = {'sáng': (8, 12), 'trưa': (11, 14), 'chiều': (13, 18), 'tối': (18, 22)}
+        session = re.search(r'(sáng|trưa|chiều|tối)', text, re.IGNORECASE)
+        h_start, h_end = session_hours[session.group(0).lower()] if session else (8, 18)
+        # "tuần sau/tuần này" -> tìm cả tuần
+        days = 7 if re.search(r'tuần', text, re.IGNORECASE) and not re.search(r'thứ|chủ nhật', text, re.IGNORECASE) else 1
+        range_start = max(datetime.combine(day, datetime.min.time()), now.replace(second=0, microsecond=0))
+        return {
+            "range_start": range_start,
+            "range_end": datetime.combine(day, datetime.min.time()) + timedelta(days=days),
+            "duration": duration,
+            "work_start": datetime.min.time().replace(hour=h_start),
+            "work_end": datetime.min.time().replace(hour=h_end)
+        }
 
     # --HÀM TRÍCH XUẤT EVENT--
     def extract_event_name(self, input, remove_list):
@@ -272,13 +393,20 @@ class SchedulerMain:
 
         clean_text = re.sub(r'[,\.\-]', ' ', clean_text)  # bỏ dấu
         clean_text = re.sub(r'\s+', ' ', clean_text).strip()  # bỏ whitespace
+        clean_text = re.sub(r'^(?:và|hoặc)\s+|\s+(?:và|hoặc)$', '', clean_text, flags=re.IGNORECASE)  # liên từ sót ở 2 đầu
         event = CleaningJunk.clean_event_name(clean_text)
         return event.strip()
 
-    # --HÀM XỬ LÝ CHÍNH--
-    def process(self, input):
+    # --PHÂN TÍCH DÙNG CHUNG--
+    # NER + regex chạy 1 lần, process() và candidates() dựng kết quả từ đây
+    # calendar: lịch của user, chọn từ điển viết tắt riêng (nếu có)
+    def analyze(self, input, tz=None, calendar=None):
+        return self._analyze(Preprocess.Text_Preprocess_Util(input, calendar), tz)
+
+    # text đã chuẩn hóa
+    def _analyze(self, text, tz=None):
+        parser = DateParser(tz=tz) if tz else self.parser
         # 1. NER tìm location
-        text = Preprocess.Text_Preprocess_Util(input)
         # print(processed)
         raw_NER = ner(text)
         ner_locs = []
@@ -301,59 +429,70 @@ class SchedulerMain:
             if curr: ner_locs.append(" ".join(curr))
 
         # 2. Regex extraction
+        # Lấy mọi mốc nhắc (phút), sớm nhất trước
+        remind_strs = []
+        reminders = set()
+        for remind_match in self.reminder_pattern.finditer(text):
+            remind_strs.append(remind_match.group(0))
+            for val, unit in self.reminder_amount_pattern.findall(remind_match.group(0)):
+                reminders.add(int(val) * REMINDER_UNITS[unit.lower()])
+        reminders = sorted(reminders, reverse=True) or [0]
+        # Bỏ cụm nhắc trước khi tìm giờ/ngày: "nhắc trước 1 ngày, 2 giờ" không phải giờ của sự kiện
+        scan = self.reminder_pattern.sub(" ", text)
         regex_locs = [m.group(1) for m in self.loc_pattern.finditer(text)]  # List lấy phần giữa regex loc
-        raw_times = self.time_pattern.findall(text)
-        raw_dates = self.date_pattern.findall(text)
-        session = re.search(r'(sáng|trưa|chiều|tối|đêm)', text, re.IGNORECASE)
+        raw_times = self.time_pattern.findall(scan)
+        raw_dates = self.date_pattern.findall(scan)
+        session = re.search(r'(sáng|trưa|chiều|tối|đêm)', scan, re.IGNORECASE)
         session_val = session.group(0) if session else None
-        remind_match = self.reminder_pattern.search(text)
-        reminder_min = 0
-        remind_str = ""
-        if remind_match:  # lấy phút
-            remind_str = remind_match.group(0)
-            val = int(remind_match.group(1))
-            unit = remind_match.group(2)
-            reminder_min = val * 60 if unit in ['giờ', 'tiếng', 'h'] else val
+        recurrence, recur_phrases = parser.parse_recurrence(scan)
 
         # 3. Hợp nhất chuỗi loc
         # Nếu NER null thì convert sang rỗng
         if ner_locs is None: ner_locs = []
         all_locs = list(set(ner_locs + regex_locs))
         clean_locs = [l.strip() for l in all_locs if len(l.strip()) > 1]  # lọc chuỗi ngắn
-        if not clean_locs:
-            final_loc = None
-        else:
-            longest_loc = max(clean_locs, key=len) if clean_locs else None
-            final_loc = CleaningJunk.refine_location(longest_loc)
 
+        # Cụm lặp trước: "thứ 3 và thứ 5" phải bỏ nguyên cụm trước khi bỏ từng ngày "thứ 3", "thứ 5"
+        remove_list = recur_phrases + clean_locs + raw_times + raw_dates + remind_strs
+        if session_val: remove_list.append(session_val)
+        return {
+            "parser": parser, "ner_locs": ner_locs, "regex_locs": regex_locs, "clean_locs": clean_locs,
+            "raw_times": raw_times, "raw_dates": raw_dates, "session": session_val,
+            "event": self.extract_event_name(text, remove_list),
+            "reminder_minutes": reminders[0], "reminders": reminders, "recurrence": recurrence,
+        }
+
+    # Dựng kết quả từ phân tích, date0/time0/loc: lựa chọn thay cho mặc định
+    def _build(self, a, date0=None, time0=None, loc=None):
+        parser, raw_times, raw_dates, session_val = a["parser"], a["raw_times"], a["raw_dates"], a["session"]
         # 4. Parsing
         start_dt = None
         end_dt = None
 
         # Mặc định datetime đầu tiên nếu ds rỗng
-        date0 = raw_dates[0] if raw_dates else "hôm nay"
-        time0 = raw_times[0] if raw_times else "08:00"
+        date0 = date0 or (raw_dates[0] if raw_dates else "hôm nay")
+        time0 = time0 or (raw_times[0] if raw_times else "08:00")
 
         # Xử lý start-end time
         # TH1: đủ 2 giờ 2 ngày
         if len(raw_times) >= 2 and len(raw_dates) >= 2:
             # Start:
-            d1 = self.parser.parse_relative_date(raw_dates[0])
-            h1, m1 = self.parser.parse_time(raw_times[0], session_val)
+            d1 = parser.parse_relative_date(raw_dates[0])
+            h1, m1 = parser.parse_time(raw_times[0], session_val)
             start_dt = datetime.combine(d1, datetime.min.time()).replace(hour=h1, minute=m1)
             # End:
-            d2 = self.parser.parse_relative_date(raw_dates[1])
-            h2, m2 = self.parser.parse_time(raw_times[1], session_val)  # Session thường chỉ áp dụng chung
+            d2 = parser.parse_relative_date(raw_dates[1])
+            h2, m2 = parser.parse_time(raw_times[1], session_val)  # Session thường chỉ áp dụng chung
             end_dt = datetime.combine(d2, datetime.min.time()).replace(hour=h2, minute=m2)
 
         # TH2: 2 giờ 1 Ngày (VD 14h -> 16h30 ngày mai)
         elif len(raw_times) >= 2 and len(raw_dates) <= 1:
-            target_date = self.parser.parse_relative_date(date0)
+            target_date = parser.parse_relative_date(date0)
             # Start
-            h1, m1 = self.parser.parse_time(raw_times[0], session_val)
+            h1, m1 = parser.parse_time(raw_times[0], session_val)
             start_dt = datetime.combine(target_date, datetime.min.time()).replace(hour=h1, minute=m1)
             # End
-            h2, m2 = self.parser.parse_time(raw_times[1], session_val)
+            h2, m2 = parser.parse_time(raw_times[1], session_val)
             end_dt = datetime.combine(target_date, datetime.min.time()).replace(hour=h2, minute=m2)
 
             # Nếu End < Start (VD 22h đêm đến 2h sáng), end +1 ngày
@@ -362,23 +501,150 @@ class SchedulerMain:
 
         # TH3: không có endtime
         else:
-            target_date = self.parser.parse_relative_date(date0)
-            h1, m1 = self.parser.parse_time(time0, session_val)
+            target_date = parser.parse_relative_date(date0)
+            h1, m1 = parser.parse_time(time0, session_val)
             start_dt = datetime.combine(target_date, datetime.min.time()).replace(hour=h1, minute=m1)
 
         # ---------------------------------------------------------
         # OUTPUT
         # ---------------------------------------------------------
-        remove_list = clean_locs + raw_times + raw_dates + ([remind_str] if remind_str else [])
-        if session_val: remove_list.append(session_val)
-        event_name = self.extract_event_name(text, remove_list)
+        if loc is None and a["clean_locs"]:
+            loc = CleaningJunk.refine_location(max(a["clean_locs"], key=len))
         normalizer = TimeRangeNormalizer()  # xử lý lỗi thgian
         start_dt, end_dt = normalizer.fix_range(start_dt, end_dt)
         return {
-            "event": event_name,
+            "event": a["event"],
             "start_time": start_dt.strftime('%Y-%m-%d %H:%M:%S'),
             "end_time": end_dt.strftime('%Y-%m-%d %H:%M:%S') if end_dt else None,
-            "location": final_loc,
-            "reminder_minutes": reminder_min
+            "location": loc or None,
+            "reminder_minutes": a["reminder_minutes"],
+            "reminders": a["reminders"],
+            "recurrence": a["recurrence"]
         }
 
+    # --HÀM XỬ LÝ CHÍNH--
+    # tz: múi giờ của user/lịch, giờ trả về là giờ địa phương theo múi giờ đó
+    def process(self, input, tz=None, calendar=None):
+        return self._build(self.analyze(input, tz, calendar))
+
+    # Nhiều câu độc lập: chuẩn hóa cả lô 1 lượt, phân tích song song (cùng định dạng với ParseClient.process_many)
+    def process_many(self, texts, tz=None, calendar=None):
+        texts = Preprocess.Text_Preprocess_Many(list(texts), calendar)
+        if len(texts) < 2: return [self._build(self._analyze(t, tz)) for t in texts]
+        with ThreadPoolExecutor(max_workers=min(PARSE_WORKERS, len(texts))) as pool:
+            return list(pool.map(lambda t: self._build(self._analyze(t, tz)), texts))
+
+    # --CÂU GHÉP--
+    # Mệnh đề độc lập: có mốc thời gian (giờ/ngày/buổi) và còn nội dung sau khi bỏ mốc
+    def _is_clause(self, text):
+        scan = self.reminder_pattern.sub(" ", text)  # mốc trong cụm nhắc không tính là giờ/ngày
+        times, dates = self.time_pattern.findall(scan), self.date_pattern.findall(scan)
+        session = self.session_pattern.findall(scan)
+        if not (times or dates or session): return False
+        reminds = [m.group(0) for m in self.reminder_pattern.finditer(text)]
+        return self.extract_event_name(text, times + dates + session + reminds) not in ("", GENERIC_EVENT)
+
+    # "9h họp team ở P302, 14h gặp khách tại quận 1, tối mai đi ăn với sếp" -> 3 câu
+    # Đoạn không đủ thành mệnh đề (địa chỉ "quận 1, TP HCM", "họp với A và B lúc 9h") ghép lại đoạn trước
+    # Mệnh đề thiếu ngày mượn ngày của mệnh đề trước; cùng ngày thì mượn cả buổi
+    # ("sáng mai 9h họp, 10h gặp khách" -> "sáng mai 10h gặp khách"). Chỉ dùng regex, không cần NER
+    def split_clauses(self, input, calendar=None):
+        # Chuẩn hóa gộp mọi khoảng trắng -> đổi xuống dòng thành ";" trước
+        text = "; ".join(Preprocess.Text_Preprocess_Many(input.splitlines() or [input], calendar))
+        # Không tách bên trong cụm nhắc ("nhắc trước 1 ngày, 2 giờ")
+        protected = [m.span() for m in self.reminder_pattern.finditer(text)]
+        pieces, last, sep = [], 0, ""
+        for m in self.clause_sep_pattern.finditer(text):
+            if any(s <= m.start() < e for s, e in protected): continue
+            pieces.append((sep, text[last:m.start()].strip()))
+            last, sep = m.end(), m.group(0)
+        pieces.append((sep, text[last:].strip()))
+
+        groups = []  # [câu, đã là mệnh đề độc lập]
+        for sep, piece in pieces:
+            if not piece: continue
+            independent = self._is_clause(piece)
+            if groups and not (independent and groups[-1][1]):
+                merged = groups[-1][0] + sep + piece
+                groups[-1] = [merged, groups[-1][1] or self._is_clause(merged)]
+            else:
+                groups.append([piece, independent])
+        if len(groups) < 2: return [input]
+
+        clauses, date, session = [], None, None
+        for clause, _ in groups:
+            dates = self.date_pattern.findall(clause)
+            own_session = self.session_pattern.search(clause)
+            prefix = []
+            if dates: date, session = dates[0], None
+            if own_session: session = own_session.group(0)
+            elif session: prefix.append(session)
+            if not dates and date: prefix.append(date)
+            clauses.append(" ".join(prefix + [clause]))
+        return clauses
+
+    # Câu ghép -> ds kết quả (1 phần tử nếu chỉ có 1 mệnh đề), các mệnh đề phân tích song song
+    def process_compound(self, input, tz=None, calendar=None):
+        return self.process_many(self.split_clauses(input, calendar), tz, calendar)
+
+    # --ỨNG VIÊN CÓ ĐIỂM--
+    # Các lựa chọn (giá trị, độ tin cậy) cho từng trường; lựa chọn đầu = mặc định của process()
+    def _field_options(self, a):
+        raw_times, raw_dates, session_val = a["raw_times"], a["raw_dates"], a["session"]
+        # Địa điểm: NER và regex cùng thấy thì chắc hơn; chuỗi dài nhất là mặc định
+        loc_opts = []
+        if a["clean_locs"]:
+            def source_score(l):
+                return round(0.5 + 0.2 * any(l == n.strip() for n in a["ner_locs"]) +
+                             0.2 * any(l == r.strip() for r in a["regex_locs"]), 2)
+            longest = max(a["clean_locs"], key=len)
+            loc_opts.append((CleaningJunk.refine_location(longest), source_score(longest)))
+            for l in sorted(a["clean_locs"], key=source_score, reverse=True):
+                refined = CleaningJunk.refine_location(l)
+                if refined and refined not in [o for o, _ in loc_opts]:
+                    loc_opts.append((refined, round(source_score(l) * 0.75, 2)))
+            loc_opts.append(("", 0.1))  # không có địa điểm
+        else:
+            loc_opts.append((None, 0.9))
+
+        # Ngày: chỉ cho chọn khi ngày bắt đầu chưa cố định (TH1 dùng đủ 2 ngày)
+        date_opts = [(None, 0.9)]
+        if len(raw_times) < 2 or len(raw_dates) <= 1:
+            if not raw_dates:
+                date_opts = [(None, 0.6), ("mai", 0.3)]
+            elif len(raw_dates) >= 2:
+                date_opts = [(None, 0.7)] + [(d, 0.4) for d in dict.fromkeys(raw_dates[1:]) if d != raw_dates[0]]
+
+        # Giờ: "3h" không kèm buổi có thể là 3h chiều; thiếu giờ thì gợi ý giờ theo buổi
+        time_opts = [(None, 0.9)]
+        if len(raw_times) < 2:
+            if raw_times:
+                h, m = a["parser"].parse_time(raw_times[0])
+                if not session_val and 1 <= h <= 11:
+                    time_opts = [(None, 0.55), (f"{h + 12}:{m:02d}", 0.45)]
+            else:
+                typical = {'sáng': ["9:00"], 'trưa': ["12:00"], 'chiều': ["14:00", "16:00"],
+                           'tối': ["19:00", "20:00"], 'đêm': ["22:00"]}
+                time_opts = [(None, 0.3)] + [(t, 0.25) for t in typical.get((session_val or "").lower(),
+                                                                          ["9:00", "14:00"])]
+        return date_opts, time_opts, loc_opts
+
+    # Top-k cách hiểu câu, kèm độ tin cậy từng trường (date/time/location) và tổng (tích)
+    # NER chỉ chạy 1 lần; ứng viên đầu tiên trùng với process()
+    def candidates(self, input, k=3, tz=None, calendar=None):
+        a = self.analyze(input, tz, calendar)
+        date_opts, time_opts, loc_opts = self._field_options(a)
+        combos = sorted(itertools.product(date_opts, time_opts, loc_opts),
+                        key=lambda c: c[0][1] * c[1][1] * c[2][1], reverse=True)
+        results, seen = [], set()
+        for (d, dc), (t, tc), (l, lc) in combos:
+            result = self._build(a, d, t, l)
+            key = (result["start_time"], result["end_time"], result["location"])
+            if key in seen: continue
+            seen.add(key)
+            result["confidence"] = round(dc * tc * lc, 3)
+            result["field_confidence"] = {"date": dc, "time": tc, "location": lc}
+            results.append(result)
+            if len(results) >= k: break
+        return results
+
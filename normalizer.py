@@ -0,0 +1,98 @@
+# @title CHUẨN HÓA CÂU TIẾNG VIỆT (NFC + từ viết tắt, 1 regex biên dịch sẵn)
+# Từ điển = mặc định (Preprocess.VI_NORM_DICT) + file JSON của user, tự nạp lại khi file đổi (không cần restart)
+# VD norm_dict.json: {"sp": "sản phẩm", "kh": "khách hàng", "team-a": {"pm": "project manager"}}
+#   giá trị chuỗi -> dùng cho mọi lịch; giá trị object -> chỉ lịch (calendar) cùng tên, ghi đè mục chung
+import os
+import re
+import json
+import time
+import threading
+import unicodedata
+
+DICT_PATH = os.environ.get("SCHEDULER_NORM_DICT", "norm_dict.json")  # "" = chỉ dùng từ điển mặc định
+RELOAD_EVERY = 2.0  # giây giữa 2 lần kiểm tra file từ điển
+PUNCT = ".,!?;()"  # sau các dấu này luôn có 1 khoảng trắng
+BATCH_SEP = "\x00"  # ngăn cách các câu khi chuẩn hóa theo lô
+
+
+def nfc(text):
+    return unicodedata.normalize("NFC", text)
+
+
+# Dựng 1 regex cho cả 3 việc: thêm khoảng trắng sau dấu câu, gộp khoảng trắng, thay từ viết tắt
+# Chỉ khớp chỗ cần sửa (dấu câu chưa có đúng 1 khoảng trắng, khoảng trắng khác " ") -> ít lần gọi hàm thay
+# Từ viết tắt chỉ khớp nguyên từ (giữa khoảng trắng/dấu câu ở cả 2 phía, VD "t2, t4")
+def compile_rules(mapping):
+    words = "|".join(re.escape(w) for w in sorted(mapping, key=len, reverse=True)) or "(?!)"
+    punct = re.escape(PUNCT)
+    pattern = re.compile(rf'(?P<punct>[{punct}])(?! (?!\s))\s*|(?P<space>\s{{2,}}|[^\S ])'
+                         rf'|(?<![^\s{punct}\x00])(?P<word>{words})(?=[\s{punct}\x00]|\Z)')
+
+    def replace(m):
+        if m.group("punct"): return m.group("punct") + " "
+        if m.group("space"): return " "
+        return mapping[m.group("word")]
+    return pattern, replace
+
+
+class Normalizer:
+    def __init__(self, base=None, path=DICT_PATH, reload_every=RELOAD_EVERY):
+        self.base = {nfc(k): nfc(v) for k, v in (base or {}).items()}
+        self.path = path
+        self.reload_every = reload_every
+        self.lock = threading.Lock()
+        self.mtime = None
+        self.checked = float("-inf")
+        self.shared = {}  # mục dùng cho mọi lịch
+        self.calendars = {}  # calendar -> mục riêng
+        self.compiled = {}  # calendar (None = chung) -> (regex, hàm thay)
+
+    # Kiểm tra mtime tối đa 1 lần mỗi reload_every giây; file đổi -> đọc lại, biên dịch lại khi dùng
+    # File lỗi -> giữ từ điển cũ
+    def _maybe_reload(self):
+        if not self.path or time.monotonic() - self.checked < self.reload_every: return
+        with self.lock:
+            if time.monotonic() - self.checked < self.reload_every: return
+            self.checked = time.monotonic()
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except OSError:
+                mtime = None
+            if mtime == self.mtime: return
+            self.mtime = mtime
+            shared, calendars = {}, {}
+            if mtime is not None:
+                try:
+                    with open(self.path, encoding="utf-8") as fp:
+                        data = json.load(fp)
+                except (OSError, ValueError) as e:
+                    print(f"Không đọc được từ điển {self.path}: {e}")
+                    return
+                for key, value in data.items():
+                    if isinstance(value, dict):
+                        calendars[key] = {nfc(k): nfc(v) for k, v in value.items() if isinstance(v, str)}
+                    elif isinstance(value, str):
+                        shared[nfc(key)] = nfc(value)
+            self.shared, self.calendars, self.compiled = shared, calendars, {}
+
+    def _rules(self, calendar=None):
+        self._maybe_reload()
+        key = calendar if calendar in self.calendars else None
+        rules = self.compiled.get(key)
+        if rules is None:
+            rules = compile_rules({**self.base, **self.shared, **self.calendars.get(key, {})})
+            self.compiled[key] = rules
+        return rules
+
+    # NFC -> 1 lượt regex -> bỏ khoảng trắng đầu/cuối
+    def normalize(self, text, calendar=None):
+        if not isinstance(text, str): return ""
+        pattern, replace = self._rules(calendar)
+        return pattern.sub(replace, nfc(text)).strip()
+
+    # Cả lô ghép thành 1 chuỗi: 1 lần NFC + 1 lượt regex cho mọi câu
+    def normalize_many(self, texts, calendar=None):
+        texts = [t.replace(BATCH_SEP, " ") if isinstance(t, str) else "" for t in texts]
+        if not texts: return []
+        pattern, replace = self._rules(calendar)
+        return [t.strip() for t in pattern.sub(replace, nfc(BATCH_SEP.join(texts))).split(BATCH_SEP)]
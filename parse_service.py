@@ -0,0 +1,210 @@
+# @title DỊCH VỤ PHÂN TÍCH CÂU (HTTP localhost, gom request)
+# Chạy: python parse_service.py --port 8765
+# Tk app, Streamlit và script nhập hàng loạt dùng chung 1 model NER đã nạp sẵn
+# Gom request = gộp các request đến gần nhau vào 1 lần chạy trên thread giữ model, bỏ câu trùng;
+# model vẫn chạy từng câu (underthesea.ner không có API nhận cả lô) -> lợi ở câu trùng / số lần chuyển thread,
+# không phải suy luận theo lô
+import os
+import json
+import asyncio
+import argparse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_URL = os.environ.get("SCHEDULER_PARSE_URL", f"http://{DEFAULT_HOST}:{DEFAULT_PORT}")
+COALESCE_WINDOW = 0.005  # gom request đến trong 5ms vào 1 nhóm
+MAX_GROUP = 64  # số request tối đa mỗi nhóm (model vẫn chạy từng câu)
+
+
+# ==========================================
+# SERVER
+# ==========================================
+class ParseService:
+    def __init__(self, engine=None, coalesce_window=COALESCE_WINDOW, max_group=MAX_GROUP):
+        if engine is None:
+            from nlp import SchedulerMain
+            engine = SchedulerMain()
+        self.engine = engine
+        self.coalesce_window = coalesce_window
+        self.max_group = max_group
+        # 1 thread duy nhất giữ model, các nhóm request chạy tuần tự
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.queue = None
+
+    # Chạy cả nhóm request trong 1 lần chuyển thread, mỗi câu 1 lần gọi model;
+    # câu trùng nhau (cùng múi giờ, cùng lịch) chỉ phân tích 1 lần
+    def _run_group(self, items):
+        results = {}
+        for item in items:
+            if item in results: continue
+            text, tz, calendar = item
+            try:
+                results[item] = self.engine.process(text, tz=tz, calendar=calendar)
+            except Exception as e:
+                results[item] = {"error": str(e)}
+        return [results[i] for i in items]
+
+    async def _coalesce_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            group = [await self.queue.get()]
+            deadline = loop.time() + self.coalesce_window
+            while len(group) < self.max_group:
+                timeout = deadline - loop.time()
+                if timeout <= 0: break
+                try:
+                    group.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            items = [item for item, _ in group]
+            try:
+                results = await loop.run_in_executor(self.executor, self._run_group, items)
+            except Exception as e:
+                results = [{"error": str(e)}] * len(group)
+            for (_, fut), res in zip(group, results):
+                if not fut.done(): fut.set_result(res)
+
+    async def parse(self, text, tz=None, calendar=None):
+        fut = asyncio.get_running_loop().create_future()
+        await self.queue.put(((text, tz, calendar), fut))
+        return await fut
+
+    async def _handle(self, reader, writer):
+        try:
+            request_line = (await reader.readline()).decode("latin-1").split()
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode("latin-1").strip()
+                if not line: break
+                key, _, value = line.partition(":")
+                headers[key.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get("content-length", 0) or 0))
+            status, payload = await self._route(request_line, body)
+        except Exception as e:
+            status, payload = 400, {"error": str(e)}
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        writer.write(f"HTTP/1.1 {status} {'OK' if status == 200 else 'ERROR'}\r\n"
+                     f"Content-Type: application/json; charset=utf-8\r\n"
+                     f"Content-Length: {len(data)}\r\nConnection: close\r\n\r\n".encode("latin-1") + data)
+        await writer.drain()
+        writer.close()
+
+    async def _route(self, request_line, body):
+        method, path = request_line[0], request_line[1]
+        if method == "GET" and path == "/health":
+            return 200, {"status": "ok"}
+        if method == "POST" and path == "/parse":
+            req = json.loads(body or b"{}")
+            # {"text": "..."} -> 1 kết quả, {"texts": [...]} -> list kết quả; "tz", "calendar" tùy chọn
+            tz, calendar = req.get("tz"), req.get("calendar")
+            if "texts" in req:
+                return 200, list(await asyncio.gather(*(self.parse(t, tz, calendar) for t in req["texts"])))
+            return 200, await self.parse(req.get("text", ""), tz, calendar)
+        if method == "POST" and path == "/candidates":
+            # Top-k cách hiểu 1 câu: chạy trên cùng thread giữ model, không gom nhóm
+            req = json.loads(body or b"{}")
+            loop = asyncio.get_running_loop()
+            return 200, await loop.run_in_executor(self.executor, self.engine.candidates,
+                                                   req.get("text", ""), req.get("k", 3), req.get("tz"),
+                                                   req.get("calendar"))
+        return 404, {"error": "not found"}
+
+    async def serve(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        self.queue = asyncio.Queue()
+        loop = asyncio.get_running_loop()
+        # Nạp model trước khi nhận request
+        await loop.run_in_executor(self.executor, self.engine.process, "họp lúc 8h")
+        coalescer = asyncio.create_task(self._coalesce_loop())
+        server = await asyncio.start_server(self._handle, host, port)
+        print(f"Parse service: http://{host}:{port}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            coalescer.cancel()
+
+
+# ==========================================
+# CLIENT
+# ==========================================
+class ParseClient:
+    def __init__(self, url=DEFAULT_URL, timeout=10):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self._local = None
+
+    def _request(self, path, payload=None, timeout=None):
+        data = json.dumps(payload).encode("utf-8") if payload is not None else None
+        req = urllib.request.Request(self.url + path, data=data, headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(req, timeout=timeout or self.timeout) as resp:
+            return json.loads(resp.read().decode("utf-8"))
+
+    def available(self):
+        try:
+            return self._request("/health", timeout=0.5).get("status") == "ok"
+        except OSError:
+            return False
+
+    # Model tại chỗ, chỉ tạo khi cần (service tắt, hoặc hàm chỉ dùng regex)
+    def _local_engine(self):
+        if self._local is None:
+            from nlp import SchedulerMain
+            self._local = SchedulerMain()
+        return self._local
+
+    # Cùng định dạng với SchedulerMain.process, service tắt giữa chừng thì phân tích tại chỗ
+    def process(self, text, tz=None, calendar=None):
+        try:
+            result = self._request("/parse", {"text": text, "tz": tz, "calendar": calendar})
+        except OSError:
+            return self._local_engine().process(text, tz=tz, calendar=calendar)
+        if "error" in result: raise ValueError(result["error"])
+        return result
+
+    def candidates(self, text, k=3, tz=None, calendar=None):
+        try:
+            result = self._request("/candidates", {"text": text, "k": k, "tz": tz, "calendar": calendar})
+        except OSError:
+            return self._local_engine().candidates(text, k, tz, calendar)
+        if isinstance(result, dict) and "error" in result: raise ValueError(result["error"])
+        return result
+
+    # Câu lỗi -> ValueError như process (không trả dict {"error": ...} lẫn vào kết quả)
+    def process_many(self, texts, tz=None, calendar=None):
+        texts = list(texts)
+        try:
+            results = self._request("/parse", {"texts": texts, "tz": tz, "calendar": calendar})
+        except OSError:
+            return self._local_engine().process_many(texts, tz=tz, calendar=calendar)
+        for text, result in zip(texts, results):
+            if "error" in result: raise ValueError(f"{text}: {result['error']}")
+        return results
+
+    # Tách câu ghép tại chỗ (chỉ regex), các mệnh đề gửi 1 lần -> service gom chung 1 nhóm
+    def process_compound(self, text, tz=None, calendar=None):
+        return self.process_many(self.split_clauses(text, calendar), tz=tz, calendar=calendar)
+
+    # Các hàm chỉ dùng regex (is_free_time_query...) chạy tại chỗ, không cần NER
+    def __getattr__(self, name):
+        if name.startswith("_"): raise AttributeError(name)
+        return getattr(self._local_engine(), name)
+
+
+# Service đang chạy -> dùng model chung; không thì tạo SchedulerMain tại chỗ
+def get_parser(url=DEFAULT_URL):
+    client = ParseClient(url)
+    if client.available():
+        return client
+    from nlp import SchedulerMain
+    return SchedulerMain()
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Dịch vụ phân tích câu lịch trình (localhost)")
+    arg_parser.add_argument("--host", default=DEFAULT_HOST)
+    arg_parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    arg_parser.add_argument("--coalesce-ms", type=float, default=COALESCE_WINDOW * 1000)
+    args = arg_parser.parse_args()
+    asyncio.run(ParseService(coalesce_window=args.coalesce_ms / 1000).serve(args.host, args.port))
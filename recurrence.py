@@ -0,0 +1,103 @@
+# @title LẶP LẠI SỰ KIỆN (RRULE)
+from datetime import datetime, timedelta
+
+# Rule lưu dạng chuỗi giống RRULE: "FREQ=WEEKLY;INTERVAL=1;BYDAY=MO,WE"
+# Hỗ trợ: FREQ (DAILY/WEEKLY/MONTHLY/YEARLY), INTERVAL, BYDAY, COUNT, UNTIL (YYYYMMDD)
+WEEKDAY_CODES = ["MO", "TU", "WE", "TH", "FR", "SA", "SU"]
+FREQS = ["DAILY", "WEEKLY", "MONTHLY", "YEARLY"]
+
+
+def parse_rule(rule):
+    if not rule: return None
+    parts = {}
+    for item in rule.split(";"):
+        if "=" not in item: continue
+        key, val = item.split("=", 1)
+        parts[key.strip().upper()] = val.strip().upper()
+    freq = parts.get("FREQ")
+    if freq not in FREQS: return None
+    try:
+        interval = max(1, int(parts.get("INTERVAL", 1)))
+        count = int(parts["COUNT"]) if "COUNT" in parts else None
+        until = datetime.strptime(parts["UNTIL"][:8], "%Y%m%d") + timedelta(days=1) if "UNTIL" in parts else None
+    except ValueError:
+        return None
+    byday = [WEEKDAY_CODES.index(d) for d in parts.get("BYDAY", "").split(",") if d in WEEKDAY_CODES]
+    return {"freq": freq, "interval": interval, "byday": sorted(set(byday)), "count": count, "until": until}
+
+
+def format_rule(freq, interval=1, byday=None, count=None, until=None):
+    items = [f"FREQ={freq}"]
+    if interval and interval > 1: items.append(f"INTERVAL={interval}")
+    if byday: items.append("BYDAY=" + ",".join(WEEKDAY_CODES[d] for d in sorted(set(byday))))
+    if count: items.append(f"COUNT={count}")
+    if until: items.append("UNTIL=" + until.strftime("%Y%m%d"))
+    return ";".join(items)
+
+
+# Cộng tháng, trả về None nếu ngày không tồn tại (VD 31/2)
+def _add_months(dt, months):
+    y, m = divmod(dt.month - 1 + months, 12)
+    try:
+        return dt.replace(year=dt.year + y, month=m + 1)
+    except ValueError:
+        return None
+
+
+# Sinh lần lặp theo từng chu kỳ, bắt đầu từ chu kỳ `first`
+def _iter_periods(start_dt, r, first):
+    step = r["interval"]
+    k = first
+    while True:
+        if r["freq"] == "DAILY":
+            yield [start_dt + timedelta(days=k * step)]
+        elif r["freq"] == "WEEKLY":
+            monday = start_dt - timedelta(days=start_dt.weekday()) + timedelta(weeks=k * step)
+            days = r["byday"] or [start_dt.weekday()]
+            yield [monday + timedelta(days=d) for d in days]
+        elif r["freq"] == "MONTHLY":
+            dt = _add_months(start_dt, k * step)
+            yield [dt] if dt else []
+        else:
+            dt = _add_months(start_dt, 12 * k * step)
+            yield [dt] if dt else []
+        k += 1
+
+
+# Số chu kỳ có thể bỏ qua trước window_start (không áp dụng khi có COUNT)
+def _skip_periods(start_dt, r, window_start):
+    if not window_start or window_start <= start_dt or r["count"]: return 0
+    gap = window_start - start_dt
+    if r["freq"] == "DAILY":
+        return gap.days // r["interval"]
+    if r["freq"] == "WEEKLY":
+        return max(0, gap.days // 7 - 1) // r["interval"]
+    months = (window_start.year - start_dt.year) * 12 + window_start.month - start_dt.month
+    if r["freq"] == "YEARLY": months //= 12
+    return max(0, months - 1) // r["interval"]
+
+
+# Generator lần lặp trong [window_start, window_end), chỉ sinh đúng phần cần dùng
+# duration: độ dài event, để lấy cả lần lặp bắt đầu trước window nhưng kết thúc trong window
+def iter_occurrences(start_dt, rule, window_start=None, window_end=None, duration=None):
+    duration = duration or timedelta(0)
+    lower = window_start - duration if window_start else None
+    r = parse_rule(rule)
+    if not r:
+        if (lower is None or start_dt > lower or start_dt >= window_start) and \
+                (window_end is None or start_dt < window_end):
+            yield start_dt
+        return
+    if window_end is None and not r["count"] and not r["until"]:
+        raise ValueError("Rule lặp vô hạn cần window_end")
+
+    emitted = 0
+    for occs in _iter_periods(start_dt, r, _skip_periods(start_dt, r, lower)):
+        for occ in occs:
+            if occ < start_dt: continue
+            if r["until"] and occ >= r["until"]: return
+            if window_end and occ >= window_end: return
+            emitted += 1
+            if r["count"] and emitted > r["count"]: return
+            if lower is None or occ > lower or occ >= window_start:
+                yield occ
@@ -0,0 +1,47 @@
+# @title TÌM GIỜ TRỐNG
+from datetime import datetime, time, timedelta
+
+# Giờ làm việc mặc định
+WORK_START = time(8, 0)
+WORK_END = time(18, 0)
+
+
+# Gộp các khoảng bận chồng lấn, trả về ds đã sắp xếp
+def merge_intervals(intervals):
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]: merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return [(s, e) for s, e in merged]
+
+
+# Quét 1 lượt qua ds bận đã gộp, trả về tối đa `limit` khoảng trống (start, end) dài >= duration
+# Chỉ xét trong giờ làm việc [work_start, work_end) của từng ngày
+def find_free_slots(busy, range_start, range_end, duration, work_start=WORK_START, work_end=WORK_END, limit=5):
+    busy = merge_intervals(busy)
+    slots = []
+    i = 0
+    day = range_start.date()
+    while day <= range_end.date() and len(slots) < limit:
+        win_start = max(range_start, datetime.combine(day, work_start))
+        win_end = min(range_end, datetime.combine(day, work_end))
+        cursor = win_start
+        # Bỏ qua khoảng bận đã kết thúc trước cửa sổ (con trỏ chỉ tiến, không quét lại)
+        while i < len(busy) and busy[i][1] <= win_start:
+            i += 1
+        j = i
+        while cursor < win_end and len(slots) < limit:
+            if j < len(busy) and busy[j][0] < win_end:
+                b_start, b_end = busy[j]
+                if b_start - cursor >= duration:
+                    slots.append((cursor, b_start))
+                cursor = max(cursor, b_end)
+                j += 1
+            else:
+                if win_end - cursor >= duration:
+                    slots.append((cursor, win_end))
+                break
+        day += timedelta(days=1)
+    return slots
@@ -0,0 +1,1089 @@
+# @title SCHEMA & TRUY VẤN DÙNG CHUNG (app.py, strlit.py, worker.py)
+import os
+import re
+import json
+import heapq
+import socket
+import sqlite3
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from recurrence import iter_occurrences, parse_rule
+from timezones import DEFAULT_TZ, is_valid_tz, local_now, to_utc_epoch, from_utc_epoch
+import slots
+
+DT_FORMAT = "%Y-%m-%d %H:%M:%S"
+# Mốc epoch "giờ tường" (naive): không phụ thuộc múi giờ của máy chạy
+EPOCH = datetime(1970, 1, 1)
+# Mốc nhắc thêm ngoài reminder_minutes (JSON [phút], không có thì NULL) đọc từ bảng reminders của dòng {t}.id
+EXTRA_REMINDERS_SQL = ("(SELECT NULLIF(json_group_array(r.minutes), '[]') FROM reminders r"
+                       " WHERE r.event_id = {t}.id AND r.minutes != COALESCE({t}.reminder_minutes, 0))")
+# Cột theo thứ tự cố định (không dùng SELECT * vì schema có thể thêm cột); {t}: tên / bí danh bảng
+EVENT_FIELDS = ("{t}.id, {t}.event, {t}.start_time, {t}.end_time, {t}.location, {t}.reminder_minutes, {t}.is_notified, "
+                "{t}.recurrence, " + EXTRA_REMINDERS_SQL + " AS extra_reminders")
+# Khoảng nhìn trước của bộ nhắc: lấy mốc nhắc có fire_at trong [phút hiện tại, + khoảng này)
+REMINDER_LOOKAHEAD = timedelta(minutes=1)
+# Độ dài mặc định khi event không có end_time (giống UI: start + 1h)
+DEFAULT_DURATION = timedelta(hours=1)
+# Lịch mặc định (DB cũ chưa có cột calendar)
+DEFAULT_CALENDAR = "default"
+# Trạng thái is_notified
+NOTIFY_PENDING, NOTIFY_SENT, NOTIFY_EXPIRED = 0, 1, 2
+# Nhắc bị lỡ (worker/app tắt) trong khoảng này vẫn được báo bù, cũ hơn thì đánh dấu hết hạn
+CATCH_UP_GRACE = timedelta(hours=2)
+# Lease điều phối nhắc: hết hạn sau 3 vòng quét không gia hạn
+LEASE_TTL = timedelta(seconds=60)
+# Sự kiện 1 lần kết thúc quá ARCHIVE_AFTER được chuyển sang events_archive, mỗi lô ARCHIVE_BATCH dòng
+ARCHIVE_AFTER = timedelta(days=int(os.environ.get("SCHEDULER_ARCHIVE_DAYS", 30)))
+ARCHIVE_BATCH = 500
+ARCHIVE_EVERY = timedelta(hours=1)  # khoảng cách giữa 2 lần quét lưu trữ của 1 lịch
+# Múi giờ hiệu lực của event: riêng của event, không có thì theo lịch
+EVENT_TZ_SQL = "COALESCE({p}tz, (SELECT c.tz FROM calendars c WHERE c.name = {p}calendar))"
+# Giờ nhắc kế tiếp (UTC epoch, tròn phút) của 1 mốc nhắc, sau thời điểm `after` (NULL = từ phút hiện tại)
+NEXT_FIRE_SQL = "next_fire({p}start_time, {p}recurrence, " + EVENT_TZ_SQL + ", {minutes}, {after})"
+# Tìm lần lặp kế tiếp tối đa bấy nhiêu ngày (YEARLY ngày 29/2 cần 8 năm)
+NEXT_FIRE_HORIZON = timedelta(days=366 * 8)
+
+
+# ==========================================
+# KẾT NỐI
+# ==========================================
+# Hàm SQL utc_epoch / next_fire chỉ dùng trong câu lệnh do storage chạy (trigger không gọi hàm Python)
+# -> chỉ kết nối mở bằng connect() cần đăng ký, kết nối sqlite3 thường vẫn ghi events được
+def _utc_epoch(text, tz):
+    dt = parse_dt(text)
+    return to_utc_epoch(dt.replace(second=0, microsecond=0), tz) if dt else None
+
+
+# Giờ nhắc (UTC epoch) đầu tiên >= after của mốc nhắc trước `minutes` phút, None = không còn lần nhắc
+# Sự kiện 1 lần: after=None trả về giờ nhắc dù đã qua (bù nhắc / hết hạn xử lý sau)
+# Sự kiện lặp: sinh lần lặp theo giờ địa phương, nới 1 tiếng cho chênh lệch DST rồi lọc lại theo UTC
+def _next_fire(text, rule, tz, minutes, after=None):
+    dt = parse_dt(text)
+    if not dt: return None
+    dt = dt.replace(second=0, microsecond=0)
+    lead = 60 * (minutes or 0)
+    if not parse_rule(rule):
+        fire = to_utc_epoch(dt, tz) - lead
+        return fire if after is None or fire >= after else None
+    if after is None: after = int(time.time()) // 60 * 60
+    win_start = from_utc_epoch(after + lead, tz) - timedelta(hours=1)
+    for occ in iter_occurrences(dt, rule, win_start, win_start + NEXT_FIRE_HORIZON):
+        fire = to_utc_epoch(occ, tz) - lead
+        if fire >= after: return fire
+    return None
+
+
+def register_functions(conn):
+    conn.create_function("utc_epoch", 2, _utc_epoch, deterministic=True)
+    conn.create_function("next_fire", 5, _next_fire)
+    return conn
+
+
+def connect(db_name="scheduler.db", **kwargs):
+    return register_functions(sqlite3.connect(db_name, **kwargs))
+
+
+# ==========================================
+# SCHEMA
+# ==========================================
+def init_schema(conn):
+    register_functions(conn)
+    # WAL: người đọc (bản sao lưu, UI) không chặn người ghi và ngược lại; lưu trong file DB nên chỉ cần đặt 1 lần
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+    except sqlite3.OperationalError:
+        pass  # tiến trình khác đang giữ khóa -> để lần khởi động sau
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            event TEXT,
+            start_time TEXT,
+            end_time TEXT,
+            location TEXT,
+            reminder_minutes INTEGER,
+            is_notified INTEGER DEFAULT 0
+        )
+    """)
+    # Cột mới cho DB cũ
+    add_column(conn, "events", "recurrence", "TEXT")  # rule dạng RRULE, NULL = 1 lần
+    add_column(conn, "events", "calendar", f"TEXT NOT NULL DEFAULT '{DEFAULT_CALENDAR}'")  # lịch/user sở hữu
+    add_column(conn, "events", "tz", "TEXT")  # múi giờ riêng của event, NULL = theo lịch
+    # Múi giờ của từng lịch (không có dòng = DEFAULT_TZ)
+    conn.execute("CREATE TABLE IF NOT EXISTS calendars (name TEXT PRIMARY KEY, tz TEXT NOT NULL)")
+    # remind_at (chuỗi giờ địa phương) / fire_at (UTC epoch trên events) / notified_until (lần lặp cuối đã nhắc)
+    # được thay bằng bảng reminders
+    for trigger in ("events_remind_ai", "events_remind_au", "events_fire_ai", "events_fire_au"):
+        conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    conn.execute("DROP INDEX IF EXISTS idx_events_cal_remind")
+    conn.execute("DROP INDEX IF EXISTS idx_events_cal_fire")
+    for column in ("remind_at", "fire_at", "notified_until"):
+        if sqlite3.sqlite_version_info >= (3, 35, 0) and column in table_columns(conn, "events"):
+            conn.execute(f"ALTER TABLE events DROP COLUMN {column}")
+    # Index ghép (calendar, ...): mọi truy vấn chỉ chạm vào dòng của lịch đang dùng
+    conn.execute("DROP INDEX IF EXISTS idx_events_start")
+    conn.execute("DROP INDEX IF EXISTS idx_events_end")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_events_cal_start ON events(calendar, start_time)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_events_cal_end ON events(calendar, end_time)")
+    conn.execute("DROP INDEX IF EXISTS idx_events_cal_notified")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_events_cal_recur ON events(calendar, recurrence)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_events_cal ON events(calendar)")  # duyệt theo id trong 1 lịch
+    # Lịch nào đang do tiến trình nào phát nhắc (xem acquire_lease)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS reminder_leases (
+            calendar TEXT PRIMARY KEY,
+            owner TEXT NOT NULL,
+            expires_at INTEGER NOT NULL
+        )
+    """)
+    init_archive(conn)
+    init_reminders(conn)
+    init_search(conn)
+    init_journal(conn)
+    conn.commit()
+
+
+# Bảng lưu trữ cùng cột với events (không trigger nhắc / FTS / nhật ký): danh sách, kiểm tra trùng, bảng UI
+# chỉ đọc events nên không chậm dần theo lịch sử; truy vấn theo khoảng thời gian tự nối thêm archive khi cần
+def init_archive(conn):
+    conn.execute("CREATE TABLE IF NOT EXISTS events_archive AS SELECT * FROM events WHERE 0")
+    # Cột mới của events -> thêm vào archive
+    for _, column, decl, *_ in conn.execute("PRAGMA table_info(events)").fetchall():
+        add_column(conn, "events_archive", column, decl)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_archive_cal_start ON events_archive(calendar, start_time, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_archive_cal_end ON events_archive(calendar, end_time)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_archive_cal_id ON events_archive(calendar, id)")
+    # archived_before: mọi event trong archive đều kết thúc trước mốc này (giờ địa phương)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS archive_state (
+            calendar TEXT PRIMARY KEY,
+            archived_before TEXT NOT NULL,
+            checked_at INTEGER NOT NULL
+        )
+    """)
+
+
+# Mỗi mốc nhắc của event là 1 dòng: fire_at = lần nhắc kế tiếp (UTC epoch), state = NOTIFY_*
+# Vòng quét chỉ quét đoạn index (state, fire_at) đến hạn, không tính lại giờ nhắc của từng event
+# Sự kiện lặp: nhắc xong thì fire_at nhảy sang lần lặp kế tiếp, hết lần lặp thì state = đã gửi
+# Trigger chỉ dùng SQL có sẵn (kết nối sqlite3 thường vẫn ghi events được): dòng mới / đổi giờ được đánh dấu
+# dirty = 1, fire_at tính sau bằng Python trong sync_reminders (gọi trước mỗi lần quét nhắc)
+def init_reminders(conn):
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'reminders'").fetchone()
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS reminders (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            event_id INTEGER NOT NULL,
+            minutes INTEGER NOT NULL,
+            fire_at INTEGER,
+            state INTEGER NOT NULL DEFAULT 0,
+            UNIQUE (event_id, minutes)
+        )
+    """)
+    add_column(conn, "reminders", "dirty", "INTEGER NOT NULL DEFAULT 0")  # 1 = fire_at chưa tính
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_reminders_due ON reminders(state, fire_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_reminders_dirty ON reminders(event_id) WHERE dirty = 1")
+    # Trigger bản cũ (gọi next_fire(), đọc extra_reminders, xóa mốc nhắc của event đã lưu trữ) -> tạo lại
+    row = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'events_reminders_ad'").fetchone()
+    if row and "events_archive" not in row[0]:
+        for trigger in ("events_reminders_ai", "events_reminders_au", "events_reminders_ad"):
+            conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    # Bảng reminders là nguồn duy nhất của mốc nhắc; events.reminder_minutes là mốc sớm nhất (mốc chính)
+    # Thêm bằng SQL thường chỉ có mốc chính, ghi qua storage (set_reminders) thì đủ mọi mốc
+    # Sự kiện 1 lần đã báo (is_notified) giữ nguyên trạng thái, VD khi restore snapshot
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS events_reminders_ai AFTER INSERT ON events BEGIN
+            INSERT OR IGNORE INTO reminders (event_id, minutes, state, dirty)
+            VALUES (new.id, COALESCE(new.reminder_minutes, 0),
+                    CASE WHEN new.recurrence IS NULL THEN COALESCE(new.is_notified, 0) ELSE 0 END, 1);
+        END
+    """)
+    # Đổi giờ / rule / múi giờ -> tính lại mọi mốc, báo lại từ đầu
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS events_reminders_au AFTER UPDATE OF start_time, recurrence, tz ON events BEGIN
+            UPDATE reminders SET state = {NOTIFY_PENDING}, fire_at = NULL, dirty = 1 WHERE event_id = new.id;
+            UPDATE events SET is_notified = 0 WHERE id = new.id AND is_notified != 0;
+        END
+    """)
+    # Đổi mốc chính -> thay dòng của mốc chính cũ
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS events_reminders_minutes_au AFTER UPDATE OF reminder_minutes ON events
+        WHEN COALESCE(old.reminder_minutes, 0) != COALESCE(new.reminder_minutes, 0) BEGIN
+            DELETE FROM reminders WHERE event_id = new.id AND minutes = COALESCE(old.reminder_minutes, 0);
+            INSERT OR IGNORE INTO reminders (event_id, minutes, state, dirty)
+            VALUES (new.id, COALESCE(new.reminder_minutes, 0), {NOTIFY_PENDING}, 1);
+        END
+    """)
+    # Event chuyển sang events_archive giữ lại mốc nhắc (hiển thị / xuất file)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS events_reminders_ad AFTER DELETE ON events
+        WHEN NOT EXISTS (SELECT 1 FROM events_archive WHERE calendar = old.calendar AND id = old.id) BEGIN
+            DELETE FROM reminders WHERE event_id = old.id;
+        END
+    """)
+    # Hết mốc nhắc đang chờ -> cập nhật is_notified của event (icon 🔔 trên UI)
+    # +state: tra theo UNIQUE(event_id, minutes), không để planner chọn idx_reminders_due (quét mọi nhắc đang chờ)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS reminders_state_au AFTER UPDATE OF state ON reminders
+        WHEN new.state != {NOTIFY_PENDING} AND NOT EXISTS (
+            SELECT 1 FROM reminders WHERE event_id = new.event_id AND +state = {NOTIFY_PENDING}) BEGIN
+            UPDATE events SET is_notified = new.state WHERE id = new.event_id;
+        END
+    """)
+    # DB cũ: dựng mốc nhắc cho các event đã có (chỉ có reminder_minutes)
+    if not exists:
+        conn.execute("""
+            INSERT INTO reminders (event_id, minutes, state, dirty)
+            SELECT id, COALESCE(reminder_minutes, 0),
+                   CASE WHEN recurrence IS NULL THEN COALESCE(is_notified, 0) ELSE 0 END, 1
+            FROM events
+        """)
+    if "extra_reminders" in table_columns(conn, "events"):
+        _migrate_extra_reminders(conn)
+
+
+# Bản cũ lưu mốc nhắc thêm thành JSON trong cột extra_reminders -> chuyển sang bảng reminders rồi bỏ cột
+# (trigger nhắc cũ / nhật ký cũ còn nhắc tới cột bị xóa trước, init_journal tạo lại)
+def _migrate_extra_reminders(conn):
+    for name, in conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND sql LIKE '%extra_reminders%'"):
+        conn.execute(f"DROP TRIGGER {name}")
+    # Event đã lưu trữ: mốc nhắc không còn chờ báo
+    for table, state, dirty in (("events", NOTIFY_PENDING, 1), ("events_archive", NOTIFY_EXPIRED, 0)):
+        if "extra_reminders" not in table_columns(conn, table): continue
+        conn.execute(f"""
+            INSERT OR IGNORE INTO reminders (event_id, minutes, state, dirty)
+            SELECT t.id, j.value, ?, ? FROM {table} t, json_each(t.extra_reminders) j
+            WHERE t.extra_reminders IS NOT NULL
+        """, (state, dirty))
+        if sqlite3.sqlite_version_info >= (3, 35, 0):
+            conn.execute(f"ALTER TABLE {table} DROP COLUMN extra_reminders")
+        else:
+            conn.execute(f"UPDATE {table} SET extra_reminders = NULL WHERE extra_reminders IS NOT NULL")
+
+
+def table_columns(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def add_column(conn, table, column, decl):
+    if column not in table_columns(conn, table):
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+        return True
+    return False
+
+
+# ==========================================
+# FULL-TEXT SEARCH (FTS5)
+# ==========================================
+# Bỏ dấu: unicode61 remove_diacritics xử lý dấu thanh/mũ (cả NFC lẫn NFD), riêng đ/Đ gập bằng replace
+def _fold_sql(expr):
+    return f"replace(replace({expr}, 'đ', 'd'), 'Đ', 'D')"
+
+
+# Bảng FTS của events và của events_archive (tìm cả sự kiện đã lưu trữ khi cần)
+FTS_TABLES = {"events": "events_fts", "events_archive": "events_archive_fts"}
+
+
+def init_search(conn):
+    for table, fts in FTS_TABLES.items():
+        exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (fts,)).fetchone()
+        # Bảng FTS trỏ vào bảng gốc (external content), chỉ lưu index
+        conn.execute(f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+                event, location, content='{table}', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2'
+            )
+        """)
+        # Trigger đồng bộ với event / location của bảng gốc
+        new_vals = f"new.id, {_fold_sql('new.event')}, {_fold_sql('new.location')}"
+        old_vals = f"'delete', old.id, {_fold_sql('old.event')}, {_fold_sql('old.location')}"
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN
+                INSERT INTO {fts}(rowid, event, location) VALUES ({new_vals});
+            END
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN
+                INSERT INTO {fts}({fts}, rowid, event, location) VALUES ({old_vals});
+            END
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF event, location ON {table} BEGIN
+                INSERT INTO {fts}({fts}, rowid, event, location) VALUES ({old_vals});
+                INSERT INTO {fts}(rowid, event, location) VALUES ({new_vals});
+            END
+        """)
+        # DB cũ: index các dòng đã có (không dùng 'rebuild' vì cần gập đ)
+        if not exists:
+            conn.execute(f"""
+                INSERT INTO {fts}(rowid, event, location)
+                SELECT id, {_fold_sql('event')}, {_fold_sql('location')} FROM {table}
+            """)
+
+
+# Chuẩn hóa câu tìm kiếm giống Preprocess (viết tắt -> đầy đủ), mỗi từ là 1 token FTS, từ cuối match prefix
+def build_match_query(query, calendar=None):
+    from nlp import Preprocess
+    text = Preprocess.Text_Preprocess_Util(query, calendar).replace('đ', 'd').replace('Đ', 'D')
+    tokens = [t for t in re.split(r'[^\w]+', text) if t]
+    if not tokens: return None
+    terms = [f'"{t}"' for t in tokens]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+# Kết quả xếp theo bm25, cột event nặng hơn location
+# Mặc định chỉ tìm events (sửa/xóa được); include_archived=True tìm thêm events_archive
+def search_events(conn, query, limit=20, calendar=DEFAULT_CALENDAR, include_archived=False):
+    match = build_match_query(query, calendar)
+    if not match: return []
+    tables = list(FTS_TABLES) if include_archived else ["events"]
+    rows = " UNION ALL ".join(f"""
+        SELECT {EVENT_FIELDS.format(t='e')}, bm25({FTS_TABLES[table]}, 10.0, 2.0) AS score
+        FROM {FTS_TABLES[table]} JOIN {table} e ON e.id = {FTS_TABLES[table]}.rowid
+        WHERE {FTS_TABLES[table]} MATCH ? AND e.calendar = ?
+    """ for table in tables)
+    return event_cursor(conn).execute(f"""
+        SELECT id, event, start_time, end_time, location, reminder_minutes, is_notified, recurrence, extra_reminders
+        FROM ({rows}) ORDER BY score LIMIT ?
+    """, (match, calendar) * len(tables) + (limit,)).fetchall()
+
+
+# Parse datetime trong DB (có hoặc thiếu giây)
+def parse_dt(text):
+    try:
+        return datetime.fromisoformat(text)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_epoch(text):
+    dt = parse_dt(text)
+    return int((dt - EPOCH).total_seconds()) if dt else None
+
+
+# ==========================================
+# EVENT RECORD
+# ==========================================
+# Bản ghi gọn thay cho tuple 8 phần tử; thời gian lưu epoch giờ tường (giây tính từ EPOCH, không qua múi giờ máy)
+@dataclass(frozen=True, slots=True)
+class Event:
+    id: int
+    event: str
+    start: int | None
+    end: int | None
+    location: str | None
+    reminder_minutes: int
+    is_notified: int
+    recurrence: str | None
+    extra_reminders: str | None = None
+
+    # Mọi mốc nhắc (phút), sớm nhất trước
+    @property
+    def reminders(self):
+        extra = json.loads(self.extra_reminders) if self.extra_reminders else []
+        return sorted({self.reminder_minutes, *extra}, reverse=True)
+
+    @property
+    def start_dt(self):
+        return EPOCH + timedelta(seconds=self.start) if self.start is not None else None
+
+    @property
+    def end_dt(self):
+        return EPOCH + timedelta(seconds=self.end) if self.end is not None else None
+
+    @property
+    def start_time(self):
+        return self.start_dt.strftime(DT_FORMAT) if self.start is not None else None
+
+    @property
+    def end_time(self):
+        return self.end_dt.strftime(DT_FORMAT) if self.end is not None else None
+
+
+# Row factory cho SELECT {EVENT_FIELDS}: dựng Event trực tiếp từ sqlite
+def event_factory(cursor, row):
+    eid, name, start, end, loc, remind, notified, rule, extra = row
+    return Event(eid, name, _to_epoch(start), _to_epoch(end), loc, remind or 0, notified or 0, rule, extra)
+
+
+def event_cursor(conn):
+    cursor = conn.cursor()
+    cursor.row_factory = event_factory
+    return cursor
+
+
+# Index id -> Event cho chọn/sửa (không quét lại ds)
+def index_events(events):
+    return {e.id: e for e in events}
+
+
+def fetch_events(conn, calendar=DEFAULT_CALENDAR, order_by="start_time"):
+    return event_cursor(conn).execute(
+        f"SELECT {EVENT_FIELDS.format(t='events')} FROM events WHERE calendar = ? ORDER BY {order_by}, id",
+        (calendar,)).fetchall()
+
+
+# ==========================================
+# LẦN LẶP TRONG KHOẢNG THỜI GIAN
+# ==========================================
+# Yield (id, event, start, end, location, reminder, recurrence) cho mọi lần diễn ra trong [start, end)
+# Sự kiện lặp được sinh lazy, không lưu thêm dòng nào vào bảng
+# Khoảng bắt đầu trước mốc lưu trữ thì đọc thêm events_archive
+def iter_window(conn, window_start, window_end, calendar=DEFAULT_CALENDAR):
+    ws, we = window_start.strftime(DT_FORMAT), window_end.strftime(DT_FORMAT)
+    tables = event_tables(conn, calendar, ws)
+    rows = conn.execute(" UNION ALL ".join(f"""
+        SELECT {EVENT_FIELDS.format(t=table)} FROM {table}
+        WHERE calendar = ? AND recurrence IS NULL AND start_time < ?
+          AND (end_time >= ? OR (end_time IS NULL AND start_time >= ?))
+    """ for table in tables) + " ORDER BY start_time", (calendar, we, ws, ws) * len(tables)).fetchall()
+    for eid, name, start, end, loc, remind, _, rule, _ in rows:
+        yield eid, name, start, end, loc, remind, rule
+    yield from iter_recurring(conn, window_start, window_end, calendar)
+
+
+# Chỉ các lần lặp của sự kiện lặp trong [start, end) (chưa sắp xếp)
+def iter_recurring(conn, window_start, window_end, calendar=DEFAULT_CALENDAR):
+    rows = conn.execute(f"""
+        SELECT {EVENT_FIELDS.format(t='events')} FROM events
+        WHERE calendar = ? AND recurrence IS NOT NULL AND start_time < ?
+    """, (calendar, window_end.strftime(DT_FORMAT))).fetchall()
+    for eid, name, start, end, loc, remind, _, rule, _ in rows:
+        s_dt = parse_dt(start)
+        if not s_dt: continue
+        e_dt = parse_dt(end)
+        duration = e_dt - s_dt if e_dt and e_dt > s_dt else timedelta(0)
+        for occ in iter_occurrences(s_dt, rule, window_start, window_end, duration):
+            yield eid, name, occ.strftime(DT_FORMAT), (occ + duration).strftime(DT_FORMAT), loc, remind, rule
+
+
+# Sự kiện 1 lần bắt đầu trong [start, end), đọc theo trang (keyset start_time, id trên index)
+# Bộ nhớ không tăng theo kích thước bảng; window_end=None là tới hết
+# Cần archive thì đọc song song 2 bảng theo keyset rồi trộn (không sort cả 2 bảng mỗi trang)
+def iter_event_pages(conn, window_start, window_end=None, calendar=DEFAULT_CALENDAR, page_size=500):
+    ws = window_start.strftime(DT_FORMAT)
+    rows = heapq.merge(*(_iter_keyset(conn, table, calendar, ws, window_end, page_size)
+                         for table in event_tables(conn, calendar, ws)), key=lambda row: (row[2], row[0]))
+    page = []
+    for row in rows:
+        page.append(event_factory(None, row))
+        if len(page) >= page_size:
+            yield page
+            page = []
+    if page: yield page
+
+
+def _iter_keyset(conn, table, calendar, window_start, window_end, page_size):
+    last_start, last_id = window_start, 0
+    end_sql, end_args = ("AND start_time < ?", [window_end.strftime(DT_FORMAT)]) if window_end else ("", [])
+    while True:
+        rows = conn.execute(f"""
+            SELECT {EVENT_FIELDS.format(t=table)} FROM {table}
+            WHERE calendar = ? AND recurrence IS NULL {end_sql}
+              AND (start_time > ? OR (start_time = ? AND id > ?))
+            ORDER BY start_time, id LIMIT ?
+        """, [calendar] + end_args + [last_start, last_start, last_id, page_size]).fetchall()
+        if not rows: return
+        yield from rows
+        # Keyset theo chuỗi gốc trong DB (có thể thiếu giây)
+        last_id, last_start = rows[-1][0], rows[-1][2]
+
+
+# 1 trang danh sách cho bảng UI: keyset (không OFFSET) trên index (calendar, start_time) / (calendar) theo id
+# sort: "start_time" (giờ bắt đầu, id) hoặc "id" (thứ tự thêm); lọc theo khoảng giờ bắt đầu, địa điểm, đã nhắc
+# after: khóa dòng cuối trang trước; trả về (ds Event, khóa cho trang sau hoặc None nếu hết)
+# Chỉ đọc bảng events (sự kiện đã lưu trữ không sửa/xóa từ bảng), bỏ dòng thiếu giờ bắt đầu
+def list_page(conn, calendar=DEFAULT_CALENDAR, after=None, page_size=50, sort="start_time", descending=False,
+              date_from=None, date_to=None, location=None, notified=None):
+    where, args = ["calendar = ?", "start_time IS NOT NULL"], [calendar]
+    if date_from:
+        where.append("start_time >= ?")
+        args.append(date_from.strftime(DT_FORMAT))
+    if date_to:
+        where.append("start_time < ?")
+        args.append(date_to.strftime(DT_FORMAT))
+    if location:
+        where.append("location LIKE ? ESCAPE '\\'")
+        args.append("%" + re.sub(r'([\\%_])', r'\\\1', location) + "%")
+    if notified is not None:
+        where.append("is_notified = ?")
+        args.append(int(notified))
+    op, direction = ("<", "DESC") if descending else (">", "ASC")
+    if sort == "id":
+        order = f"id {direction}"
+        if after is not None:
+            where.append(f"id {op} ?")
+            args.append(after)
+    else:
+        order = f"start_time {direction}, id {direction}"
+        if after is not None:
+            where.append(f"(start_time {op} ? OR (start_time = ? AND id {op} ?))")
+            args += [after[0], after[0], after[1]]
+    rows = conn.execute(f"""
+        SELECT {EVENT_FIELDS.format(t='events')} FROM events WHERE {" AND ".join(where)} ORDER BY {order} LIMIT ?
+    """, args + [page_size + 1]).fetchall()
+    page = [event_factory(None, row) for row in rows[:page_size]]
+    if len(rows) <= page_size: return page, None
+    # Keyset theo chuỗi gốc trong DB (có thể thiếu giây)
+    last = rows[page_size - 1]
+    return page, last[0] if sort == "id" else (last[2], last[0])
+
+
+# Event theo id trong lịch (panel sửa/xóa chỉ cần dòng đang chọn)
+def get_event(conn, event_id, calendar=DEFAULT_CALENDAR):
+    return event_cursor(conn).execute(
+        f"SELECT {EVENT_FIELDS.format(t='events')} FROM events WHERE id = ? AND calendar = ?",
+        (event_id, calendar)).fetchone()
+
+
+# Khoảng bận (start, end) trong [start, end), event thiếu end_time tính DEFAULT_DURATION
+def busy_intervals(conn, window_start, window_end, calendar=DEFAULT_CALENDAR):
+    busy = []
+    for _, _, start, end, _, _, _ in iter_window(conn, window_start - DEFAULT_DURATION, window_end, calendar):
+        s_dt, e_dt = parse_dt(start), parse_dt(end)
+        if not s_dt: continue
+        if not e_dt or e_dt <= s_dt: e_dt = s_dt + DEFAULT_DURATION
+        if e_dt > window_start: busy.append((s_dt, e_dt))
+    return busy
+
+
+# N khoảng trống đầu tiên dài >= duration, trong giờ làm việc
+def find_free_slots(conn, range_start, range_end, duration,
+                    work_start=slots.WORK_START, work_end=slots.WORK_END, limit=5, calendar=DEFAULT_CALENDAR):
+    busy = busy_intervals(conn, range_start, range_end, calendar)
+    return slots.find_free_slots(busy, range_start, range_end, duration, work_start, work_end, limit)
+
+
+# ==========================================
+# LƯU TRỮ (HOT / COLD)
+# ==========================================
+def archived_before(conn, calendar=DEFAULT_CALENDAR):
+    row = conn.execute("SELECT archived_before FROM archive_state WHERE calendar = ?", (calendar,)).fetchone()
+    return row[0] if row else ""
+
+
+# Bảng cần đọc cho khoảng bắt đầu từ window_start (chuỗi DT_FORMAT)
+def event_tables(conn, calendar, window_start):
+    return ["events", "events_archive"] if window_start < archived_before(conn, calendar) else ["events"]
+
+
+# Chuyển sự kiện 1 lần kết thúc trước `before` sang events_archive, mỗi lô 1 transaction ngắn
+# (UI / worker vẫn ghi được xen giữa các lô). Trả về số dòng đã chuyển
+# Không ghi nhật ký từng dòng, chỉ 1 mốc 'A' mỗi lô; bước undo của event đã lưu trữ bị bỏ
+def archive_events(conn, calendar=DEFAULT_CALENDAR, before=None, batch_size=ARCHIVE_BATCH, checked_at=None):
+    cutoff = (before or local_now(get_calendar_tz(conn, calendar)) - ARCHIVE_AFTER).strftime(DT_FORMAT)
+    columns = ", ".join(table_columns(conn, "events"))
+    total = 0
+    while True:
+        with conn, journal_muted(conn):
+            ids = [row[0] for row in conn.execute("""
+                SELECT id FROM events
+                WHERE calendar = ? AND recurrence IS NULL
+                  AND (end_time < ? OR (end_time IS NULL AND start_time < ?))
+                LIMIT ?
+            """, (calendar, cutoff, cutoff, batch_size))]
+            if ids:
+                marks = ", ".join("?" * len(ids))
+                # Mốc nhắc đi theo event sang archive, không còn chờ báo
+                conn.execute(f"UPDATE reminders SET state = ? WHERE event_id IN ({marks}) AND state = ?",
+                             [NOTIFY_EXPIRED] + ids + [NOTIFY_PENDING])
+                conn.execute(f"INSERT INTO events_archive ({columns}) SELECT {columns} FROM events WHERE id IN ({marks})",
+                             ids)
+                conn.execute(f"DELETE FROM events WHERE id IN ({marks})", ids)
+                conn.execute(f"DELETE FROM event_journal WHERE event_id IN ({marks}) AND op IN {JOURNAL_OPS}", ids)
+                journal_mark(conn, calendar, None, "A", {"rows": len(ids)})
+            else:
+                conn.execute("""
+                    INSERT INTO archive_state (calendar, archived_before, checked_at) VALUES (?, ?, ?)
+                    ON CONFLICT(calendar) DO UPDATE SET checked_at = excluded.checked_at,
+                        archived_before = MAX(archived_before, excluded.archived_before)
+                """, (calendar, cutoff, checked_at or int(time.time())))
+        total += len(ids)
+        if not ids: return total
+
+
+# Gọi từ vòng quét nhắc (chỉ tiến trình giữ lease của lịch): tối đa 1 lần mỗi ARCHIVE_EVERY
+def maybe_archive(conn, calendar, now, after=ARCHIVE_AFTER):
+    epoch = int(now.timestamp())
+    row = conn.execute("SELECT checked_at FROM archive_state WHERE calendar = ?", (calendar,)).fetchone()
+    if row and epoch - row[0] < ARCHIVE_EVERY.total_seconds(): return 0
+    local = from_utc_epoch(epoch, get_calendar_tz(conn, calendar))
+    return archive_events(conn, calendar, local - after, checked_at=epoch)
+
+
+# ==========================================
+# NHẮC NHỞ
+# ==========================================
+# Phút hiện tại dạng UTC epoch (now naive = giờ máy, now có tzinfo = đúng múi giờ đó)
+def _tick(now):
+    return int(now.timestamp()) // 60 * 60
+
+
+# Ds mốc nhắc (phút) -> không trùng, sớm nhất trước (mốc chính = reminder_minutes); rỗng = nhắc đúng giờ
+def normalize_reminders(offsets):
+    return sorted({int(m) for m in offsets or [0]}, reverse=True)
+
+
+# Ds mốc nhắc -> (reminder_minutes, extra_reminders JSON) theo cột file xuất/nhập (calendar_io.EXPORT_COLUMNS)
+def split_reminders(offsets):
+    offsets = normalize_reminders(offsets)
+    return offsets[0], json.dumps(offsets[1:]) if len(offsets) > 1 else None
+
+
+# Ô sửa trên UI: [1440, 30] <-> "1440, 30" (phút, cách nhau dấu phẩy); ô trống = không nhắc sớm
+def format_reminder_list(offsets):
+    return ", ".join(str(m) for m in offsets)
+
+
+def parse_reminder_list(text):
+    parts = [p.strip() for p in re.split(r'[,;\s]+', text or "") if p.strip()]
+    if not all(p.isdigit() for p in parts): raise ValueError(f"Mốc nhắc phải là số phút, VD: 1440, 30 (nhập: {text})")
+    return [int(p) for p in parts] or [0]
+
+
+# Mốc nhắc của event (bảng reminders), sớm nhất trước
+def event_reminders(conn, event_id):
+    return [m for m, in conn.execute("SELECT minutes FROM reminders WHERE event_id = ? ORDER BY minutes DESC",
+                                     (event_id,))]
+
+
+# Ghi ds mốc nhắc của event vào bảng reminders (nguồn duy nhất), reminder_minutes = mốc sớm nhất
+# Mốc mới chờ sync_reminders tính giờ nhắc, mốc giữ nguyên không mất trạng thái đã báo. Trả về ds đã chuẩn hóa
+def set_reminders(conn, event_id, offsets):
+    offsets = normalize_reminders(offsets)
+    conn.execute("UPDATE events SET reminder_minutes = ? WHERE id = ? AND reminder_minutes IS NOT ?",
+                 (offsets[0], event_id, offsets[0]))
+    conn.execute(f"DELETE FROM reminders WHERE event_id = ? AND minutes NOT IN ({', '.join('?' * len(offsets))})",
+                 [event_id] + offsets)
+    conn.executemany("INSERT OR IGNORE INTO reminders (event_id, minutes, dirty) VALUES (?, ?, 1)",
+                     [(event_id, m) for m in offsets])
+    return offsets
+
+
+# Thêm 1 event (chưa commit), giờ dạng chuỗi DT_FORMAT; reminders: ds mọi mốc nhắc (phút). Trả về id
+def insert_event(conn, calendar, name, start, end, location, reminders, recurrence=None):
+    since = journal_version(conn, calendar)
+    offsets = normalize_reminders(reminders)
+    event_id = conn.execute("""
+        INSERT INTO events (event, start_time, end_time, location, reminder_minutes, recurrence, calendar)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, (name, start, end, location, offsets[0], recurrence, calendar)).lastrowid
+    set_reminders(conn, event_id, offsets)
+    _journal_reminders(conn, calendar, event_id, "I", offsets, since)
+    return event_id
+
+
+# Sửa event (chưa commit), báo lại từ đầu; đổi mốc nhắc thì ghi chung vào bước undo của lần sửa
+# Trả về False nếu event không thuộc lịch
+def update_event(conn, calendar, event_id, name, start, end, location, reminders, recurrence=None):
+    since = journal_version(conn, calendar)
+    old = event_reminders(conn, event_id)
+    offsets = normalize_reminders(reminders)
+    updated = conn.execute("""
+        UPDATE events
+        SET event=?, start_time=?, end_time=?, location=?, reminder_minutes=?, recurrence=?, is_notified=0
+        WHERE id=? AND calendar=?
+    """, (name, start, end, location, offsets[0], recurrence, event_id, calendar)).rowcount
+    if not updated: return False
+    set_reminders(conn, event_id, offsets)
+    if old != offsets: _journal_reminders(conn, calendar, event_id, "U", [old, offsets], since)
+    return True
+
+
+# Thêm nhiều kết quả phân tích (câu ghép) trong 1 transaction: lỗi giữa chừng thì không thêm cái nào
+# Mỗi event vẫn là 1 bước undo; giờ kết thúc trống -> start + DEFAULT_DURATION. Trả về ds id
+def insert_events(conn, results, calendar=DEFAULT_CALENDAR):
+    ids = []
+    with conn:
+        for r in results:
+            start = parse_dt(r["start_time"])
+            end = r.get("end_time") or (start + DEFAULT_DURATION).strftime(DT_FORMAT)
+            ids.append(insert_event(conn, calendar, r["event"], start.strftime(DT_FORMAT), end, r.get("location"),
+                                    r.get("reminders") or [r.get("reminder_minutes") or 0], r.get("recurrence")))
+    maybe_snapshot(conn, calendar)
+    return ids
+
+
+# Tính fire_at cho các mốc nhắc trigger vừa thêm / đánh dấu (dirty = 1), trả về số dòng đã tính
+# Gọi trước mỗi lần quét nhắc nên event ghi từ kết nối ngoài vẫn được nhắc ở vòng quét kế tiếp
+def sync_reminders(conn):
+    with conn:
+        return conn.execute(f"""
+            UPDATE reminders SET dirty = 0, fire_at = (
+                SELECT {NEXT_FIRE_SQL.format(p="e.", minutes="reminders.minutes", after="NULL")}
+                FROM events e WHERE e.id = reminders.event_id)
+            WHERE dirty = 1
+        """).rowcount
+
+
+# Mốc nhắc đang chờ có fire_at trong [fire_start, fire_end) của 1 lịch
+# Quét đoạn index (state, fire_at) rồi mới nối sang events (CROSS JOIN giữ thứ tự nối)
+def _pending_reminders(conn, calendar, fire_start, fire_end):
+    return conn.execute("""
+        SELECT r.id, e.event, e.location, r.minutes, r.fire_at FROM reminders r CROSS JOIN events e ON e.id = r.event_id
+        WHERE r.state = ? AND r.fire_at >= ? AND r.fire_at < ? AND e.calendar = ?
+        ORDER BY r.fire_at
+    """, (NOTIFY_PENDING, fire_start, fire_end, calendar)).fetchall()
+
+
+# Danh sách (reminder_id, event, location, minutes, fire_at) cần nhắc ở phút hiện tại
+# Sự kiện lặp và sự kiện 1 lần như nhau: fire_at của sự kiện lặp luôn là lần nhắc kế tiếp
+def due_reminders(conn, now, calendar=DEFAULT_CALENDAR):
+    sync_reminders(conn)
+    tick = _tick(now)
+    return _pending_reminders(conn, calendar, tick, tick + int(REMINDER_LOOKAHEAD.total_seconds()))
+
+
+# Bù nhắc sau thời gian tắt/ngủ: trả về nhắc bị lỡ trong CATCH_UP_GRACE (chưa nhận)
+# và số nhắc quá hạn cũ hơn (đã đánh dấu hết hạn để vòng quét không phải xét lại)
+def catch_up_reminders(conn, now, calendar=DEFAULT_CALENDAR, grace=CATCH_UP_GRACE):
+    sync_reminders(conn)
+    tick = _tick(now)
+    cutoff = tick - int(grace.total_seconds())
+    event_ids = "SELECT id FROM events WHERE calendar = ?"
+    # Sự kiện lặp tụt lại quá lâu: nhảy tới lần nhắc đầu tiên còn trong grace (hoặc tương lai)
+    conn.execute(f"""
+        UPDATE reminders SET fire_at = (
+            SELECT {NEXT_FIRE_SQL.format(p="e.", minutes="reminders.minutes", after="?")}
+            FROM events e WHERE e.id = reminders.event_id)
+        WHERE state = ? AND fire_at < ? AND event_id IN ({event_ids} AND recurrence IS NOT NULL)
+    """, (cutoff, NOTIFY_PENDING, cutoff, calendar))
+    missed = _pending_reminders(conn, calendar, cutoff, tick)
+    # Sự kiện 1 lần quá cũ + sự kiện lặp đã hết lần lặp (fire_at NULL)
+    expired = conn.execute(f"""
+        UPDATE reminders SET state = ?
+        WHERE state = ? AND (fire_at IS NULL OR fire_at < ?) AND event_id IN ({event_ids})
+    """, (NOTIFY_EXPIRED, NOTIFY_PENDING, cutoff, calendar)).rowcount
+    conn.commit()
+    return missed, expired
+
+
+# Gộp nhiều nhắc bị lỡ thành 1 thông báo tóm tắt
+def summarize_missed(missed, max_names=5):
+    names = [name for _, name, _, _, _ in missed]
+    text = ", ".join(names[:max_names])
+    if len(names) > max_names: text += f" và {len(names) - max_names} sự kiện khác"
+    return f"Bạn đã lỡ {len(names)} nhắc nhở: {text}"
+
+
+# Ds lịch đang có dữ liệu (đi theo index, không quét bảng)
+def list_calendars(conn):
+    return [row[0] for row in conn.execute("SELECT DISTINCT calendar FROM events ORDER BY calendar")]
+
+
+# ==========================================
+# ĐIỀU PHỐI NHẮC (worker, thread Tk, Streamlit cùng chạy)
+# ==========================================
+# Nhận nhắc trước khi báo: UPDATE có điều kiện trên đúng fire_at đã đọc -> chỉ 1 tiến trình đổi được dòng
+# Nhận xong fire_at chuyển sang lần lặp kế tiếp; không còn lần nào (sự kiện 1 lần) thì state = đã gửi
+def claim_reminder(conn, reminder_id, fire_at):
+    claimed = conn.execute(f"""
+        UPDATE reminders SET fire_at = (
+            SELECT {NEXT_FIRE_SQL.format(p="e.", minutes="reminders.minutes", after="?")}
+            FROM events e WHERE e.id = reminders.event_id)
+        WHERE id = ? AND state = ? AND fire_at = ?
+    """, (fire_at + 60, reminder_id, NOTIFY_PENDING, fire_at)).rowcount
+    if claimed:
+        conn.execute("UPDATE reminders SET state = ?, fire_at = ? WHERE id = ? AND fire_at IS NULL",
+                     (NOTIFY_SENT, fire_at, reminder_id))
+    conn.commit()
+    return claimed == 1
+
+
+# Lọc ds nhắc (due_reminders / catch_up_reminders), chỉ giữ nhắc tiến trình này nhận được
+def claim_reminders(conn, reminders):
+    return [r for r in reminders if claim_reminder(conn, r[0], r[4])]
+
+
+# Lease theo lịch: tiến trình giữ lease mới quét lịch đó, gia hạn (heartbeat) mỗi vòng
+# Lease hết hạn (tiến trình chết) thì tiến trình khác lấy lại ở vòng kế tiếp
+def lease_owner(role):
+    return f"{role}@{socket.gethostname()}:{os.getpid()}"
+
+
+def acquire_lease(conn, calendar, owner, now, ttl=LEASE_TTL):
+    epoch = int(now.timestamp())
+    with conn:
+        # 1 câu upsert: chỉ ghi đè khi lease là của mình hoặc đã hết hạn (SQLite tuần tự hóa lệnh ghi)
+        conn.execute("""
+            INSERT INTO reminder_leases (calendar, owner, expires_at) VALUES (?, ?, ?)
+            ON CONFLICT(calendar) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+            WHERE reminder_leases.owner = excluded.owner OR reminder_leases.expires_at <= ?
+        """, (calendar, owner, epoch + int(ttl.total_seconds()), epoch))
+        row = conn.execute("SELECT owner FROM reminder_leases WHERE calendar = ?", (calendar,)).fetchone()
+    return row is not None and row[0] == owner
+
+
+# Tắt đúng cách -> nhả lease để tiến trình khác nhận ngay, không phải đợi hết hạn
+def release_leases(conn, owner):
+    with conn:
+        conn.execute("DELETE FROM reminder_leases WHERE owner = ?", (owner,))
+
+
+# ==========================================
+# MÚI GIỜ CỦA LỊCH
+# ==========================================
+def get_calendar_tz(conn, calendar=DEFAULT_CALENDAR):
+    row = conn.execute("SELECT tz FROM calendars WHERE name = ?", (calendar,)).fetchone()
+    return row[0] if row else DEFAULT_TZ
+
+
+# Đổi múi giờ lịch -> tính lại giờ nhắc đang chờ của các event không đặt múi giờ riêng
+def set_calendar_tz(conn, calendar, tz):
+    if not is_valid_tz(tz): raise ValueError(f"Múi giờ không hợp lệ: {tz}")
+    with conn:
+        conn.execute("INSERT INTO calendars (name, tz) VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET tz = excluded.tz",
+                     (calendar, tz))
+        conn.execute(f"""
+            UPDATE reminders SET fire_at = (
+                SELECT {NEXT_FIRE_SQL.format(p="e.", minutes="reminders.minutes", after="NULL")}
+                FROM events e WHERE e.id = reminders.event_id)
+            WHERE state = ? AND event_id IN (SELECT id FROM events WHERE calendar = ? AND tz IS NULL)
+        """, (NOTIFY_PENDING, calendar))
+
+
+# ==========================================
+# NHẬT KÝ THAY ĐỔI (UNDO / REDO / CHANGE FEED)
+# ==========================================
+# Trường người dùng sửa được, chỉ các trường này được ghi nhật ký
+# Mốc nhắc nằm ở bảng reminders: lưu trong delta dưới khóa "reminders" (ds mọi mốc, sửa thì [cũ, mới])
+JOURNAL_FIELDS = ["event", "start_time", "end_time", "location", "reminder_minutes", "recurrence", "tz"]
+# Ds mốc nhắc (JSON) của dòng {t} đọc từ bảng reminders, cho nhật ký / snapshot
+REMINDER_LIST_SQL = "json((SELECT json_group_array(r.minutes) FROM reminders r WHERE r.event_id = {t}.id))"
+# Thao tác undo được: I = thêm, U = sửa, D = xóa; còn lại là mốc cho change feed (u/r = undo/redo, S, B, A)
+JOURNAL_OPS = ("I", "U", "D")
+JOURNAL_KEEP = 500  # số bước undo giữ lại mỗi lịch, cũ hơn nằm trong snapshot
+SNAPSHOT_EVERY = 200  # số thay đổi giữa 2 snapshot
+SNAPSHOTS_KEEP = 3
+
+
+# Tắt ghi nhật ký cho thao tác tự sinh (undo/redo, khôi phục snapshot, nhập hàng loạt)
+# Trigger nhật ký chỉ ghi khi bảng journal_mute trống (SQL thuần -> kết nối sqlite3 thường cũng ghi được)
+# Cờ thêm/xóa trong cùng transaction ghi: kết nối khác không thấy cờ, rollback cũng bỏ cờ
+@contextmanager
+def journal_muted(conn):
+    conn.execute("INSERT OR IGNORE INTO journal_mute (id) VALUES (1)")
+    try:
+        yield
+    finally:
+        conn.execute("DELETE FROM journal_mute")
+
+
+def init_journal(conn):
+    # Chỉ thêm dòng mới; cột undone đánh dấu bước đang nằm trong stack redo
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS event_journal (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            calendar TEXT NOT NULL,
+            event_id INTEGER,
+            op TEXT NOT NULL,
+            delta TEXT,
+            undone INTEGER NOT NULL DEFAULT 0,
+            ts INTEGER NOT NULL DEFAULT (strftime('%s', 'now'))
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_journal_cal_seq ON event_journal(calendar, seq)")
+    conn.execute("CREATE TABLE IF NOT EXISTS journal_mute (id INTEGER PRIMARY KEY CHECK (id = 1))")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS journal_snapshots (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            calendar TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            ts INTEGER NOT NULL DEFAULT (strftime('%s', 'now')),
+            data TEXT NOT NULL
+        )
+    """)
+    # Trigger tạo trước khi JOURNAL_FIELDS có thêm trường / còn gọi hàm Python journal_on() -> tạo lại
+    row = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'events_journal_au'").fetchone()
+    if row and (not all(f in row[0] for f in JOURNAL_FIELDS) or "journal_on()" in row[0]):
+        for trigger in ("events_journal_ai", "events_journal_au", "events_journal_bd"):
+            conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    # Bản cũ ghi bước xóa sau khi xóa (AFTER DELETE): lúc đó mốc nhắc của event có thể đã bị xóa
+    conn.execute("DROP TRIGGER IF EXISTS events_journal_ad")
+    # Thêm/xóa: lưu đủ trường; sửa: chỉ lưu trường đổi {field: [cũ, mới]}
+    new_obj = ", ".join(f"'{f}', new.{f}" for f in JOURNAL_FIELDS)
+    old_obj = ", ".join(f"'{f}', old.{f}" for f in JOURNAL_FIELDS)
+    changes = " UNION ALL ".join(f"SELECT '{f}' AS f, old.{f} AS o, new.{f} AS n" for f in JOURNAL_FIELDS)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS events_journal_ai AFTER INSERT ON events WHEN NOT EXISTS (SELECT 1 FROM journal_mute) BEGIN
+            INSERT INTO event_journal (calendar, event_id, op, delta)
+            VALUES (new.calendar, new.id, 'I', json_object({new_obj}));
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS events_journal_au AFTER UPDATE OF {", ".join(JOURNAL_FIELDS)} ON events
+        WHEN NOT EXISTS (SELECT 1 FROM journal_mute) BEGIN
+            INSERT INTO event_journal (calendar, event_id, op, delta)
+            SELECT new.calendar, new.id, 'U', json_group_object(f, json_array(o, n))
+            FROM ({changes}) WHERE o IS NOT n HAVING count(*) > 0;
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS events_journal_bd BEFORE DELETE ON events
+        WHEN NOT EXISTS (SELECT 1 FROM journal_mute) BEGIN
+            INSERT INTO event_journal (calendar, event_id, op, delta)
+            VALUES (old.calendar, old.id, 'D', json_object({old_obj}, 'reminders', {REMINDER_LIST_SQL.format(t="old")}));
+        END
+    """)
+    # Thay đổi mới -> bỏ stack redo của lịch đó
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS journal_clear_redo AFTER INSERT ON event_journal
+        WHEN new.op IN {JOURNAL_OPS} BEGIN
+            DELETE FROM event_journal WHERE calendar = new.calendar AND undone = 1;
+        END
+    """)
+
+
+# Phiên bản dữ liệu của lịch: tăng sau mọi thay đổi (kể cả undo/redo) -> khóa cache
+def journal_version(conn, calendar=DEFAULT_CALENDAR):
+    row = conn.execute("SELECT MAX(seq) FROM event_journal WHERE calendar = ?", (calendar,)).fetchone()
+    return row[0] or 0
+
+
+# Change feed: các bước sau seq, dạng (seq, event_id, op, delta)
+def journal_since(conn, calendar=DEFAULT_CALENDAR, since=0, limit=1000):
+    rows = conn.execute("""
+        SELECT seq, event_id, op, delta FROM event_journal WHERE calendar = ? AND seq > ? ORDER BY seq LIMIT ?
+    """, (calendar, since, limit)).fetchall()
+    return [(seq, eid, op, json.loads(delta) if delta else None) for seq, eid, op, delta in rows]
+
+
+def journal_mark(conn, calendar, event_id, op, info):
+    conn.execute("INSERT INTO event_journal (calendar, event_id, op, delta) VALUES (?, ?, ?, ?)",
+                 (calendar, event_id, op, json.dumps(info)))
+
+
+# Trigger nhật ký không thấy bảng reminders: gắn ds mốc nhắc vào bước I/U của event vừa ghi (seq > since)
+# Lần sửa chỉ đổi mốc nhắc (trigger không ghi bước U nào) -> thêm bước U riêng
+def _journal_reminders(conn, calendar, event_id, op, value, since):
+    if conn.execute("SELECT 1 FROM journal_mute").fetchone(): return
+    row = conn.execute("""
+        SELECT seq FROM event_journal WHERE calendar = ? AND seq > ? AND event_id = ? AND op = ? ORDER BY seq DESC LIMIT 1
+    """, (calendar, since, event_id, op)).fetchone()
+    if row:
+        conn.execute("UPDATE event_journal SET delta = json_set(delta, '$.reminders', json(?)) WHERE seq = ?",
+                     (json.dumps(value), row[0]))
+    elif op == "U":
+        journal_mark(conn, calendar, event_id, "U", {"reminders": value})
+
+
+# Áp dụng 1 bước theo chiều xuôi (redo) hoặc ngược (undo)
+def _apply_step(conn, calendar, event_id, op, delta, forward):
+    fields = [f for f in delta if f in JOURNAL_FIELDS]
+    if op == "U":
+        values = [delta[f][1] if forward else delta[f][0] for f in fields]
+        # Giống update_event: đổi giờ thì báo lại
+        if fields:
+            conn.execute(f"""
+                UPDATE events SET {", ".join(f"{f} = ?" for f in fields)}, is_notified = 0
+                WHERE id = ? AND calendar = ?
+            """, values + [event_id, calendar])
+        if "reminders" in delta: set_reminders(conn, event_id, delta["reminders"][1 if forward else 0])
+    elif (op == "I") == forward:  # redo thêm / undo xóa: thêm lại đúng id cũ
+        cols = ["id", "calendar"] + fields
+        conn.execute(f"INSERT INTO events ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))})",
+                     [event_id, calendar] + [delta[f] for f in fields])
+        if "reminders" in delta: set_reminders(conn, event_id, delta["reminders"])
+    else:
+        conn.execute("DELETE FROM events WHERE id = ? AND calendar = ?", (event_id, calendar))
+
+
+def _journal_step(conn, calendar, row, forward):
+    seq, event_id, op, delta = row
+    with conn:
+        with journal_muted(conn):
+            _apply_step(conn, calendar, event_id, op, json.loads(delta), forward)
+        conn.execute("UPDATE event_journal SET undone = ? WHERE seq = ?", (0 if forward else 1, seq))
+        journal_mark(conn, calendar, event_id, "r" if forward else "u", {"seq": seq})
+    return {"seq": seq, "event_id": event_id, "op": op}
+
+
+# Hoàn tác bước gần nhất của lịch, trả về None nếu không còn gì
+def undo(conn, calendar=DEFAULT_CALENDAR):
+    row = conn.execute(f"""
+        SELECT seq, event_id, op, delta FROM event_journal
+        WHERE calendar = ? AND op IN {JOURNAL_OPS} AND undone = 0 ORDER BY seq DESC LIMIT 1
+    """, (calendar,)).fetchone()
+    return _journal_step(conn, calendar, row, forward=False) if row else None
+
+
+# Làm lại bước vừa hoàn tác (bước hoàn tác sau cùng có seq nhỏ nhất)
+def redo(conn, calendar=DEFAULT_CALENDAR):
+    row = conn.execute("""
+        SELECT seq, event_id, op, delta FROM event_journal
+        WHERE calendar = ? AND undone = 1 ORDER BY seq LIMIT 1
+    """, (calendar,)).fetchone()
+    return _journal_step(conn, calendar, row, forward=True) if row else None
+
+
+# Lưu toàn bộ lịch thành 1 bản JSON, cắt nhật ký còn JOURNAL_KEEP bước
+def snapshot(conn, calendar=DEFAULT_CALENDAR):
+    fields = JOURNAL_FIELDS + ["is_notified"]
+    with conn:
+        conn.execute(f"""
+            INSERT INTO journal_snapshots (calendar, seq, data)
+            SELECT ?, ?, json_group_array(json_object('id', id, {", ".join(f"'{f}', {f}" for f in fields)},
+                                                      'reminders', {REMINDER_LIST_SQL.format(t="events")}))
+            FROM events WHERE calendar = ?
+        """, (calendar, journal_version(conn, calendar), calendar))
+        conn.execute("""
+            DELETE FROM event_journal WHERE calendar = ? AND undone = 0 AND seq <= (
+                SELECT seq FROM event_journal WHERE calendar = ? ORDER BY seq DESC LIMIT 1 OFFSET ?)
+        """, (calendar, calendar, JOURNAL_KEEP))
+        conn.execute("""
+            DELETE FROM journal_snapshots WHERE calendar = ? AND id NOT IN (
+                SELECT id FROM journal_snapshots WHERE calendar = ? ORDER BY id DESC LIMIT ?)
+        """, (calendar, calendar, SNAPSHOTS_KEEP))
+
+
+# Gọi sau mỗi lần ghi: đủ SNAPSHOT_EVERY thay đổi từ snapshot trước thì chụp mới
+def maybe_snapshot(conn, calendar=DEFAULT_CALENDAR):
+    row = conn.execute("SELECT MAX(seq) FROM journal_snapshots WHERE calendar = ?", (calendar,)).fetchone()
+    pending = conn.execute("SELECT COUNT(*) FROM event_journal WHERE calendar = ? AND seq > ?",
+                           (calendar, row[0] or 0)).fetchone()[0]
+    if pending >= SNAPSHOT_EVERY:
+        snapshot(conn, calendar)
+        return True
+    return False
+
+
+def list_snapshots(conn, calendar=DEFAULT_CALENDAR):
+    return conn.execute("""
+        SELECT id, seq, ts, json_array_length(data) FROM journal_snapshots WHERE calendar = ? ORDER BY id DESC
+    """, (calendar,)).fetchall()
+
+
+# Đưa lịch về đúng trạng thái snapshot (mặc định bản mới nhất) bằng 1 câu INSERT ... SELECT json_each
+def restore_snapshot(conn, calendar=DEFAULT_CALENDAR, snapshot_id=None):
+    row = conn.execute("""
+        SELECT id, data FROM journal_snapshots WHERE calendar = ? AND (? IS NULL OR id = ?) ORDER BY id DESC LIMIT 1
+    """, (calendar, snapshot_id, snapshot_id)).fetchone()
+    if not row: return False
+    fields = JOURNAL_FIELDS + ["is_notified"]
+    with conn:
+        with journal_muted(conn):
+            conn.execute("DELETE FROM events WHERE calendar = ?", (calendar,))
+            conn.execute(f"""
+                INSERT INTO events (id, calendar, {", ".join(fields)})
+                SELECT json_extract(value, '$.id'), ?, {", ".join(f"json_extract(value, '$.{f}')" for f in fields)}
+                FROM json_each(?)
+            """, (calendar, row[1]))
+            # Event đã lưu trữ sau lúc chụp vẫn nằm trong archive
+            conn.execute("DELETE FROM events WHERE calendar = ? AND id IN (SELECT id FROM events_archive WHERE calendar = ?)",
+                         (calendar, calendar))
+            # Trigger chỉ thêm mốc chính -> thêm các mốc còn lại (snapshot bản cũ: extra_reminders)
+            conn.execute("""
+                INSERT OR IGNORE INTO reminders (event_id, minutes, state, dirty)
+                SELECT json_extract(s.value, '$.id'), m.value,
+                       CASE WHEN json_extract(s.value, '$.recurrence') IS NULL
+                            THEN COALESCE(json_extract(s.value, '$.is_notified'), 0) ELSE 0 END, 1
+                FROM json_each(?) s, json_each(COALESCE(json_extract(s.value, '$.reminders'),
+                                                        json_extract(s.value, '$.extra_reminders'), '[]')) m
+                WHERE json_extract(s.value, '$.id') IN (SELECT id FROM events WHERE calendar = ?)
+            """, (row[1], calendar))
+        # Các bước trước đó không còn áp dụng lên trạng thái mới
+        conn.execute(f"DELETE FROM event_journal WHERE calendar = ? AND op IN {JOURNAL_OPS}", (calendar,))
+        journal_mark(conn, calendar, None, "S", {"snapshot": row[0]})
+    return True
@@ -1,13 +1,22 @@
 import streamlit as st
-import pandas as pd
-import sqlite3
 from datetime import datetime, timedelta
+import io
+import os
 import time
+import tempfile
+import threading
 from streamlit_calendar import calendar
+from storage import init_schema, iter_window, due_reminders, claim_reminder, claim_reminders, find_free_slots, \
+    search_events, fetch_events, list_page, get_event, catch_up_reminders, summarize_missed, connect, get_calendar_tz, \
+    set_calendar_tz, undo, redo, maybe_snapshot, insert_event, update_event, insert_events, format_reminder_list, \
+    parse_reminder_list, lease_owner, acquire_lease, maybe_archive, DEFAULT_CALENDAR
+from timezones import local_now
+from backup import export_snapshot
 
 # Import logic NLP
 try:
     from nlp import SchedulerMain
+    from parse_service import get_parser
 except ImportError:
     st.error("⚠️ Lỗi: Không tìm thấy file nlp.py. Hãy đảm bảo đã upload lên GitHub.")
     st.stop()
@@ -16,98 +25,151 @@ except ImportError:
 # 1. DATABASE MANAGER
 # ==========================================
 class Database:
-    def __init__(self, db_name="scheduler.db"):
+    def __init__(self, db_name="scheduler.db", calendar=DEFAULT_CALENDAR):
         self.db_name = db_name
+        # Mọi truy vấn chỉ chạm vào dòng của lịch này
+        self.calendar = calendar
 
     def get_connection(self):
         # Kết nối trực tiếp mỗi lần gọi để tránh lỗi cache
-        return sqlite3.connect(self.db_name, check_same_thread=False)
+        return connect(self.db_name, check_same_thread=False)
 
     def init_db(self):
         with self.get_connection() as conn:
-            cursor = conn.cursor()
             # Cấu trúc bảng chuẩn: cột tên là 'event'
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS events (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    event TEXT,
-                    start_time TEXT,
-                    end_time TEXT,
-                    location TEXT,
-                    reminder_minutes INTEGER,
-                    is_notified INTEGER DEFAULT 0
-                )
-            """)
-            conn.commit()
+            init_schema(conn)
+            # Múi giờ của lịch: câu "mai 9h" hiểu theo giờ của user, không theo giờ máy chủ
+            self.tz = get_calendar_tz(conn, self.calendar)
+
+    def set_timezone(self, tz):
+        with self.get_connection() as conn:
+            set_calendar_tz(conn, self.calendar, tz)
+        self.tz = tz
 
+    # Ds Event xếp theo giờ bắt đầu
     def get_all_events(self):
         with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM events ORDER BY start_time ASC")
-            return cursor.fetchall()
-            
-    def get_unnotified_events(self):
+            return fetch_events(conn, self.calendar)
+
+    # 1 trang cho bảng danh sách (keyset), after = khóa trang trước, xem storage.list_page
+    def list_page(self, after=None, **filters):
         with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM events WHERE is_notified = 0")
-            return cursor.fetchall()
+            return list_page(conn, self.calendar, after, **filters)
 
-    def add_event(self, name, start, end, loc, remind):
+    def get_event(self, event_id):
         with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                INSERT INTO events (event, start_time, end_time, location, reminder_minutes) 
-                VALUES (?, ?, ?, ?, ?)
-            """, (name, start, end, loc, remind))
-            conn.commit()
+            return get_event(conn, event_id, self.calendar)
+
+    # Tìm theo tên/địa điểm (FTS5, không phân biệt dấu), xếp theo độ liên quan
+    def search(self, query, limit=20):
+        with self.get_connection() as conn:
+            return search_events(conn, query, limit, self.calendar)
+
+    # Các lần diễn ra trong khoảng [start, end), sự kiện lặp được sinh lazy
+    def get_occurrences(self, window_start, window_end):
+        with self.get_connection() as conn:
+            return list(iter_window(conn, window_start, window_end, self.calendar))
+
+    # Nhắc nhở đến hạn ở phút hiện tại (gồm cả lần lặp)
+    def get_due_reminders(self, now):
+        with self.get_connection() as conn:
+            return due_reminders(conn, now, self.calendar)
+
+    # True nếu phiên này nhận được nhắc (chưa tiến trình nào khác báo)
+    def claim_reminder(self, reminder_id, fire_at):
+        with self.get_connection() as conn:
+            return claim_reminder(conn, reminder_id, fire_at)
+
+    # Nhắc bị lỡ giữa 2 lần rerun (trong khoảng grace), nhắc quá cũ bị đánh dấu hết hạn
+    # Chỉ trả về nhắc nhận được
+    def catch_up_reminders(self, now):
+        with self.get_connection() as conn:
+            missed, _ = catch_up_reminders(conn, now, self.calendar)
+            return claim_reminders(conn, missed)
+
+    # Worker / app Tk đang phát nhắc cho lịch này thì Streamlit không quét
+    def acquire_lease(self, owner, now):
+        with self.get_connection() as conn:
+            return acquire_lease(conn, self.calendar, owner, now)
+
+    # Chuyển sự kiện đã qua lâu sang archive (tối đa 1 lần/giờ)
+    def maybe_archive(self, now):
+        with self.get_connection() as conn:
+            return maybe_archive(conn, self.calendar, now)
+
+    # reminders: ds mọi mốc nhắc (phút), có thì thay cho remind
+    def add_event(self, name, start, end, loc, remind, recurrence=None, reminders=None):
+        with self.get_connection() as conn:
+            with conn:
+                insert_event(conn, self.calendar, name, start, end, loc, reminders or [remind], recurrence)
+            maybe_snapshot(conn, self.calendar)
+
+    # Các event của 1 câu ghép: thêm hết hoặc không thêm gì
+    def add_events(self, results):
+        with self.get_connection() as conn:
+            return insert_events(conn, results, self.calendar)
 
     def delete_event(self, event_id):
         with self.get_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("DELETE FROM events WHERE id = ?", (event_id,))
+            cursor.execute("DELETE FROM events WHERE id = ? AND calendar = ?", (event_id, self.calendar))
             conn.commit()
+            maybe_snapshot(conn, self.calendar)
 
-    def update_event(self, record_id, name, start, end, loc, remind):
+    # reminders: ds mọi mốc nhắc (phút), ghi vào bảng reminders; is_notified về 0 để báo lại
+    def update_event(self, record_id, name, start, end, loc, reminders, recurrence=None):
         with self.get_connection() as conn:
-            cursor = conn.cursor()
-            # Reset is_notified về 0 khi sửa để báo lại
-            # Cột là 'event', KHÔNG PHẢI 'event_name'
-            cursor.execute("""
-                UPDATE events 
-                SET event=?, start_time=?, end_time=?, location=?, reminder_minutes=?, is_notified=0
-                WHERE id=?
-            """, (name, start, end, loc, remind, record_id))
-            conn.commit()
+            with conn:
+                update_event(conn, self.calendar, record_id, name, start, end, loc, reminders, recurrence)
+            maybe_snapshot(conn, self.calendar)
 
-    def mark_notified(self, event_id):
+    # Hoàn tác / làm lại thêm-sửa-xóa (theo nhật ký event_journal), None nếu không còn bước nào
+    def undo(self):
         with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("UPDATE events SET is_notified = 1 WHERE id = ?", (event_id,))
-            conn.commit()
+            return undo(conn, self.calendar)
+
+    def redo(self):
+        with self.get_connection() as conn:
+            return redo(conn, self.calendar)
+
+    # N khoảng trống đầu tiên (quét 1 lượt ds bận đã gộp)
+    def find_free_slots(self, range_start, range_end, duration, work_start, work_end, limit=5):
+        with self.get_connection() as conn:
+            return find_free_slots(conn, range_start, range_end, duration, work_start, work_end, limit,
+                                   self.calendar)
 
     def check_overlap(self, new_start_str, exclude_id=None):
         if not new_start_str: return False, None
         with self.get_connection() as conn:
             cursor = conn.cursor()
-            query = "SELECT id, event, start_time FROM events WHERE id != ?"
-            params = [exclude_id if exclude_id else -1]
+            # Chỉ tra event cùng lịch, cùng giờ bắt đầu (index calendar, start_time)
+            query = "SELECT event FROM events WHERE calendar = ? AND start_time = ? AND id != ? LIMIT 1"
+            params = [self.calendar, new_start_str, exclude_id if exclude_id else -1]
             cursor.execute(query, params)
-            rows = cursor.fetchall()
-            for row in rows:
-                _, e_name, e_start = row
-                if new_start_str == e_start:
-                    return True, e_name
+            row = cursor.fetchone()
+            if row:
+                return True, row[0]
             return False, None
 
 # Khởi tạo DB
-db = Database()
+# Lịch của user/team lấy từ URL: ?calendar=ten_lich (mặc định "default")
+calendar_name = st.query_params.get("calendar", DEFAULT_CALENDAR)
+db = Database(calendar=calendar_name)
 db.init_db()
 
 @st.cache_resource
 def get_scheduler_logic():
-    return SchedulerMain()
+    # Ưu tiên parse_service (model chung, gom request), không có thì nạp SchedulerMain trong process này
+    return get_parser()
 
 scheduler = get_scheduler_logic()
+# Ứng viên tốt nhất hơn ứng viên thứ 2 từ mức này thì thêm luôn, sát nhau thì hỏi lại user
+CONFIDENT_MARGIN = 0.15
+# Bảng danh sách: sắp xếp -> (sort, descending) của list_page
+LIST_SORTS = {"Giờ bắt đầu ↑": ("start_time", False), "Giờ bắt đầu ↓": ("start_time", True),
+              "Mới thêm trước": ("id", True), "Thêm trước": ("id", False)}
+LIST_NOTIFIED = {"Tất cả": None, "Chưa nhắc": False, "Đã nhắc": True}
+LIST_PAGE_SIZES = [25, 50, 100, 200]
 
 # ==========================================
 # 2. CONFIG & STATE
@@ -121,27 +183,76 @@ if 'data_version' not in st.session_state:
 
 if 'selected_id_from_table' not in st.session_state:
     st.session_state.selected_id_from_table = None
-# Hàm kiểm tra nhắc nhở (Toast)
-def check_reminders():
-    events = db.get_unnotified_events()
-    now_str = datetime.now().strftime("%Y-%m-%d %H:%M")
-    
-    for ev in events:
-        eid, name, start, end, loc, remind, notified = ev
-        try:
-            try: s_dt = datetime.strptime(start, "%Y-%m-%d %H:%M:%S")
-            except: s_dt = datetime.strptime(start, "%Y-%m-%d %H:%M")
-            
-            s_dt = s_dt.replace(second=0)
-            remind_val = remind if remind else 0
-            remind_dt = s_dt - timedelta(minutes=remind_val)
-            
-            if now_str == remind_dt.strftime("%Y-%m-%d %H:%M"):
-                st.toast(f"🔔 {name} ({loc or 'Online'})", icon="⏰")
-                db.mark_notified(eid)
-        except: continue
+# Feed nhắc nhở dùng chung cho mọi tab/phiên của server (mỗi lịch chỉ truy vấn DB 1 lần mỗi chu kỳ)
+# Nhắc đã báo được ghi vào log có số thứ tự, mỗi phiên chỉ lấy phần chưa xem -> tab nào đang mở cũng thấy toast
+FEED_INTERVAL = 15  # giây giữa 2 lần fragment hỏi feed
+FEED_LOG_SIZE = 100
+
+
+class ReminderFeed:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.seq = 0
+        self.log = {}  # calendar -> [(seq, text)]
+        self.checked = {}  # calendar -> lần truy vấn DB cuối
+        self.owner = lease_owner("streamlit")  # 1 feed cho cả server -> 1 lease mỗi lịch
+        self.leading = set()  # lịch đang giữ lease
+
+    def _publish(self, calendar, text):
+        self.seq += 1
+        entries = self.log.setdefault(calendar, [])
+        entries.append((self.seq, text))
+        del entries[:-FEED_LOG_SIZE]
 
-check_reminders()
+    # Truy vấn DB (tra index reminders(state, fire_at)) nếu lịch chưa được kiểm tra trong chu kỳ này
+    def _refresh(self, db, now):
+        last = self.checked.get(db.calendar)
+        if last and (now - last).total_seconds() < FEED_INTERVAL / 2: return
+        self.checked[db.calendar] = now
+        # Lịch đang do worker / app Tk phát nhắc -> chỉ gia hạn/chờ lease; mất lease thì lần nhận lại sẽ bù
+        if not db.acquire_lease(self.owner, now):
+            self.leading.discard(db.calendar)
+            return
+        # Lần đầu, vừa nhận lease hoặc lâu không ai mở trang -> gộp các nhắc đã lỡ vào 1 toast
+        if db.calendar not in self.leading or now - last > timedelta(seconds=2 * FEED_INTERVAL):
+            self.leading.add(db.calendar)
+            missed = db.catch_up_reminders(now)
+            if len(missed) > 1:
+                self._publish(db.calendar, summarize_missed(missed))
+            elif missed:
+                self._publish(db.calendar, f"{missed[0][1]} ({missed[0][2] or 'Online'})")
+        for rid, name, loc, remind, fire_at in db.get_due_reminders(now):
+            # Nhận nhắc trước khi đưa vào feed (không nhận được = nơi khác đã báo)
+            if db.claim_reminder(rid, fire_at):
+                self._publish(db.calendar, f"{name} ({loc or 'Online'})")
+        db.maybe_archive(now)
+
+    # Trả về (ds nhắc mới sau since, seq mới nhất)
+    def poll(self, db, since):
+        with self.lock:
+            self._refresh(db, datetime.now())
+            return [text for seq, text in self.log.get(db.calendar, []) if seq > since], self.seq
+
+
+@st.cache_resource
+def get_reminder_feed():
+    return ReminderFeed()
+
+feed = get_reminder_feed()
+# Tab mới mở không hiện lại các toast cũ
+if 'feed_seq' not in st.session_state:
+    st.session_state.feed_seq = feed.seq
+
+# Fragment tự chạy lại mỗi FEED_INTERVAL giây, chỉ phần này render lại (không rerun cả trang)
+@st.fragment(run_every=FEED_INTERVAL)
+def reminder_feed():
+    items, st.session_state.feed_seq = feed.poll(db, st.session_state.feed_seq)
+    for text in items:
+        st.toast(f"🔔 {text}", icon="⏰")
+    # Bảng sẽ cập nhật icon 🔔 ở lần tương tác kế tiếp
+    if items: st.session_state.data_version += 1
+
+reminder_feed()
 
 # ==========================================
 # 3. UI LAYOUT
@@ -150,77 +261,215 @@ st.title("🤖 Ứng dụng Quản lý Lịch trình AI")
 
 # --- SIDEBAR ---
 with st.sidebar:
+    new_calendar = st.text_input("👤 Lịch của", value=calendar_name).strip()
+    if new_calendar and new_calendar != calendar_name:
+        st.query_params["calendar"] = new_calendar
+        st.session_state.selected_id_from_table = None
+        st.rerun()
+    new_tz = st.text_input("🌐 Múi giờ", value=db.tz, help="VD: Asia/Ho_Chi_Minh, Europe/Berlin").strip()
+    if new_tz and new_tz != db.tz:
+        try:
+            db.set_timezone(new_tz)
+            st.rerun()
+        except ValueError as e:
+            st.error(str(e))
+
     st.header("📝 Thêm Sự Kiện")
     raw_text = st.text_area("Nhập câu lệnh:", height=100, 
                             placeholder="VD: Họp team tại P302 lúc 14h30 chiều mai...")
     
+    def add_parsed(result):
+        try:
+            dt = datetime.strptime(result['start_time'], "%Y-%m-%d %H:%M")
+            result['start_time'] = dt.strftime("%Y-%m-%d %H:%M:00")
+        except: pass
+
+        if not result['end_time'] and result['start_time']:
+             try:
+                s = datetime.strptime(result['start_time'], "%Y-%m-%d %H:%M:%S")
+                result['end_time'] = (s + timedelta(hours=1)).strftime("%Y-%m-%d %H:%M:%S")
+             except: pass
+
+        is_overlap, conflict = db.check_overlap(result['start_time'])
+        if is_overlap:
+            st.error(f"⚠️ Trùng lịch với: '{conflict}'")
+        else:
+            db.add_event(
+                result['event'], result['start_time'], result['end_time'], 
+                result['location'], result['reminder_minutes'], result.get('recurrence'), result.get('reminders')
+            )
+            st.session_state.parse_candidates = None
+            st.success(f"Đã thêm: {result['event']}")
+            st.session_state.data_version += 1
+            time.sleep(0.5)
+            st.rerun()
+
+    # Câu ghép: báo trùng nếu có, không thì thêm tất cả trong 1 transaction
+    def add_parsed_many(results):
+        conflicts = []
+        for r in results:
+            is_overlap, conflict = db.check_overlap(r['start_time'])
+            if is_overlap: conflicts.append(f"'{r['event']}' trùng với '{conflict}'")
+        if conflicts:
+            st.error("⚠️ " + "; ".join(conflicts))
+            return
+        db.add_events(results)
+        st.session_state.parse_candidates = None
+        st.success("Đã thêm: " + ", ".join(r['event'] for r in results))
+        st.session_state.data_version += 1
+        time.sleep(0.5)
+        st.rerun()
+
     if st.button("Phân Tích & Thêm", type="primary", width='stretch'):
         if raw_text.strip():
             with st.spinner("Đang xử lý..."):
-                result = scheduler.process(raw_text)
-                
-                try:
-                    dt = datetime.strptime(result['start_time'], "%Y-%m-%d %H:%M")
-                    result['start_time'] = dt.strftime("%Y-%m-%d %H:%M:00")
-                except: pass
-                
-                if not result['end_time'] and result['start_time']:
-                     try:
-                        s = datetime.strptime(result['start_time'], "%Y-%m-%d %H:%M:%S")
-                        result['end_time'] = (s + timedelta(hours=1)).strftime("%Y-%m-%d %H:%M:%S")
-                     except: pass
-
-                is_overlap, conflict = db.check_overlap(result['start_time'])
-                if is_overlap:
-                    st.error(f"⚠️ Trùng lịch với: '{conflict}'")
+                clauses = scheduler.split_clauses(raw_text, calendar=db.calendar)
+                if len(clauses) > 1:
+                    try:
+                        add_parsed_many(scheduler.process_many(clauses, tz=db.tz, calendar=db.calendar))
+                    except ValueError as e:
+                        st.error(f"⚠️ Không phân tích được: {e}")
                 else:
-                    db.add_event(
-                        result['event'], result['start_time'], result['end_time'], 
-                        result['location'], result['reminder_minutes']
-                    )
-                    st.success(f"Đã thêm: {result['event']}")
-                    st.session_state.data_version += 1
-                    time.sleep(0.5)
-                    st.rerun()
+                    # Top-k cách hiểu (NER 1 lần), chắc chắn thì thêm ngay, không thì cho chọn
+                    candidates = scheduler.candidates(raw_text, k=3, tz=db.tz, calendar=db.calendar)
+                    if len(candidates) == 1 or \
+                            candidates[0]['confidence'] - candidates[1]['confidence'] >= CONFIDENT_MARGIN:
+                        add_parsed(candidates[0])
+                    else:
+                        st.session_state.parse_candidates = candidates
 
-# --- TABS ---
-tab_list, tab_calendar = st.tabs(["📋 Danh Sách & Thao Tác", "📅 Xem Lịch"])
+    if st.session_state.get('parse_candidates'):
+        options = st.session_state.parse_candidates
+        choice = st.radio(
+            "Ý bạn là:", range(len(options)),
+            format_func=lambda i: f"{options[i]['event']} • {options[i]['start_time'][:16]}"
+                                  f"{' • ' + options[i]['location'] if options[i]['location'] else ''}"
+                                  f" ({options[i]['confidence']:.0%})")
+        if st.button("Thêm lựa chọn này", width='stretch'):
+            add_parsed(dict(options[choice]))
+
+    # --- TÌM GIỜ TRỐNG ---
+    st.divider()
+    st.header("🔍 Tìm Giờ Trống")
+    free_text = st.text_input("Câu hỏi:", placeholder="VD: tìm giờ trống 1 tiếng chiều mai")
+    if st.button("Tìm", width='stretch') and free_text.strip():
+        query = scheduler.parse_free_time_query(free_text, tz=db.tz, calendar=db.calendar)
+        slots = db.find_free_slots(query["range_start"], query["range_end"], query["duration"],
+                                   query["work_start"], query["work_end"])
+        if slots:
+            for s, e in slots:
+                st.write(f"🟢 {s:%d/%m %H:%M} - {e:%H:%M}")
+        else:
+            st.warning("Không còn khoảng trống phù hợp.")
 
-# Lấy dữ liệu mới nhất
-all_events = db.get_all_events()
-df = pd.DataFrame(all_events, columns=['ID', 'Sự Kiện', 'Bắt Đầu', 'Kết Thúc', 'Địa Điểm', 'Nhắc(p)', 'Notified'])
+# --- TABS ---
+tab_list, tab_calendar, tab_stats = st.tabs(["📋 Danh Sách & Thao Tác", "📅 Xem Lịch", "📊 Thống Kê"])
 
 # --- TAB 1: DANH SÁCH ---
+# Lọc/sắp/phân trang trên DB (keyset), trình duyệt chỉ nhận 1 trang; dòng chọn lưu theo ID nên giữ được khi dữ liệu đổi
 with tab_list:
-    if not df.empty:
+    search_query = st.text_input("🔎 Tìm kiếm", placeholder="VD: hop team, phong P302...").strip()
+    if search_query:
+        # Kết quả FTS xếp theo độ liên quan, thay cho danh sách theo trang
+        list_events = db.search(search_query, limit=200)
+        st.caption(f"Tìm thấy {len(list_events)} sự kiện")
+        table_view = ("search", search_query)
+    else:
+        with st.expander("🔧 Lọc & Sắp xếp"):
+            f1, f2 = st.columns(2)
+            date_range = f1.date_input("Ngày bắt đầu (từ - đến)", value=(), format="DD/MM/YYYY")
+            location_filter = f2.text_input("Địa điểm chứa").strip()
+            notified_filter = f1.selectbox("Trạng thái nhắc", list(LIST_NOTIFIED))
+            sort_label = f2.selectbox("Sắp xếp", list(LIST_SORTS))
+            page_size = f1.selectbox("Số dòng mỗi trang", LIST_PAGE_SIZES, index=1)
+        sort, descending = LIST_SORTS[sort_label]
+        filters = {
+            "sort": sort, "descending": descending, "page_size": page_size,
+            "date_from": datetime.combine(date_range[0], datetime.min.time()) if date_range else None,
+            "date_to": datetime.combine(date_range[-1], datetime.min.time()) + timedelta(days=1)
+            if date_range else None,
+            "location": location_filter or None, "notified": LIST_NOTIFIED[notified_filter],
+        }
+        # Khóa bắt đầu của các trang đã đi qua (lùi trang không cần OFFSET); đổi bộ lọc -> về trang đầu
+        filter_key = repr(sorted(filters.items()))
+        if st.session_state.get('list_filter') != filter_key:
+            st.session_state.list_filter = filter_key
+            st.session_state.list_pages = [None]
+        list_pages = st.session_state.list_pages
+        list_events, next_key = db.list_page(list_pages[-1], **filters)
+        if not list_events and len(list_pages) > 1:
+            # Trang cuối vừa bị xóa hết -> lùi 1 trang
+            list_pages.pop()
+            st.rerun()
+
+        def next_page(key):
+            st.session_state.list_pages.append(key)
+
+        def prev_page():
+            st.session_state.list_pages.pop()
+
+        p1, p2, p3 = st.columns([1, 2, 1])
+        p1.button("◀ Trước", width='stretch', disabled=len(list_pages) == 1, on_click=prev_page)
+        p2.caption(f"Trang {len(list_pages)}")
+        p3.button("Sau ▶", width='stretch', disabled=next_key is None, on_click=next_page, args=(next_key,))
+        table_view = (filter_key, len(list_pages))
+    # Xóa/sửa nhầm -> hoàn tác theo nhật ký
+    def undo_handler():
+        st.toast("↩️ Đã hoàn tác" if db.undo() else "Không còn gì để hoàn tác")
+        st.session_state.selected_id_from_table = None
+        st.session_state.data_version += 1
+
+    def redo_handler():
+        st.toast("↪️ Đã làm lại" if db.redo() else "Không còn gì để làm lại")
+        st.session_state.data_version += 1
+
+    u1, u2, _ = st.columns([1, 1, 4])
+    u1.button("↩️ Hoàn tác", width='stretch', on_click=undo_handler)
+    u2.button("↪️ Làm lại", width='stretch', on_click=redo_handler)
+
+    if list_events:
         st.caption("👇 Click vào dòng để hiện menu Xóa/Sửa")
         
-        event_selection = st.dataframe(
-            df.drop(columns=['Notified']),
+        # Dữ liệu dạng cột, dựng 1 lượt từ ds Event
+        table = {
+            "ID": [e.id for e in list_events],
+            "Sự Kiện": [e.event for e in list_events],
+            "Bắt Đầu": [e.start_time for e in list_events],
+            "Kết Thúc": [e.end_time for e in list_events],
+            "Địa Điểm": [e.location for e in list_events],
+            "Nhắc(p)": [format_reminder_list(e.reminders) for e in list_events],
+            "Lặp Lại": [e.recurrence for e in list_events],
+        }
+        # Key chỉ đổi khi đổi trang/bộ lọc (thêm/xóa dòng không ép vẽ lại bảng)
+        # Dòng chọn -> ID theo ds ID của trang đang hiển thị lúc click
+        table_key = f"data_table_{abs(hash(table_view))}"
+        st.session_state.list_ids = table["ID"]
+
+        def select_handler():
+            rows = st.session_state[table_key].selection.rows
+            if rows: st.session_state.selected_id_from_table = st.session_state.list_ids[rows[0]]
+
+        st.dataframe(
+            table,
             width='stretch',
             hide_index=True,
-            on_select="rerun",
+            on_select=select_handler,
             selection_mode="single-row",
-            key=f"data_table_{len(df)}", # Key dynamic để ép vẽ lại khi số lượng đổi
+            key=table_key,
             column_config={
                 "ID": st.column_config.NumberColumn(width="small"),
                 "Sự Kiện": st.column_config.TextColumn(width="medium"),
             }
         )
         
-        selected_rows = event_selection.selection.rows
-        if selected_rows:
-            st.session_state.selected_id_from_table = df.iloc[selected_rows[0]]['ID']
-        
         # --- ACTION PANEL ---
         if st.session_state.selected_id_from_table:
             curr_id = st.session_state.selected_id_from_table
-            check_exists = df[df['ID'] == curr_id]
+            curr = db.get_event(curr_id)
             
-            if not check_exists.empty:
-                curr_row = check_exists.iloc[0]
+            if curr:
                 st.divider()
-                st.info(f"Đang thao tác: **{curr_row['Sự Kiện']}** (ID: {curr_id})")
+                st.info(f"Đang thao tác: **{curr.event}** (ID: {curr_id})")
                 
                 c1, c2 = st.columns(2)
                 
@@ -232,27 +481,27 @@ with tab_list:
                     st.session_state.selected_id_from_table = None
                     st.session_state.data_version += 1
                     # 3. Thông báo
-                    st.toast("✅ Đã xóa thành công!")
+                    st.toast("✅ Đã xóa thành công! Bấm ↩️ Hoàn tác để khôi phục")
                     
                 c1.button("🗑 Xóa Sự Kiện", type="primary", width='stretch', on_click=delete_handler)
                 
                 # --- FORM SỬA ---
                 with st.expander("✏️ Chỉnh Sửa", expanded=True):
                     with st.form("edit_form"):
-                        new_name = st.text_input("Tên", value=curr_row['Sự Kiện'])
+                        new_name = st.text_input("Tên", value=curr.event)
                         
-                        try: dt_s = pd.to_datetime(curr_row['Bắt Đầu'])
-                        except: dt_s = datetime.now()
+                        dt_s = curr.start_dt or datetime.now()
                         d_s = st.date_input("Ngày bắt đầu", value=dt_s.date())
                         t_s = st.time_input("Giờ bắt đầu", value=dt_s.time())
 
-                        try: dt_e = pd.to_datetime(curr_row['Kết Thúc'])
-                        except: dt_e = dt_s
+                        dt_e = curr.end_dt or dt_s
                         d_e = st.date_input("Ngày kết thúc", value=dt_e.date())
                         t_e = st.time_input("Giờ kết thúc", value=dt_e.time())
                         
-                        new_loc = st.text_input("Địa điểm", value=curr_row['Địa Điểm'] or "")
-                        new_remind = st.number_input("Nhắc trước (p)", value=int(curr_row['Nhắc(p)']))
+                        new_loc = st.text_input("Địa điểm", value=curr.location or "")
+                        new_remind = st.text_input("Nhắc trước (phút, VD: 1440, 30)",
+                                                   value=format_reminder_list(curr.reminders))
+                        new_recur = st.text_input("Lặp lại (VD: FREQ=WEEKLY;BYDAY=MO)", value=curr.recurrence or "")
 
                         if st.form_submit_button("Lưu Thay Đổi"):
                             str_s = f"{d_s} {t_s}"
@@ -260,11 +509,17 @@ with tab_list:
                             if len(str_s.split(":"))==2: str_s += ":00"
                             if len(str_e.split(":"))==2: str_e += ":00"
                             
-                            db.update_event(curr_id, new_name, str_s, str_e, new_loc, new_remind)
-                            st.success("Đã cập nhật!")
-                            st.session_state.data_version += 1
-                            time.sleep(0.5)
-                            st.rerun()
+                            try:
+                                reminders = parse_reminder_list(new_remind)
+                            except ValueError as e:
+                                st.error(str(e))
+                            else:
+                                db.update_event(curr_id, new_name, str_s, str_e, new_loc, reminders,
+                                                new_recur.strip() or None)
+                                st.success("Đã cập nhật!")
+                                st.session_state.data_version += 1
+                                time.sleep(0.5)
+                                st.rerun()
             else:
                 st.session_state.selected_id_from_table = None
                 st.rerun()
@@ -273,29 +528,35 @@ with tab_list:
 
 # --- TAB 2: CALENDAR ---
 with tab_calendar:
-    if not df.empty:
+    all_events = db.get_all_events()
+    if all_events:
         calendar_events = []
-        for _, row in df.iterrows():
-            if not row['Bắt Đầu']: continue
-            try:
-                s_dt = pd.to_datetime(row['Bắt Đầu'])
-                s_iso = s_dt.isoformat()
-                
-                e_iso = s_iso
-                if row['Kết Thúc']:
-                    e_dt = pd.to_datetime(row['Kết Thúc'])
-                    if not pd.isna(e_dt): e_iso = e_dt.isoformat()
-                
-                color = "#FF6C6C" if row['Nhắc(p)'] > 0 else "#3788d8"
-                
-                calendar_events.append({
-                    "title": row['Sự Kiện'],
-                    "start": s_iso,
-                    "end": e_iso,
-                    "backgroundColor": color,
-                    "borderColor": color
-                })
-            except: continue
+        for ev in all_events:
+            if ev.start is None or ev.recurrence: continue  # sự kiện lặp sinh riêng bên dưới
+            s_iso = ev.start_dt.isoformat()
+            e_iso = ev.end_dt.isoformat() if ev.end is not None else s_iso
+            color = "#FF6C6C" if ev.reminder_minutes > 0 else "#3788d8"
+            
+            calendar_events.append({
+                "title": ev.event,
+                "start": s_iso,
+                "end": e_iso,
+                "backgroundColor": color,
+                "borderColor": color
+            })
+
+        # Sự kiện lặp: chỉ sinh lần lặp trong khoảng hiển thị
+        today = datetime.combine(datetime.now().date(), datetime.min.time())
+        for _, name, s_iso, e_iso, _, remind, rule in db.get_occurrences(today - timedelta(days=90), today + timedelta(days=365)):
+            if not rule: continue
+            color = "#FF6C6C" if remind and remind > 0 else "#3788d8"
+            calendar_events.append({
+                "title": f"🔁 {name}",
+                "start": s_iso.replace(" ", "T"),
+                "end": e_iso.replace(" ", "T"),
+                "backgroundColor": color,
+                "borderColor": color
+            })
 
         mode = st.radio("Chế độ xem:", ["Tháng", "Tuần", "Ngày", "Danh sách"], horizontal=True)
         view_map = {"Tháng": "dayGridMonth", "Tuần": "timeGridWeek", "Ngày": "timeGridDay", "Danh sách": "listWeek"}
@@ -321,21 +582,135 @@ with tab_calendar:
     else:
         st.info("Chưa có dữ liệu lịch.")
 
+# --- TAB 3: THỐNG KÊ ---
+# Tính bằng NumPy, cache theo phiên bản nhật ký của lịch -> rerun không đọc lại DB nếu dữ liệu không đổi
+with tab_stats:
+    import altair as alt
+    from analytics import schedule_stats, series_window, WEEKDAYS, RECURRING_WINDOW
+    stats_today = local_now(db.tz).date()
+    with st.spinner("Đang tính thống kê..."):
+        with db.get_connection() as conn:
+            stats = schedule_stats(conn, db.calendar, stats_today)
+    if stats["events"]:
+        m1, m2, m3, m4, m5 = st.columns(5)
+        m1.metric("Sự kiện 1 lần", f"{stats['one_off_events']:,}")
+        m2.metric(f"Lần lặp (±{RECURRING_WINDOW.days} ngày)", f"{stats['occurrences']:,}")
+        m3.metric("Cặp trùng giờ", f"{stats['overlap_pairs']:,}")
+        m4.metric("Sự kiện bị chồng", f"{stats['overlapping_events']:,}")
+        m5.metric("Tối đa cùng lúc", stats['max_concurrent'])
+
+        st.subheader("🔥 Giờ bận trong tuần")
+        heat = [{"Thứ": WEEKDAYS[d], "Giờ": h, "Số sự kiện": int(stats["heatmap"][d, h])}
+                for d in range(7) for h in range(24)]
+        st.altair_chart(alt.Chart(alt.Data(values=heat)).mark_rect().encode(
+            x=alt.X("Giờ:O"), y=alt.Y("Thứ:O", sort=WEEKDAYS),
+            color=alt.Color("Số sự kiện:Q", scale=alt.Scale(scheme="orangered")),
+            tooltip=["Thứ:O", "Giờ:O", "Số sự kiện:Q"]))
+        st.caption("Cao điểm: " + ", ".join(f"{d} {h}h ({n})" for d, h, n in stats["busiest"]))
+
+        c1, c2 = st.columns(2)
+        with c1:
+            st.subheader("📆 Tỉ lệ bận mỗi ngày")
+            occupancy = series_window(stats["first_day"], stats["occupancy"], stats_today - timedelta(days=30),
+                                      stats_today + timedelta(days=31))
+            st.line_chart({"Ngày": [d for d, _ in occupancy], "Bận (%)": [v * 100 for _, v in occupancy]},
+                          x="Ngày", y="Bận (%)")
+        with c2:
+            st.subheader("📈 Số sự kiện mỗi tuần")
+            weekly = series_window(stats["first_week"], stats["weekly"], stats_today - timedelta(weeks=26),
+                                   stats_today + timedelta(weeks=9), step_days=7)
+            st.bar_chart({"Tuần": [d for d, _ in weekly], "Sự kiện": [int(v) for _, v in weekly]},
+                         x="Tuần", y="Sự kiện")
+
+        c1, c2 = st.columns(2)
+        with c1:
+            st.subheader("⏰ Nhắc trước bao lâu")
+            lead = [{"Nhắc trước": f"{m} phút", "Số mốc": n} for m, n in stats["lead_times"]]
+            st.altair_chart(alt.Chart(alt.Data(values=lead)).mark_bar().encode(
+                x=alt.X("Nhắc trước:N", sort=None), y="Số mốc:Q", tooltip=["Nhắc trước:N", "Số mốc:Q"]))
+        with c2:
+            st.subheader("📍 Địa điểm hay đến")
+            st.dataframe({"Địa Điểm": [l for l, _ in stats["top_locations"]],
+                          "Số Sự Kiện": [n for _, n in stats["top_locations"]]}, hide_index=True, width='stretch')
+    else:
+        st.info("Chưa có dữ liệu thống kê.")
+
 # ==========================================
-# 4. DEBUG DASHBOARD (ADMIN)
+# 4. XUẤT / NHẬP LỊCH
+# ==========================================
+with st.sidebar:
+    st.divider()
+    with st.expander("📤 Xuất / Nhập Lịch"):
+        from calendar_io import export_ics, import_ics, export_parquet, import_parquet, export_arrow, import_arrow
+        formats = {"iCalendar (.ics)": ".ics", "Parquet": ".parquet", "Arrow": ".arrow"}
+        fmt = st.selectbox("Định dạng", list(formats))
+        # Ghi theo trang ra file tạm, tải về từ file (không giữ cả bảng trong RAM)
+        if st.button("Chuẩn bị file xuất", width='stretch'):
+            path = os.path.join(tempfile.gettempdir(), f"schedulervi_{db.calendar}{formats[fmt]}")
+            try:
+                with db.get_connection() as conn:
+                    if formats[fmt] == ".ics":
+                        with open(path, "w", encoding="utf-8", newline="") as fp:
+                            n = export_ics(conn, fp, db.calendar)
+                    elif formats[fmt] == ".parquet":
+                        n = export_parquet(conn, path, db.calendar)
+                    else:
+                        n = export_arrow(conn, path, db.calendar)
+                st.session_state.export_file = path
+                st.success(f"Đã xuất {n} sự kiện")
+            except ImportError as e:
+                st.error(str(e))
+        export_file = st.session_state.get("export_file")
+        if export_file and os.path.exists(export_file):
+            with open(export_file, "rb") as fp:
+                st.download_button("📥 Tải file xuất", fp, os.path.basename(export_file), width='stretch')
+
+        uploaded = st.file_uploader("Nhập từ file", type=["ics", "parquet", "arrow"])
+        if uploaded and st.button("Nhập vào lịch", width='stretch'):
+            ext = os.path.splitext(uploaded.name)[1].lower()
+            try:
+                with db.get_connection() as conn:
+                    if ext == ".ics":
+                        n = import_ics(conn, io.TextIOWrapper(uploaded, encoding="utf-8"), db.calendar)
+                    else:
+                        # Parquet/Arrow cần đường dẫn file để đọc theo batch
+                        with tempfile.NamedTemporaryFile(suffix=ext, delete=False) as tmp:
+                            tmp.write(uploaded.getbuffer())
+                        try:
+                            importer = import_parquet if ext == ".parquet" else import_arrow
+                            n = importer(conn, tmp.name, db.calendar)
+                        finally:
+                            os.remove(tmp.name)
+                st.success(f"Đã nhập {n} sự kiện")
+                st.session_state.data_version += 1
+            except ImportError as e:
+                st.error(str(e))
+
+# ==========================================
+# 5. DEBUG DASHBOARD (ADMIN)
 # ==========================================
 with st.sidebar:
     st.divider()
     with st.expander("🛠 Debug Tools"):
-        import os
-        st.write(f"DB Path: `{os.path.abspath('scheduler.db')}`")
+        st.write(f"DB Path: `{os.path.abspath(db.db_name)}`")
         if st.button("Reload App"):
             st.rerun()
-        
-        # Download DB
-        try:
-            with open("scheduler.db", "rb") as fp:
+
+        # Download DB: chụp bằng SQLite backup API ra file tạm (worker / UI vẫn ghi được), tải về từ bản chụp
+        # Chỉ chụp khi bấm nút -> các lần rerun khác không đọc file DB
+        if st.button("📸 Chụp Database"):
+            bar = st.progress(0.0, "Đang sao lưu...")
+            old = st.session_state.get("db_snapshot")
+            st.session_state.db_snapshot = export_snapshot(
+                db.db_name, progress=lambda done, total: bar.progress(done / total, f"Đang sao lưu {done}/{total} trang"))
+            st.session_state.db_snapshot_at = local_now(db.tz)
+            bar.empty()
+            if old and os.path.exists(old): os.remove(old)
+        snapshot = st.session_state.get("db_snapshot")
+        if snapshot and os.path.exists(snapshot):
+            with open(snapshot, "rb") as fp:
                 st.download_button("📥 Tải Database", fp, "scheduler_debug.db")
-        except: pass
+            st.caption(f"Bản chụp lúc {st.session_state.db_snapshot_at:%H:%M:%S} "
+                       f"({os.path.getsize(snapshot) / 2 ** 20:.1f} MB)")
 
 
@@ -0,0 +1,19 @@
+import os
+import sys
+import pytest
+
+# Module nằm phẳng ở thư mục gốc repo
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import connect, init_schema, set_calendar_tz, DEFAULT_CALENDAR  # noqa: E402
+
+CALENDAR_TZ = "Asia/Ho_Chi_Minh"  # UTC+7, không có DST
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = connect(str(tmp_path / "scheduler.db"))
+    init_schema(conn)
+    set_calendar_tz(conn, DEFAULT_CALENDAR, CALENDAR_TZ)
+    yield conn
+    conn.close()
@@ -0,0 +1,69 @@
+import io
+import pytest
+from calendar_io import export_ics, import_ics, iter_ics_records
+from storage import insert_events, fetch_events, set_calendar_tz, DEFAULT_CALENDAR
+from conftest import CALENDAR_TZ
+
+EVENTS = [
+    {"event": "Họp team, tuần; \\ 1", "start_time": "2030-01-07 09:00:00", "end_time": "2030-01-07 10:30:00",
+     "location": "P302, tầng 3", "reminders": [1440, 30], "recurrence": "FREQ=WEEKLY;BYDAY=MO,WE"},
+    {"event": "Khám răng", "start_time": "2030-02-01 14:00:00", "end_time": "2030-02-01 15:00:00",
+     "location": None, "reminders": [0], "recurrence": None},
+]
+
+
+def summary(conn, calendar):
+    return sorted((e.event, e.start_time, e.end_time, e.location, e.reminders, e.recurrence)
+                  for e in fetch_events(conn, calendar))
+
+
+def calendar_tz_column(conn, calendar):
+    return [tz for tz, in conn.execute("SELECT tz FROM events WHERE calendar = ? ORDER BY id", (calendar,))]
+
+
+@pytest.fixture
+def filled(conn):
+    insert_events(conn, EVENTS)
+    return conn
+
+
+def test_ics_round_trip_other_timezone(filled):
+    buf = io.StringIO()
+    assert export_ics(filled, buf) == 2
+    set_calendar_tz(filled, "berlin", "Europe/Berlin")
+    buf.seek(0)
+    assert import_ics(filled, buf, "berlin") == 2
+    # Giờ tường giữ nguyên, múi giờ gốc lưu vào cột tz
+    assert summary(filled, "berlin") == summary(filled, DEFAULT_CALENDAR)
+    assert calendar_tz_column(filled, "berlin") == [CALENDAR_TZ, CALENDAR_TZ]
+
+
+def test_ics_round_trip_same_timezone(filled):
+    buf = io.StringIO()
+    export_ics(filled, buf)
+    set_calendar_tz(filled, "copy", CALENDAR_TZ)
+    buf.seek(0)
+    import_ics(filled, buf, "copy")
+    assert summary(filled, "copy") == summary(filled, DEFAULT_CALENDAR)
+    assert calendar_tz_column(filled, "copy") == [None, None]
+
+
+def test_ics_utc_and_unknown_tzid():
+    ics = io.StringIO("\r\n".join([
+        "BEGIN:VCALENDAR", "BEGIN:VEVENT", "SUMMARY:utc", "DTSTART:20300107T020000Z", "END:VEVENT",
+        "BEGIN:VEVENT", "SUMMARY:outlook", 'DTSTART;TZID="SE Asia Standard Time":20300107T090000', "END:VEVENT",
+        "END:VCALENDAR", ""]))
+    assert [(r[0], r[1], r[-1]) for r in iter_ics_records(ics, CALENDAR_TZ)] == [
+        ("utc", "2030-01-07 09:00:00", None), ("outlook", "2030-01-07 09:00:00", None)]
+
+
+@pytest.mark.parametrize("fmt", ["parquet", "arrow"])
+def test_arrow_round_trip(filled, tmp_path, fmt):
+    pytest.importorskip("pyarrow")
+    import calendar_io
+    path = str(tmp_path / f"lich.{fmt}")
+    assert getattr(calendar_io, f"export_{fmt}")(filled, path) == 2
+    set_calendar_tz(filled, "berlin", "Europe/Berlin")
+    assert getattr(calendar_io, f"import_{fmt}")(filled, path, "berlin") == 2
+    assert summary(filled, "berlin") == summary(filled, DEFAULT_CALENDAR)
+    assert calendar_tz_column(filled, "berlin") == [CALENDAR_TZ, CALENDAR_TZ]
@@ -0,0 +1,74 @@
+from storage import insert_events, update_event, get_event, undo, redo, snapshot, restore_snapshot, fetch_events, \
+    journal_muted, DEFAULT_CALENDAR
+
+
+def add(conn, name="họp", reminders=(30,)):
+    return insert_events(conn, [{"event": name, "start_time": "2030-01-07 09:00:00", "reminders": list(reminders)}])[0]
+
+
+def edit(conn, event_id, name, reminders):
+    with conn:
+        update_event(conn, DEFAULT_CALENDAR, event_id, name, "2030-01-07 10:00:00", "2030-01-07 11:00:00", "P302",
+                     reminders)
+
+
+def test_undo_redo_insert(conn):
+    eid = add(conn, reminders=[1440, 30])
+    assert undo(conn)["op"] == "I"
+    assert get_event(conn, eid) is None
+    assert redo(conn)["op"] == "I"
+    assert get_event(conn, eid).reminders == [1440, 30]
+    assert redo(conn) is None
+
+
+def test_undo_redo_update_with_reminders(conn):
+    eid = add(conn)
+    edit(conn, eid, "họp team", [60, 10])
+    ev = get_event(conn, eid)
+    assert (ev.event, ev.start_time, ev.location, ev.reminders) == ("họp team", "2030-01-07 10:00:00", "P302", [60, 10])
+    undo(conn)
+    ev = get_event(conn, eid)
+    assert (ev.event, ev.start_time, ev.location, ev.reminders) == ("họp", "2030-01-07 09:00:00", None, [30])
+    redo(conn)
+    assert get_event(conn, eid).reminders == [60, 10]
+
+
+def test_reminder_only_edit_is_one_step(conn):
+    eid = add(conn, reminders=[30])
+    edit(conn, eid, "họp", [30, 5])
+    edit(conn, eid, "họp", [30])
+    undo(conn)
+    assert get_event(conn, eid).reminders == [30, 5]
+
+
+def test_undo_delete_restores_reminders(conn):
+    eid = add(conn, reminders=[1440, 30])
+    with conn:
+        conn.execute("DELETE FROM events WHERE id = ?", (eid,))
+    assert undo(conn)["op"] == "D"
+    assert get_event(conn, eid).reminders == [1440, 30]
+
+
+def test_new_change_clears_redo(conn):
+    eid = add(conn)
+    edit(conn, eid, "a", [30])
+    undo(conn)
+    edit(conn, eid, "b", [30])
+    assert redo(conn) is None
+    assert get_event(conn, eid).event == "b"
+
+
+def test_muted_writes_are_not_journalled(conn):
+    with conn, journal_muted(conn):
+        conn.execute("INSERT INTO events (event, start_time) VALUES ('nhập', '2030-01-07 09:00:00')")
+    assert undo(conn) is None
+    assert conn.execute("SELECT COUNT(*) FROM journal_mute").fetchone()[0] == 0
+
+
+def test_restore_snapshot(conn):
+    keep = add(conn, "giữ", [1440, 30])
+    snapshot(conn)
+    edit(conn, keep, "đổi", [5])
+    add(conn, "mới")
+    assert restore_snapshot(conn)
+    assert [(e.event, e.reminders) for e in fetch_events(conn)] == [("giữ", [1440, 30])]
@@ -0,0 +1,53 @@
+from datetime import datetime, timedelta
+import pytest
+from recurrence import iter_occurrences, parse_rule, format_rule
+
+
+def days(*items):
+    return [datetime(*d) for d in items]
+
+
+def test_daily_window_skips_to_window_start():
+    occ = list(iter_occurrences(datetime(2026, 1, 1, 9), "FREQ=DAILY", datetime(2026, 1, 10), datetime(2026, 1, 13)))
+    assert occ == days((2026, 1, 10, 9), (2026, 1, 11, 9), (2026, 1, 12, 9))
+
+
+def test_weekly_byday():
+    # 01/01/2026 là thứ 5 -> lần đầu là thứ 2 tuần sau
+    occ = list(iter_occurrences(datetime(2026, 1, 1, 8), "FREQ=WEEKLY;BYDAY=MO,WE", datetime(2026, 1, 1),
+                                datetime(2026, 1, 13)))
+    assert occ == days((2026, 1, 5, 8), (2026, 1, 7, 8), (2026, 1, 12, 8))
+
+
+def test_count_and_until_bound_infinite_rules():
+    assert list(iter_occurrences(datetime(2026, 1, 1, 9), "FREQ=DAILY;COUNT=3")) == \
+        days((2026, 1, 1, 9), (2026, 1, 2, 9), (2026, 1, 3, 9))
+    assert list(iter_occurrences(datetime(2026, 1, 1, 9), "FREQ=DAILY;INTERVAL=2;UNTIL=20260105")) == \
+        days((2026, 1, 1, 9), (2026, 1, 3, 9), (2026, 1, 5, 9))
+    with pytest.raises(ValueError):
+        list(iter_occurrences(datetime(2026, 1, 1, 9), "FREQ=DAILY"))
+
+
+def test_monthly_and_yearly_skip_missing_days():
+    assert list(iter_occurrences(datetime(2026, 1, 31), "FREQ=MONTHLY", None, datetime(2026, 6, 1))) == \
+        days((2026, 1, 31), (2026, 3, 31), (2026, 5, 31))
+    assert list(iter_occurrences(datetime(2024, 2, 29), "FREQ=YEARLY", datetime(2025, 1, 1), datetime(2033, 1, 1))) == \
+        days((2028, 2, 29), (2032, 2, 29))
+
+
+def test_duration_keeps_occurrence_overlapping_window_start():
+    occ = list(iter_occurrences(datetime(2026, 1, 1, 23), "FREQ=DAILY", datetime(2026, 1, 5), datetime(2026, 1, 6),
+                                duration=timedelta(hours=2)))
+    assert occ == days((2026, 1, 4, 23), (2026, 1, 5, 23))
+
+
+def test_one_off_event_and_invalid_rule():
+    start = datetime(2026, 1, 2, 9)
+    assert list(iter_occurrences(start, None, datetime(2026, 1, 1), datetime(2026, 1, 3))) == [start]
+    assert list(iter_occurrences(start, "FREQ=HOURLY", datetime(2026, 1, 3), datetime(2026, 1, 4))) == []
+
+
+def test_format_rule_round_trip():
+    rule = format_rule("WEEKLY", 2, [2, 0], count=5)
+    assert rule == "FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,WE;COUNT=5"
+    assert parse_rule(rule) == {"freq": "WEEKLY", "interval": 2, "byday": [0, 2], "count": 5, "until": None}
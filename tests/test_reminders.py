@@ -0,0 +1,69 @@
+import sqlite3
+from datetime import datetime, timedelta, timezone
+from storage import insert_events, due_reminders, claim_reminder, catch_up_reminders, get_event, sync_reminders, \
+    journal_since, NOTIFY_SENT, NOTIFY_EXPIRED
+from timezones import to_utc_epoch
+from conftest import CALENDAR_TZ
+
+START = datetime(2030, 1, 7, 9, 0)  # thứ 2
+
+
+def add(conn, **fields):
+    record = {"event": "họp", "start_time": START.strftime("%Y-%m-%d %H:%M:%S"), **fields}
+    return insert_events(conn, [record])[0]
+
+
+def fire_at(start, minutes):
+    return to_utc_epoch(start - timedelta(minutes=minutes), CALENDAR_TZ)
+
+
+def at(epoch):
+    return datetime.fromtimestamp(epoch, timezone.utc)
+
+
+def reminder_rows(conn, event_id):
+    return conn.execute("SELECT minutes, fire_at, state FROM reminders WHERE event_id = ? ORDER BY minutes DESC",
+                        (event_id,)).fetchall()
+
+
+def test_every_offset_fires_once(conn):
+    eid = add(conn, reminders=[1440, 30])
+    assert get_event(conn, eid).reminders == [1440, 30]
+    for minutes in (1440, 30):
+        due = due_reminders(conn, at(fire_at(START, minutes)))
+        assert [(r[1], r[3]) for r in due] == [("họp", minutes)]
+        rid, fire = due[0][0], due[0][4]
+        assert claim_reminder(conn, rid, fire)
+        assert not claim_reminder(conn, rid, fire)  # tiến trình thứ 2 không nhận được
+    assert [state for _, _, state in reminder_rows(conn, eid)] == [NOTIFY_SENT, NOTIFY_SENT]
+    assert get_event(conn, eid).is_notified == NOTIFY_SENT
+
+
+def test_recurring_reminder_advances_to_next_occurrence(conn):
+    eid = add(conn, reminder_minutes=15, recurrence="FREQ=WEEKLY;BYDAY=MO,WE")
+    first = fire_at(START, 15)
+    (rid, _, _, _, fire), = due_reminders(conn, at(first))
+    assert fire == first
+    assert claim_reminder(conn, rid, fire)
+    assert reminder_rows(conn, eid) == [(15, fire_at(START + timedelta(days=2), 15), 0)]
+
+
+def test_catch_up_reports_recent_and_expires_old(conn):
+    recent = add(conn, reminder_minutes=0)
+    old = insert_events(conn, [{"event": "cũ", "start_time": "2030-01-07 05:00:00"}])[0]
+    now = at(fire_at(START, 0) + 30 * 60)
+    missed, expired = catch_up_reminders(conn, now)
+    assert [r[1] for r in missed] == ["họp"]
+    assert expired == 1
+    assert reminder_rows(conn, old)[0][2] == NOTIFY_EXPIRED
+    assert reminder_rows(conn, recent)[0][2] == 0
+
+
+def test_plain_sqlite_connection_can_write(conn, tmp_path):
+    raw = sqlite3.connect(str(tmp_path / "scheduler.db"))
+    raw.execute("INSERT INTO events (event, start_time, reminder_minutes) VALUES ('raw', '2030-01-07 09:00:00', 10)")
+    raw.commit()
+    raw.close()
+    assert sync_reminders(conn) == 1
+    assert [r[1] for r in due_reminders(conn, at(fire_at(START, 10)))] == ["raw"]
+    assert [op for _, _, op, _ in journal_since(conn)] == ["I"]
@@ -0,0 +1,42 @@
+# @title MÚI GIỜ
+# Giờ trong DB là giờ địa phương (wall-clock) theo múi giờ của event/lịch
+# Giờ nhắc được đổi sang UTC epoch 1 lần khi ghi, vòng quét chỉ so sánh số nguyên
+import os
+from datetime import datetime, timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+DEFAULT_TZ = os.environ.get("SCHEDULER_TZ", "Asia/Ho_Chi_Minh")
+
+
+@lru_cache(maxsize=64)
+def get_zone(name=None):
+    try:
+        return ZoneInfo(name or DEFAULT_TZ)
+    except (ZoneInfoNotFoundError, ValueError):
+        return ZoneInfo(DEFAULT_TZ)
+
+
+def is_valid_tz(name):
+    try:
+        ZoneInfo(name)
+        return True
+    except (ZoneInfoNotFoundError, ValueError):
+        return False
+
+
+# Giờ hiện tại theo múi giờ của user (naive, cùng dạng với giờ lưu trong DB)
+def local_now(tz=None):
+    return datetime.now(get_zone(tz)).replace(tzinfo=None)
+
+
+# Giờ địa phương (naive) -> UTC epoch
+# zoneinfo xử lý DST: giờ lặp lại lấy lần đầu (fold=0), giờ bị nhảy qua tính theo offset trước khi đổi
+def to_utc_epoch(local_dt, tz=None):
+    if local_dt.tzinfo is None:
+        local_dt = local_dt.replace(tzinfo=get_zone(tz))
+    return int(local_dt.timestamp())
+
+
+def from_utc_epoch(epoch, tz=None):
+    return datetime.fromtimestamp(epoch, timezone.utc).astimezone(get_zone(tz)).replace(tzinfo=None)
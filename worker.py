@@ -1,62 +1,129 @@
 ﻿import time
-import sqlite3
+import zlib
+import argparse
 from datetime import datetime, timedelta
-from plyer import notification  # Thư viện bắn thông báo Windows/Mac/Linux
+from multiprocessing import Process
+from storage import connect, init_schema, due_reminders, claim_reminder, claim_reminders, list_calendars, \
+    catch_up_reminders, summarize_missed, lease_owner, acquire_lease, release_leases, maybe_archive, DEFAULT_CALENDAR
+from backup import snapshot_if_changed
 
+CHECK_INTERVAL = timedelta(seconds=20)
 
-def check_reminders():
-    print("Worker: Đang chạy ngầm tìm lịch...")
-    # Kết nối DB riêng (Vì worker là tiến trình khác)
-    conn = sqlite3.connect("scheduler.db")
-    cursor = conn.cursor()
 
-    while True:
-        try:
-            now_str = datetime.now().strftime("%Y-%m-%d %H:%M")
+# Lịch thuộc shard nào (hash ổn định giữa các tiến trình)
+def in_shard(calendar, shard, shards):
+    return zlib.crc32(calendar.encode("utf-8")) % shards == shard
+
+
+def notify(title, msg):
+    from plyer import notification  # Thư viện bắn thông báo Windows/Mac/Linux (nạp khi cần, chạy benchmark không cần)
+    notification.notify(
+        title=title,
+        message=msg,
+        app_icon=None,  # Bạn có thể để đường dẫn file .ico
+        timeout=10,  # Hiện trong 10 giây
+    )
+
 
-            # Lấy các sự kiện chưa báo
-            cursor.execute("SELECT id, event, start_time, location, reminder_minutes FROM events WHERE is_notified = 0")
-            events = cursor.fetchall()
+# 1 vòng quét ở thời điểm `now`, trả về số thông báo đã gửi
+# owner: chỉ quét lịch giữ được lease, `leading` = các lịch đang giữ (vừa nhận lease -> bù nhắc lỡ trong lúc chuyển giao)
+def run_tick(conn, now, shard=0, shards=1, notifier=notify, catch_up=False, owner=None, leading=None):
+    sent = 0
+    # Mỗi tiến trình chỉ quét các lịch thuộc shard của mình
+    for calendar in list_calendars(conn):
+        if not in_shard(calendar, shard, shards): continue
+        catch_up_calendar = catch_up
+        # Lịch do tiến trình khác (app, Streamlit, worker khác) phát nhắc -> chỉ gia hạn/chờ lease, không quét
+        if owner:
+            if not acquire_lease(conn, calendar, owner, now):
+                leading.discard(calendar)
+                continue
+            if calendar not in leading:
+                leading.add(calendar)
+                catch_up_calendar = True
+        title = '📅 NHẮC LỊCH TRÌNH AI'
+        if calendar != DEFAULT_CALENDAR: title += f" ({calendar})"
 
-            for ev in events:
-                eid, name, start, loc, remind = ev
+        if catch_up_calendar:
+            missed, expired = catch_up_reminders(conn, now, calendar)
+            # Nhận trước khi báo: nhắc đã được nơi khác báo thì bỏ
+            missed = claim_reminders(conn, missed)
+            if missed:
+                # Gộp thành 1 thông báo thay vì bắn hàng loạt
+                msg = summarize_missed(missed) if len(missed) > 1 else missed[0][1]
+                notifier(title, msg)
+                sent += 1
+            if missed or expired:
+                print(f"Worker: Bù {len(missed)} nhắc, hết hạn {expired} nhắc [{calendar}]")
 
-                # Xử lý thời gian (copy logic cũ)
-                try:
-                    s_dt = datetime.strptime(start, "%Y-%m-%d %H:%M:%S")
-                except:
-                    try:
-                        s_dt = datetime.strptime(start, "%Y-%m-%d %H:%M")
-                    except:
-                        continue
+        # Mốc nhắc (sự kiện 1 lần + lần lặp kế tiếp) rơi vào phút hiện tại, quét index reminders(state, fire_at)
+        for rid, name, loc, remind, fire_at in due_reminders(conn, now, calendar):
+            # 1. Nhận nhắc trong DB (UPDATE có điều kiện), không nhận được = đã có nơi khác báo
+            if not claim_reminder(conn, rid, fire_at): continue
 
-                s_dt = s_dt.replace(second=0)
-                remind_val = remind if remind else 0
-                remind_dt = s_dt - timedelta(minutes=remind_val)
-                remind_str = remind_dt.strftime("%Y-%m-%d %H:%M")
+            # 2. BẮN THÔNG BÁO HỆ THỐNG (OS LEVEL)
+            msg = f"{name}"
+            if loc: msg += f" tại {loc}"
+            notifier(title, msg)
+            sent += 1
+            print(f"Worker: Đã báo sự kiện {name} [{calendar}]")
 
-                if now_str == remind_str:
-                    # 1. BẮN THÔNG BÁO HỆ THỐNG (OS LEVEL)
-                    msg = f"{name}"
-                    if loc: msg += f" tại {loc}"
+        # Dọn sự kiện đã qua lâu sang archive (tối đa 1 lần/giờ, theo lô)
+        if owner:
+            archived = maybe_archive(conn, calendar, now)
+            if archived: print(f"Worker: Lưu trữ {archived} sự kiện cũ [{calendar}]")
+    return sent
+
+
+# clock / notifier / sleep thay được để chạy với đồng hồ giả (loadgen.py), max_ticks=None là chạy mãi
+def check_reminders(db_name="scheduler.db", shard=0, shards=1, clock=datetime.now, notifier=notify,
+                    sleep=time.sleep, max_ticks=None, conn=None):
+    print(f"Worker {shard + 1}/{shards}: Đang chạy ngầm tìm lịch...")
+    # Kết nối DB riêng (Vì worker là tiến trình khác)
+    conn = conn or connect(db_name)
+    init_schema(conn)
+    owner = lease_owner(f"worker{shard + 1}/{shards}")
+    leading = set()
 
-                    notification.notify(
-                        title='📅 NHẮC LỊCH TRÌNH AI',
-                        message=msg,
-                        app_icon=None,  # Bạn có thể để đường dẫn file .ico
-                        timeout=10,  # Hiện trong 10 giây
-                    )
+    last_tick = None
+    ticks = 0
+    try:
+        while max_ticks is None or ticks < max_ticks:
+            try:
+                now = clock()
+                # Lúc khởi động hoặc sau khi ngủ lâu (máy sleep, bị treo) -> bù các nhắc bị lỡ
+                catch_up = last_tick is None or now - last_tick > 2 * CHECK_INTERVAL
+                last_tick = now
+                run_tick(conn, now, shard, shards, notifier, catch_up, owner, leading)
+                # Snapshot định kỳ cả file DB nếu có ghi mới (bật bằng SCHEDULER_BACKUP_HOURS), chỉ 1 tiến trình làm
+                if shard == 0:
+                    snapshot = snapshot_if_changed(db_name, now)
+                    if snapshot: print(f"Worker: Đã sao lưu DB -> {snapshot}")
+            except Exception as e:
+                print(f"Lỗi Worker: {e}")
 
-                    # 2. Update DB
-                    cursor.execute("UPDATE events SET is_notified = 1 WHERE id = ?", (eid,))
-                    conn.commit()
-                    print(f"Worker: Đã báo sự kiện {name}")
+            ticks += 1
+            sleep(CHECK_INTERVAL.total_seconds())  # Check mỗi 20s
+    finally:
+        release_leases(conn, owner)
 
-        except Exception as e:
-            print(f"Lỗi Worker: {e}")
 
-        time.sleep(20)  # Check mỗi 20s
+# Chạy 1 hoặc nhiều tiến trình worker (dùng chung cho __main__ và cli.py)
+def run_workers(db_name="scheduler.db", shards=1):
+    # Migrate schema 1 lần trước khi tách tiến trình
+    init_schema(connect(db_name))
+    if shards <= 1:
+        check_reminders(db_name)
+    else:
+        workers = [Process(target=check_reminders, args=(db_name, i, shards), daemon=True)
+                   for i in range(shards)]
+        for w in workers: w.start()
+        for w in workers: w.join()
 
 
 if __name__ == "__main__":
-    check_reminders()
\ No newline at end of file
+    arg_parser = argparse.ArgumentParser(description="Worker nhắc lịch chạy ngầm")
+    arg_parser.add_argument("--db", default="scheduler.db")
+    arg_parser.add_argument("--shards", type=int, default=1, help="Số tiến trình, chia lịch theo hash")
+    args = arg_parser.parse_args()
+    run_workers(args.db, args.shards)
\ No newline at end of file